@@ -0,0 +1,416 @@
+"""
+Compact, array-backed document analysis results.
+Keeps the scores of every sentence and paragraph as NumPy matrices plus
+(start, end) offsets into the document text, and builds the familiar
+nested dict views only when a caller asks for them.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+import arc_analytics
+
+# Decimals kept by the columnar JSON view; float32 holds about seven
+# significant digits
+COLUMNAR_DECIMALS = 6
+
+
+def _labels(results, key, preferred=()):
+    """Return the score labels of a list of results in first-seen order."""
+    labels = dict.fromkeys(preferred)
+    for result in results:
+        labels.update(dict.fromkeys(result[key]["scores"]))
+    return tuple(labels)
+
+
+def _matrix(results, key, labels):
+    """Stack the scores of a list of results into a float32 matrix, NaN where missing."""
+    matrix = np.full((len(results), len(labels)), np.nan, dtype=np.float32)
+    columns = {label: column for column, label in enumerate(labels)}
+    for row, result in enumerate(results):
+        for label, score in result[key]["scores"].items():
+            matrix[row, columns[label]] = score
+    return matrix
+
+
+def _json_matrix(matrix):
+    """Convert a score matrix to nested lists, with None for missing scores."""
+    rounded = np.round(matrix.astype(np.float64), COLUMNAR_DECIMALS)
+    if not np.isnan(rounded).any():
+        return rounded.tolist()
+    return [[None if score != score else score for score in row] for row in rounded.tolist()]
+
+
+def _widen(matrix, width, columns):
+    """Place the columns of a score matrix at the given columns of a wider one, NaN elsewhere."""
+    widened = np.full((len(matrix), width), np.nan, dtype=np.float32)
+    widened[:, columns] = matrix
+    return widened
+
+
+def shift_entries(sentences, positions):
+    """Build the emotional shift results at the given positions of a sentence table."""
+    dominant = sentences.dominant_emotions()
+    return [
+        {
+            "position": position,
+            "from_sentence": sentences.span(position - 1),
+            "to_sentence": sentences.span(position),
+            "from_emotion": dominant[position - 1],
+            "to_emotion": dominant[position]
+        }
+        for position in np.asarray(positions).tolist()
+    ]
+
+
+class SpanTable:
+    """
+    Sentiment and emotion scores of a list of text spans.
+
+    Row i holds the span text[offsets[i, 0]:offsets[i, 1]], its emotion
+    scores (one column per emotion label), its sentiment scores (one
+    column per sentiment label), the index of its dominant emotion and
+    whether its overall sentiment is positive.
+    """
+
+    def __init__(self, text, offsets, emotion_labels, emotions, dominant, sentiment_labels, sentiment, positive):
+        self.text = text
+        self.offsets = offsets
+        self.emotion_labels = emotion_labels
+        self.emotions = emotions
+        self.dominant = dominant
+        self.sentiment_labels = sentiment_labels
+        self.sentiment = sentiment
+        self.positive = positive
+
+    @classmethod
+    def from_scores(cls, text, offsets, scores):
+        """
+        Build a table from span offsets and a score table
+
+        Parameters:
+        -----------
+        text : str
+            The document text the offsets point into
+        offsets : list
+            (start, end) offsets of the spans; blank spans are skipped
+        scores : dict
+            {"sentiment": ..., "emotions": ...} results keyed by span text
+
+        Returns:
+        --------
+        SpanTable
+            The scores of the non-blank spans, in order
+        """
+        offsets = [(start, end) for start, end in offsets if text[start:end].strip()]
+        results = [scores[text[start:end]] for start, end in offsets]
+
+        emotion_labels = _labels(results, "emotions")
+        sentiment_labels = _labels(results, "sentiment", ("NEGATIVE", "POSITIVE"))
+        # The dominant emotion is kept as computed, so ties resolve as before
+        dominant = np.array(
+            [emotion_labels.index(result["emotions"]["dominant_emotion"]) for result in results],
+            dtype=np.int16
+        )
+        positive = np.array([result["sentiment"]["overall_sentiment"] == "positive" for result in results], dtype=bool)
+
+        return cls(
+            text,
+            np.array(offsets, dtype=np.int64).reshape(-1, 2),
+            emotion_labels,
+            _matrix(results, "emotions", emotion_labels),
+            dominant,
+            sentiment_labels,
+            _matrix(results, "sentiment", sentiment_labels),
+            positive
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def splice(self, text, start, end, table, shift):
+        """
+        Return the table of an edited text, with rows start to end replaced by the rows of table
+
+        The rows after end are moved by shift characters. Labels of table
+        that this table lacks are added after its own.
+        """
+        emotion_labels = self.emotion_labels + tuple(
+            label for label in table.emotion_labels if label not in self.emotion_labels
+        )
+        sentiment_labels = self.sentiment_labels + tuple(
+            label for label in table.sentiment_labels if label not in self.sentiment_labels
+        )
+        emotion_columns = np.array([emotion_labels.index(label) for label in table.emotion_labels], dtype=np.int16)
+        sentiment_columns = [sentiment_labels.index(label) for label in table.sentiment_labels]
+        own_emotions = np.arange(len(self.emotion_labels))
+        own_sentiment = np.arange(len(self.sentiment_labels))
+
+        return SpanTable(
+            text,
+            np.concatenate([self.offsets[:start], table.offsets, self.offsets[end:] + shift]),
+            emotion_labels,
+            np.concatenate([
+                _widen(self.emotions[:start], len(emotion_labels), own_emotions),
+                _widen(table.emotions, len(emotion_labels), emotion_columns),
+                _widen(self.emotions[end:], len(emotion_labels), own_emotions)
+            ]),
+            np.concatenate([self.dominant[:start], emotion_columns[table.dominant], self.dominant[end:]]),
+            sentiment_labels,
+            np.concatenate([
+                _widen(self.sentiment[:start], len(sentiment_labels), own_sentiment),
+                _widen(table.sentiment, len(sentiment_labels), sentiment_columns),
+                _widen(self.sentiment[end:], len(sentiment_labels), own_sentiment)
+            ]),
+            np.concatenate([self.positive[:start], table.positive, self.positive[end:]])
+        )
+
+    def span(self, index):
+        """Return the text of one span."""
+        start, end = self.offsets[index]
+        return self.text[start:end]
+
+    def spans(self, start=0, end=None):
+        """Return the texts of spans start to end, all by default."""
+        return [self.text[span_start:span_end] for span_start, span_end in self.offsets[start:end].tolist()]
+
+    def dominant_emotions(self):
+        """Return the dominant emotion label of every span."""
+        return [self.emotion_labels[index] for index in self.dominant.tolist()]
+
+    def emotions_at(self, index):
+        """Return the emotion result of one span in the analyzer's dict form."""
+        return self.emotion_results(index, index + 1)[0]
+
+    def sentiment_at(self, index):
+        """Return the sentiment result of one span in the analyzer's dict form."""
+        return self.sentiment_results(index, index + 1)[0]
+
+    def emotion_results(self, start, end):
+        """Return the emotion results of spans start to end in the analyzer's dict form."""
+        labels = self.emotion_labels
+        return [
+            {
+                "scores": {label: score for label, score in zip(labels, scores) if score == score},
+                "dominant_emotion": labels[dominant]
+            }
+            for scores, dominant in zip(self.emotions[start:end].tolist(), self.dominant[start:end].tolist())
+        ]
+
+    def sentiment_results(self, start, end):
+        """Return the sentiment results of spans start to end in the analyzer's dict form."""
+        labels = self.sentiment_labels
+        return [
+            {
+                "scores": {label: score for label, score in zip(labels, scores) if score == score},
+                "overall_sentiment": "positive" if positive else "negative"
+            }
+            for scores, positive in zip(self.sentiment[start:end].tolist(), self.positive[start:end].tolist())
+        ]
+
+    def scores_at(self, index):
+        """Return the {"sentiment": ..., "emotions": ...} result of one span."""
+        return {"sentiment": self.sentiment_at(index), "emotions": self.emotions_at(index)}
+
+    def span_scores(self, start=0, end=None):
+        """Return the {"sentiment": ..., "emotions": ...} results of spans start to end, keyed by text."""
+        end = len(self) if end is None else end
+        results = zip(
+            self.spans(start, end),
+            self.sentiment_results(start, end),
+            self.emotion_results(start, end)
+        )
+        return {span: {"sentiment": sentiment, "emotions": emotions} for span, sentiment, emotions in results}
+
+    def to_columnar(self):
+        """Return the table as JSON-ready columns."""
+        return {
+            "offsets": self.offsets.tolist(),
+            "emotions": _json_matrix(self.emotions),
+            "dominant": self.dominant.tolist(),
+            "sentiment": _json_matrix(self.sentiment),
+            "positive": self.positive.tolist()
+        }
+
+
+class AnalysisResult(Mapping):
+    """
+    The analysis of one document, backed by arrays.
+
+    Reads like the dict analyze_document used to return: every key builds
+    its nested view on access, and to_dict() builds all of them. Nothing
+    but the document text, the score arrays, the shift positions, the
+    scene breaks and the document's scored windows is kept, so callers
+    that need the views repeatedly should hold on to them.
+    """
+
+    KEYS = (
+        "document_sentiment",
+        "document_emotions",
+        "sentence_analysis",
+        "paragraph_analysis",
+        "emotional_shifts",
+        "emotional_scenes",
+        "consistency_check"
+    )
+
+    def __init__(self, text, sentences, paragraphs, document_sentiment, document_emotions,
+                 shift_positions, main_emotion, scene_breaks=(), document_windows=None):
+        self.text = text
+        self.sentences = sentences
+        self.paragraphs = paragraphs
+        self.document_sentiment = document_sentiment
+        self.document_emotions = document_emotions
+        self.shift_positions = np.asarray(shift_positions, dtype=np.int64)
+        self.main_emotion = main_emotion
+        self.scene_breaks = np.asarray(scene_breaks, dtype=np.int64)
+        # The scored token windows the document scores were pooled from, if known
+        self.document_windows = document_windows
+
+        # A paragraph's sentences are the document sentences starting inside it
+        sentence_starts = sentences.offsets[:, 0]
+        self.paragraph_sentences = np.stack([
+            np.searchsorted(sentence_starts, paragraphs.offsets[:, 0]),
+            np.searchsorted(sentence_starts, paragraphs.offsets[:, 1])
+        ], axis=1)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        if key in ("document_sentiment", "document_emotions"):
+            return getattr(self, key)
+        return getattr(self, f"_{key}")()
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def to_dict(self):
+        """Build the complete nested dict view of the analysis."""
+        return {key: self[key] for key in self.KEYS}
+
+    def sentence_entries(self, start=0, end=None):
+        """Build the sentence-level results of sentences start to end."""
+        end = len(self.sentences) if end is None else end
+        return [
+            {
+                "sentence": self.text[sentence_start:sentence_end],
+                "sentiment": sentiment,
+                "emotions": emotions,
+                "start": sentence_start,
+                "end": sentence_end
+            }
+            for (sentence_start, sentence_end), sentiment, emotions in zip(
+                self.sentences.offsets[start:end].tolist(),
+                self.sentences.sentiment_results(start, end),
+                self.sentences.emotion_results(start, end)
+            )
+        ]
+
+    def paragraph_entries(self, start=0, end=None):
+        """Build the paragraph-level results of paragraphs start to end."""
+        end = len(self.paragraphs) if end is None else end
+        if end <= start:
+            return []
+
+        # Build the sentences of all the paragraphs at once, then hand them out
+        ranges = self.paragraph_sentences[start:end]
+        offset = int(ranges[0, 0])
+        sentences = self.sentence_entries(offset, int(ranges[-1, 1]))
+        return [
+            {
+                "paragraph": self.text[paragraph_start:paragraph_end],
+                "sentiment": sentiment,
+                "emotions": emotions,
+                "sentence_analysis": sentences[first - offset:last - offset]
+            }
+            for (paragraph_start, paragraph_end), (first, last), sentiment, emotions in zip(
+                self.paragraphs.offsets[start:end].tolist(),
+                ranges.tolist(),
+                self.paragraphs.sentiment_results(start, end),
+                self.paragraphs.emotion_results(start, end)
+            )
+        ]
+
+    def inconsistent_paragraphs(self):
+        """Return the indices of the paragraphs whose dominant emotion is not the main one."""
+        if self.main_emotion not in self.paragraphs.emotion_labels:
+            return np.arange(len(self.paragraphs))
+        main = self.paragraphs.emotion_labels.index(self.main_emotion)
+        return np.flatnonzero(self.paragraphs.dominant != main)
+
+    def to_columnar(self):
+        """
+        Return the analysis as compact, JSON-ready columns.
+
+        Sentences and paragraphs are given as offsets into the document
+        text with one row of scores each, in the order of the label lists.
+        """
+        return {
+            "emotion_labels": list(self.sentences.emotion_labels or self.paragraphs.emotion_labels),
+            "sentiment_labels": list(self.sentences.sentiment_labels),
+            "document_sentiment": self.document_sentiment,
+            "document_emotions": self.document_emotions,
+            "sentences": self.sentences.to_columnar(),
+            "paragraphs": dict(
+                self.paragraphs.to_columnar(),
+                sentences=self.paragraph_sentences.tolist()
+            ),
+            "emotional_shifts": self.shift_positions.tolist(),
+            "scenes": self.scene_breaks.tolist(),
+            "main_emotion": self.main_emotion
+        }
+
+    def _sentence_analysis(self):
+        return self.sentence_entries()
+
+    def _paragraph_analysis(self):
+        return self.paragraph_entries()
+
+    def _emotional_shifts(self):
+        return shift_entries(self.sentences, self.shift_positions)
+
+    def _emotional_scenes(self):
+        if not len(self.scene_breaks):
+            return []
+
+        # Mean scores of every scene from the prefix sums of the sentence scores
+        ends = np.append(self.scene_breaks[1:], len(self.sentences))
+        means = arc_analytics.window_means(
+            arc_analytics.prefix_sums(self.sentences.emotions), self.scene_breaks, ends
+        )
+        labels = self.sentences.emotion_labels
+        return [
+            {
+                "start_sentence": first,
+                "end_sentence": last,
+                "start": self.sentences.offsets[first, 0].item(),
+                "end": self.sentences.offsets[last - 1, 1].item(),
+                "dominant_emotion": labels[int(np.argmax(scores))],
+                "scores": dict(zip(labels, np.round(scores, COLUMNAR_DECIMALS).tolist()))
+            }
+            for first, last, scores in zip(self.scene_breaks.tolist(), ends.tolist(), means)
+        ]
+
+    def _consistency_check(self):
+        if not len(self.paragraphs):
+            return {"is_consistent": True, "inconsistencies": []}
+
+        dominant = self.paragraphs.dominant_emotions()
+        inconsistencies = [
+            {
+                "paragraph_index": index,
+                "paragraph": self.paragraphs.span(index),
+                "emotion": dominant[index],
+                "main_emotion": self.main_emotion
+            }
+            for index in self.inconsistent_paragraphs().tolist()
+        ]
+        return {
+            "is_consistent": len(inconsistencies) == 0,
+            "main_emotion": self.main_emotion,
+            "inconsistencies": inconsistencies
+        }
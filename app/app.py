@@ -1,82 +1,389 @@
-from flask import Flask, render_template, request, jsonify
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 import base64
-from io import BytesIO
 import os
 import sys
 import json
 
+# Use the non-interactive matplotlib backend, without importing matplotlib yet
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
 # Import from your modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from sentiment_analysis import EmotionalToneAnalyzer
-from suggestion_generator import generate_improved_sentence_with_gpt, get_emotion_general_suggestions
+from sentiment_analysis import EmotionalToneAnalyzer, models
+from suggestion_generator import generate_improved_sentences, get_emotion_general_suggestions
+from incremental_analysis import analyze_incremental
+from revision_store import RevisionStore
+from job_queue import JobQueue, QueueFullError
+from metrics import REGISTRY, end_trace, histogram_samples, server_timing, start_trace, timer
+from config import (
+    REVISION_STORE_PATH,
+    REVISION_STORE_MAX_REVISIONS,
+    JOB_STORE_PATH,
+    JOB_WORKERS,
+    JOB_MAX_QUEUED,
+    JOB_MAX_FINISHED,
+    STREAM_CHUNK_SIZE,
+    CHART_CACHE_MAX_AGE,
+    MODEL_WARMUP,
+    METRICS_ENABLED,
+    SERVER_TIMING
+)
 
 app = Flask(__name__)
 
 # Initialize the analyzer
 analyzer = EmotionalToneAnalyzer()
 
+# Recent analyses, used as the base for incremental re-analysis and charts
+revisions = RevisionStore(REVISION_STORE_PATH, REVISION_STORE_MAX_REVISIONS)
+
+# Charts that can be rendered on demand for a stored revision
+CHART_KINDS = ('arc', 'radar')
+
+def chart_urls(revision_id):
+    """Return the on-demand PNG chart URLs of a stored revision."""
+    return {kind: f'/charts/{revision_id}/{kind}.png' for kind in CHART_KINDS}
+
+def chart_data(analysis):
+    """Return the numeric series needed to draw the charts client-side."""
+    return {
+        'arc': analyzer.emotional_arc_data(analysis),
+        'radar': analyzer.emotion_radar_data(analysis)
+    }
+
+def render_chart(revision_id, analysis, kind):
+    """Render a chart of a stored revision to PNG, reusing earlier renders."""
+    png = revisions.get_chart(revision_id, kind)
+    if png is None:
+        if kind == 'arc':
+            figure = analyzer.visualize_emotional_arc(analysis)
+        else:
+            figure = analyzer.create_emotion_radar_chart(analysis)
+        png = analyzer.render_chart_png(figure)
+        revisions.save_chart(revision_id, kind, png)
+    return png
+
+def analysis_response(revision_id, analysis, keys):
+    """Build the JSON response of a stored revision from the given analysis views."""
+    response = {'revision_id': revision_id}
+    response.update({key: analysis[key] for key in keys})
+    response['chart_urls'] = chart_urls(revision_id)
+    return response
+
+def run_analysis_job(job, text):
+    """Analyze a submitted manuscript, reporting progress on the job."""
+    analysis = analyzer.analyze_document(text, progress=job.report_progress)
+    
+    # The job keeps only the revision id, the views are built from the
+    # stored revision when the result is fetched
+    return {'revision_id': revisions.save(analysis)}
+
+# Views of the analysis returned by /analyze and the streamed summary
+SUMMARY_KEYS = (
+    'document_sentiment',
+    'document_emotions',
+    'emotional_shifts',
+    'emotional_scenes',
+    'consistency_check'
+)
+
+# Views of the analysis returned by /jobs/<job_id>/result
+JOB_RESULT_KEYS = (
+    'document_sentiment',
+    'document_emotions',
+    'sentence_analysis',
+    'emotional_shifts',
+    'emotional_scenes',
+    'consistency_check'
+)
+
+# Background analysis of large manuscripts
+jobs = JobQueue(JOB_STORE_PATH, run_analysis_job, JOB_WORKERS, JOB_MAX_QUEUED, JOB_MAX_FINISHED)
+
+# Latency of every request until its response starts, reported by /metrics
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'Time until the response of a request starts', ('endpoint', 'method', 'status')
+)
+
+def collect_component_metrics():
+    """Report the statistics the score cache, lexicon cascade and model batching keep themselves."""
+    cache = analyzer.score_cache.stats()
+    cascade = analyzer.cascade_stats.stats()
+    families = [
+        ('score_cache_hits_total', 'counter', 'Score cache lookups that were hits', [('', {}, cache['hits'])]),
+        ('score_cache_misses_total', 'counter', 'Score cache lookups that were misses', [('', {}, cache['misses'])]),
+        ('score_cache_evictions_total', 'counter', 'Entries evicted from the score cache',
+         [('', {}, cache['evictions'])]),
+        ('score_cache_entries', 'gauge', 'Entries in the score cache', [('', {}, cache['entries'])]),
+        ('score_cache_bytes', 'gauge', 'Estimated memory used by the score cache', [('', {}, cache['bytes'])]),
+        ('cascade_texts_total', 'counter', 'Texts scored by the lexicon-first cascade', [('', {}, cascade['texts'])]),
+        ('cascade_escalated_total', 'counter', 'Cascade texts escalated to the emotion model',
+         [('', {}, cascade['escalated'])]),
+        ('cascade_audited_total', 'counter', 'Confidently scored cascade texts checked against the model',
+         [('', {}, cascade['audited'])])
+    ]
+    
+    batch_sizes, queue_delays = [], []
+    for model_id, scheduler in analyzer.schedulers.items():
+        batching = scheduler.stats()
+        labels = {'model': model_id}
+        histogram = batching['batch_size_histogram']
+        batch_sizes += histogram_samples(
+            histogram['buckets'], histogram['counts'], batching['mean_batch_size'] * batching['batches'], labels
+        )
+        delays = batching['queue_delay_ms']
+        queue_delays += histogram_samples(
+            [bound / 1000 for bound in delays['buckets']], delays['counts'],
+            delays['mean'] * batching['items'] / 1000, labels
+        )
+    families.append(('model_batch_size', 'histogram', 'Texts in each shared model batch', batch_sizes))
+    families.append(('model_queue_delay_seconds', 'histogram', 'Time texts wait for a shared model batch', queue_delays))
+    return families
+
+REGISTRY.register_collector(collect_component_metrics)
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    if SERVER_TIMING:
+        start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    # Streamed responses are timed until their headers are sent
+    seconds = time.perf_counter() - g.get('request_started', time.perf_counter())
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe(seconds, request.endpoint or 'unknown', request.method, str(response.status_code))
+    if SERVER_TIMING:
+        stages = end_trace()
+        stages['total'] = seconds
+        response.headers['Server-Timing'] = server_timing(stages)
+    return response
+
+# Seconds spent importing the app, reported by /ready
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
+
 @app.route('/')
 def index():
     """Render the main page."""
     return render_template('index.html')
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Report whether the app can serve analyses.
+
+    That is once all models are loaded, or as soon as the app is imported
+    when MODEL_WARMUP is off and models load on first use instead.
+    """
+    is_ready = models.ready() or not MODEL_WARMUP
+    status = {
+        'ready': is_ready,
+        'models': models.status(),
+        'import_seconds': IMPORT_SECONDS
+    }
+    return jsonify(status), 200 if is_ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report score cache, model batching and lexicon cascade statistics."""
+    return jsonify({
+        'score_cache': analyzer.score_cache.stats(),
+        'cascade': analyzer.cascade_stats.stats(),
+        'batching': {
+            model_id: scheduler.stats() for model_id, scheduler in analyzer.schedulers.items()
+        }
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Report the metrics of all server processes in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    """Analyze the text submitted by the user."""
+    """
+    Analyze the text submitted by the user.
+    
+    By default the response carries the numeric chart series for drawing
+    in the browser plus URLs of on-demand PNG renders. Set "charts" to
+    "inline" to also embed base64 PNGs as plot_url and radar_plot_url.
+    Set "format" to "columnar" to get the whole analysis as score
+    matrices and offsets into the text instead of nested views.
+    """
     try:
         data = request.json
         text = data.get('text', '')
+        charts = data.get('charts', 'data')
         
         if not text:
             return jsonify({'error': 'No text provided'})
         
         # Perform the analysis
         analysis = analyzer.analyze_document(text)
+        revision_id = revisions.save(analysis)
         
-        # Create emotional arc visualization
-        plt_obj = analyzer.visualize_emotional_arc(analysis)
+        # Prepare response
+        with timer('build_views'):
+            if data.get('format') == 'columnar':
+                response = {
+                    'revision_id': revision_id,
+                    'analysis': analysis.to_columnar(),
+                    'chart_urls': chart_urls(revision_id)
+                }
+            else:
+                response = analysis_response(revision_id, analysis, SUMMARY_KEYS)
+                response['chart_data'] = chart_data(analysis)
         
-        # Convert plot to base64 image
-        img = BytesIO()
-        plt_obj.savefig(img, format='png', bbox_inches='tight')
-        plt_obj.close()
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode('utf8')
+        if charts == 'inline':
+            arc_png = render_chart(revision_id, analysis, 'arc')
+            radar_png = render_chart(revision_id, analysis, 'radar')
+            with timer('encode_charts'):
+                response['plot_url'] = base64.b64encode(arc_png).decode('utf8')
+                response['radar_plot_url'] = base64.b64encode(radar_png).decode('utf8')
+    
+        with timer('serialize'):
+            return jsonify(response)
+    except Exception as e:
+        print("Error during /analyze:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def format_sse(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Analyze the submitted text, streaming results as Server-Sent Events."""
+    data = request.json
+    text = data.get('text', '')
+    
+    if not text:
+        return jsonify({'error': 'No text provided'})
+    
+    def generate():
+        try:
+            for event, payload in analyzer.iter_document_analysis(text, STREAM_CHUNK_SIZE):
+                if event == 'summary':
+                    revision_id = revisions.save(payload)
+                    payload = analysis_response(revision_id, payload, SUMMARY_KEYS)
+                yield format_sse(event, payload)
+        except Exception as e:
+            print("Error during /analyze/stream:", e)
+            yield format_sse('error', {'error': 'Internal server error'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/charts/<revision_id>/<kind>.png', methods=['GET'])
+def get_chart(revision_id, kind):
+    """Render a chart of a previously analyzed revision as a PNG image."""
+    analysis = revisions.get(revision_id) if kind in CHART_KINDS else None
+    if analysis is None:
+        return jsonify({'error': 'Unknown chart'}), 404
+    
+    # Revisions never change, so a chart can be cached for as long as it exists
+    etag = f'{revision_id}-{kind}'
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(render_chart(revision_id, analysis, kind), mimetype='image/png')
+    
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CHART_CACHE_MAX_AGE
+    return response
+
+@app.route('/analyze/incremental', methods=['POST'])
+def analyze_incremental_revision():
+    """Re-analyze an edited draft against a previously analyzed revision."""
+    try:
+        data = request.json
+        text = data.get('text', '')
+        base_revision_id = data.get('revision_id', '')
         
-        # Create radar chart visualization
-        radar_plt = analyzer.create_emotion_radar_chart(analysis)
+        if not text or not base_revision_id:
+            return jsonify({'error': 'Text and revision id are required'})
         
-        # Convert radar plot to base64 image
-        radar_img = BytesIO()
-        radar_plt.savefig(radar_img, format='png', bbox_inches='tight')
-        radar_plt.close()
-        radar_img.seek(0)
-        radar_plot_url = base64.b64encode(radar_img.getvalue()).decode('utf8')
+        base = revisions.get(base_revision_id)
+        if base is None:
+            return jsonify({'error': 'Unknown revision, run a full analysis first'}), 404
         
-        # Prepare response
-        response = {
-            'document_sentiment': analysis['document_sentiment'],
-            'document_emotions': analysis['document_emotions'],
-            'emotional_shifts': analysis['emotional_shifts'],
-            'consistency_check': analysis['consistency_check'],
-            'plot_url': plot_url,
-            'radar_plot_url': radar_plot_url
-        }
-    
-        return jsonify(response)
+        # Only the spans that changed since the base revision are re-scored
+        analysis, patch = analyze_incremental(analyzer, base, text)
+        revision_id = revisions.save(analysis)
+        
+        patch['revision_id'] = revision_id
+        patch['base_revision_id'] = base_revision_id
+        return jsonify(patch)
     except Exception as e:
-        print("Error during /analyze:", e)
+        print("Error during /analyze/incremental:", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Submit a manuscript for background analysis."""
+    data = request.json
+    text = data.get('text', '')
+    
+    if not text:
+        return jsonify({'error': 'No text provided'})
+    
+    try:
+        job = jobs.submit(text)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the status and progress of a background analysis."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Return the result of a completed background analysis."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    if job.status != 'completed':
+        return jsonify({'error': f'Job is {job.status}', 'status': job.status}), 409
+    
+    revision_id = job.result['revision_id']
+    analysis = revisions.get(revision_id)
+    if analysis is None:
+        return jsonify({'error': 'The result of this job has expired'}), 410
+    
+    return jsonify(analysis_response(revision_id, analysis, JOB_RESULT_KEYS))
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running background analysis."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    return jsonify(job.to_dict())
+
 @app.route('/suggestions', methods=['POST'])
 def get_suggestions():
     """Generate suggestions for improving emotional tone with specific text replacement examples."""
     data = request.json
     text = data.get('text', '')
     target_emotion = data.get('target_emotion', '')
+    bypass_cache = bool(data.get('bypass_cache', False))
 
     if not text or not target_emotion:
         return jsonify({'error': 'Text and target emotion are required'})
@@ -109,13 +416,17 @@ def get_suggestions():
         # Limit to 3 sentences if too many to improve
         sentences_to_improve = sentences_to_improve[:3]
 
-    # Generate specific suggestions for each sentence
+    # Generate specific suggestions for each sentence, rewriting them concurrently
+    with timer('rewrite'):
+        improved_sentences = generate_improved_sentences(
+            [sentence_data['sentence'] for sentence_data in sentences_to_improve],
+            target_emotion,
+            use_cache=not bypass_cache
+        )
     specific_suggestions = []
     
-    for sentence_data in sentences_to_improve:
+    for sentence_data, improved in zip(sentences_to_improve, improved_sentences):
         original = sentence_data['sentence']
-        # Use the imported function to generate improved sentences
-        improved = generate_improved_sentence_with_gpt(original, target_emotion)
         
         specific_suggestions.append({
             'original': original,
@@ -141,5 +452,9 @@ if __name__ == '__main__':
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
+
+    # With the debug reloader, only the serving child process loads models
+    if MODEL_WARMUP and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        models.warm_up()
     
     app.run(debug=True)
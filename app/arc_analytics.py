@@ -0,0 +1,315 @@
+"""
+Vectorized analytics of the emotional arc of a document.
+Works on the sentences x emotions score matrix of an analysis: rolling
+window means, emotional shifts gated by the distance between the
+emotion distributions before and after a sentence boundary and by the
+noise of the arc around it, and a change-point segmentation of the arc
+into emotional scenes.
+"""
+
+import numpy as np
+
+
+def prefix_sums(matrix):
+    """
+    Return the prefix sums of the rows of a score matrix
+
+    Row i of the result is the sum of rows 0 to i - 1, starting with a row
+    of zeros, so the sum of rows start to end - 1 is
+    sums[end] - sums[start]. Missing (NaN) scores count as 0.
+    """
+    sums = np.zeros((len(matrix) + 1, matrix.shape[1]))
+    np.cumsum(np.nan_to_num(matrix), axis=0, dtype=np.float64, out=sums[1:])
+    return sums
+
+
+def window_means(sums, starts, ends):
+    """Return the mean of rows start to end - 1 for every start and end, from the row prefix sums."""
+    return (sums[ends] - sums[starts]) / (ends - starts)[:, None]
+
+
+def rolling_mean(matrix, window):
+    """
+    Return the rolling mean of the rows of a matrix over a centered window
+
+    Row i of the result is the mean of rows i - window // 2 to
+    i + window // 2, clipped at the start and end of the matrix. Missing
+    (NaN) scores count as 0.
+    """
+    rows = np.arange(len(matrix))
+    starts = np.maximum(rows - window // 2, 0)
+    ends = np.minimum(rows + window // 2 + 1, len(matrix))
+    return window_means(prefix_sums(matrix), starts, ends)
+
+
+def squared_steps(matrix):
+    """Return the squared distance between the scores of every sentence and the next."""
+    steps = np.diff(np.nan_to_num(matrix.astype(np.float64)), axis=0)
+    return np.einsum("ij,ij->i", steps, steps)
+
+
+def noise_level(squared):
+    """
+    Estimate the noise of an arc from the squared steps between its sentences
+
+    Returns half the median squared step along the last axis, the summed
+    variance of the emotions for noise around a steady mean. Unlike the
+    mean step, the median is barely affected by the large steps at real
+    changes of emotion, even when they make up a third of all steps.
+    """
+    return 0.5 * np.median(squared, axis=-1)
+
+
+def boundary_distances(matrix, window, positions=None):
+    """
+    Return the distance between the emotions before and after sentence boundaries
+
+    Parameters:
+    -----------
+    matrix : numpy.ndarray
+        Sentences x emotions score matrix
+    window : int
+        Number of sentences averaged on each side of a boundary
+    positions : array-like
+        Boundaries to measure, each between sentence position - 1 and
+        position; every boundary by default
+
+    Returns:
+    --------
+    numpy.ndarray
+        The total variation distance, between 0 and 1, of the mean
+        emotion distribution of the window before each boundary and the
+        window after it
+    """
+    if positions is None:
+        positions = np.arange(1, len(matrix))
+    positions = np.asarray(positions, dtype=np.int64)
+    if not len(positions):
+        return np.zeros(0)
+
+    sums = prefix_sums(matrix)
+    before = window_means(sums, np.maximum(positions - window, 0), positions)
+    after = window_means(sums, positions, np.minimum(positions + window, len(matrix)))
+    return 0.5 * np.abs(after - before).sum(axis=1)
+
+
+def detect_shifts(matrix, dominant, window, min_distance, noise_window, significance, positions=None):
+    """
+    Find the emotional shifts of a document
+
+    Parameters:
+    -----------
+    matrix : numpy.ndarray
+        Sentences x emotions score matrix
+    dominant : numpy.ndarray
+        The dominant emotion index of every sentence
+    window : int
+        Number of sentences averaged on each side of a boundary
+    min_distance : float
+        Smallest distance between the windows that counts as a shift
+    noise_window : int
+        Sentences on each side of a boundary whose steps estimate the
+        noise of the arc around it
+    significance : float
+        How far the split of the windows at a boundary must reduce their
+        squared deviation from their means, in multiples of that noise
+    positions : array-like
+        Boundaries to check; every boundary by default
+
+    Returns:
+    --------
+    numpy.ndarray
+        The positions where the dominant emotion changes from sentence
+        position - 1 to position and the emotions around the boundary
+        differ by at least min_distance and by clearly more than the
+        noise of the arc there, so flips between near-tied emotions or
+        within a noisy passage are not reported
+    """
+    if positions is None:
+        positions = np.arange(1, len(dominant))
+    positions = np.asarray(positions, dtype=np.int64)
+    flips = positions[dominant[positions] != dominant[positions - 1]]
+    if not len(flips):
+        return flips
+
+    # Only the sentences around the flips matter, so a few positions of a
+    # long document are checked on a slice of it
+    halo = max(window, noise_window)
+    first = max(int(flips.min()) - halo, 0)
+    last = min(int(flips.max()) + halo, len(matrix))
+    matrix = matrix[first:last]
+    local = flips - first
+
+    distances = boundary_distances(matrix, window, local)
+    starts = np.maximum(local - window, 0)
+    ends = np.minimum(local + window, len(matrix))
+    gains = _split_gains(prefix_sums(matrix), starts, local, ends)
+
+    # Noise from the steps of boundaries position - noise_window + 1 to
+    # position + noise_window - 1, mirrored at the start and end
+    squared = np.pad(squared_steps(matrix), noise_window, mode="symmetric")
+    noise = noise_level(squared[local[:, None] + np.arange(2 * noise_window - 1)])
+    return flips[(distances >= min_distance) & (gains > significance * noise)]
+
+
+def _candidate_splits(sums, min_size, threshold):
+    """
+    Return the positions where the arc changes locally, from its row prefix sums.
+
+    At window sizes min_size, 2 * min_size, 4 * min_size and so on, the
+    mean of the window after every position is compared with the mean of
+    the window before it. Of every run of positions whose split would
+    pass the threshold within their two windows, the best one is kept.
+    """
+    count = len(sums) - 1
+    candidates = [np.zeros(0, dtype=np.int64)]
+    size = min_size
+    while 2 * size <= count:
+        positions = np.arange(size, count - size + 1)
+        difference = sums[2 * size:] - 2 * sums[size:count - size + 1] + sums[:count - 2 * size + 1]
+        gains = np.einsum("ij,ij->i", difference, difference) / (2 * size)
+
+        above = gains > threshold
+        if above.any():
+            # Runs of positions above the threshold, and the best of each;
+            # positions between runs are below the threshold, so the peak of
+            # a run is the maximum up to the start of the next run
+            run_starts = above & ~np.concatenate([[False], above[:-1]])
+            peaks = np.maximum.reduceat(gains, np.flatnonzero(run_starts))
+            runs = np.cumsum(run_starts) - 1
+            candidates.append(positions[above & (gains == peaks[np.maximum(runs, 0)])])
+        size *= 2
+
+    return np.unique(np.concatenate(candidates))
+
+
+def segment_scenes(matrix, min_size, penalty):
+    """
+    Split the emotional arc into scenes of steady emotion at its change points
+
+    Parameters:
+    -----------
+    matrix : numpy.ndarray
+        Sentences x emotions score matrix
+    min_size : int
+        Fewest sentences in a scene
+    penalty : float
+        Split threshold, in multiples of the sentence-to-sentence noise
+        of the arc times log(number of sentences)
+
+    Returns:
+    --------
+    numpy.ndarray
+        The index of the first sentence of every scene, starting with 0;
+        empty for a document without sentences
+
+    The noise of the arc is first estimated from the median step between
+    successive sentences, which changes of scene barely affect even when
+    scenes are short, and then from the mean step within the scenes this
+    finds, which unlike the median does not underestimate the noise of
+    skewed scores. Scene breaks are only tried at the candidate positions
+    of _candidate_splits, found in O(N log N), and the weak ones are
+    merged away in vectorized rounds over the candidates, so the
+    segmentation stays fast for documents made of many short scenes.
+    """
+    count = len(matrix)
+    if count < 2:
+        return np.zeros(count, dtype=np.int64)
+
+    sums = prefix_sums(matrix)
+    squared = squared_steps(matrix)
+    breaks = _merge_breaks(sums, min_size, penalty * max(noise_level(squared), 1e-12) * np.log(count))
+
+    within = np.ones(count - 1, dtype=bool)
+    within[breaks[1:] - 1] = False
+    return _merge_breaks(sums, min_size, _scene_threshold(squared, within, penalty))
+
+
+def resegment_scenes(matrix, breaks, start, end, min_size, penalty):
+    """
+    Split part of the emotional arc into scenes again, keeping the scenes around it
+
+    Parameters:
+    -----------
+    matrix : numpy.ndarray
+        Sentences x emotions score matrix
+    breaks : numpy.ndarray
+        The first sentence of every scene, as segment_scenes returns it,
+        of which start and end must be two; the breaks between them are
+        ignored
+    start, end : int
+        The sentences to segment again
+    min_size, penalty : int, float
+        As for segment_scenes
+
+    Returns:
+    --------
+    numpy.ndarray
+        The index of the first sentence of every scene
+
+    The threshold comes from the noise within the scenes that are kept,
+    so an edit only moves the scene breaks near it. Without kept scenes
+    to estimate it from, the whole arc is segmented again.
+    """
+    count = len(matrix)
+    breaks = np.asarray(breaks, dtype=np.int64)
+    within = np.ones(max(count - 1, 0), dtype=bool)
+    within[breaks[1:] - 1] = False
+    within[max(start - 1, 0):end] = False
+    if not within.any():
+        return segment_scenes(matrix, min_size, penalty)
+
+    threshold = _scene_threshold(squared_steps(matrix), within, penalty)
+    scenes = start + _merge_breaks(prefix_sums(matrix[start:end]), min_size, threshold)
+    return np.concatenate([breaks[breaks < start], scenes, breaks[breaks >= end]])
+
+
+def _scene_threshold(squared, within, penalty):
+    """Return the split threshold of the arc from its squared steps and those that lie within a scene."""
+    noise = 0.5 * squared[within].mean() if within.any() else 0.0
+    return penalty * max(noise, 1e-12) * np.log(len(squared) + 1)
+
+
+def _merge_breaks(sums, min_size, threshold):
+    """
+    Return the first sentence of every scene whose break passes the threshold, from the row prefix sums.
+
+    Starts from a break at every candidate and merges scenes back
+    together, weakest break first, until every break passes.
+    """
+    count = len(sums) - 1
+    breaks = np.concatenate([[0], _candidate_splits(sums, min_size, threshold), [count]])
+    while len(breaks) > 2:
+        starts, splits, ends = breaks[:-2], breaks[1:-1], breaks[2:]
+        gains = _split_gains(sums, starts, splits, ends)
+        weak = (gains <= threshold) | (splits - starts < min_size) | (ends - splits < min_size)
+        if not weak.any():
+            break
+
+        # Remove the weak breaks that are weaker than their weak neighbors;
+        # the weakest one always qualifies, and no two neighbors go at once
+        scores = np.where(weak, gains, np.inf)
+        left = np.concatenate([[np.inf], scores[:-1]])
+        right = np.concatenate([scores[1:], [np.inf]])
+        remove = weak & (scores < left) & (scores <= right)
+        breaks = np.concatenate([[0], splits[~remove], [count]])
+
+    return breaks[:-1]
+
+
+def _split_gains(sums, starts, splits, ends):
+    """
+    Return the drop in squared deviation from the scene means when the
+    scene from start to end is split at split, from the row prefix sums.
+    """
+    left = sums[splits] - sums[starts]
+    right = sums[ends] - sums[splits]
+    total = sums[ends] - sums[starts]
+    return np.einsum("ij,ij->i", left, left) / (splits - starts) \
+        + np.einsum("ij,ij->i", right, right) / (ends - splits) \
+        - np.einsum("ij,ij->i", total, total) / (ends - starts)
+
+
+def most_common(indices, size):
+    """Return the most common value of an array of label indices, the lowest on ties."""
+    return int(np.bincount(indices, minlength=size).argmax())
@@ -0,0 +1,132 @@
+"""
+Cross-request micro-batching of model calls.
+Gathers the texts submitted by concurrent requests for a few
+milliseconds and runs them through the model as one batch, so small
+requests share forward passes instead of each running their own.
+"""
+
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_DELAY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+
+def _histogram(buckets):
+    return {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1)}
+
+
+def _observe(histogram, value):
+    histogram["counts"][bisect_left(histogram["buckets"], value)] += 1
+
+
+class BatchScheduler:
+    """
+    Runs texts from many callers through one batch function.
+
+    run_batch is called as run_batch(texts) from the scheduler thread and
+    must return one result per text. A batch is started once max_batch_size
+    texts are waiting or the oldest waiting text has waited max_wait seconds.
+    """
+
+    def __init__(self, run_batch, max_batch_size, max_wait, name="batch-scheduler"):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = _histogram(BATCH_SIZE_BUCKETS)
+        self._queue_delays = _histogram(QUEUE_DELAY_BUCKETS_MS)
+        self._queue_delay_total = 0.0
+        self._queue_delay_max = 0.0
+
+    def submit(self, texts):
+        """Queue texts for the next batches and return one Future per text."""
+        self._ensure_thread()
+        futures = []
+        now = time.perf_counter()
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future, now))
+            futures.append(future)
+        return futures
+
+    def run(self, texts):
+        """Run texts through the shared batches and wait for their results."""
+        return [future.result() for future in self.submit(texts)]
+
+    def stats(self):
+        """Return batch size and queueing delay statistics."""
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_size_histogram": {
+                    "buckets": list(self._batch_sizes["buckets"]),
+                    "counts": list(self._batch_sizes["counts"])
+                },
+                "queue_delay_ms": {
+                    "mean": self._queue_delay_total / self._items * 1000 if self._items else 0.0,
+                    "max": self._queue_delay_max * 1000,
+                    "buckets": list(self._queue_delays["buckets"]),
+                    "counts": list(self._queue_delays["counts"])
+                },
+                "queued": self._queue.qsize()
+            }
+
+    def _ensure_thread(self):
+        # The thread starts on first use and again in forked processes,
+        # which inherit neither the thread nor the texts queued in the parent
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._work, args=(self._queue,), name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _work(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(pending.get(timeout=max(deadline - time.perf_counter(), 0)))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            _observe(self._batch_sizes, len(batch))
+            for _, _, enqueued_at in batch:
+                delay = started - enqueued_at
+                _observe(self._queue_delays, delay * 1000)
+                self._queue_delay_total += delay
+                self._queue_delay_max = max(self._queue_delay_max, delay)
+
+        # Texts submitted by several callers are only run once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            results = dict(zip(texts, self.run_batch(texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for text, future, _ in batch:
+            future.set_result(results[text])
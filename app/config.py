@@ -3,6 +3,8 @@ Configuration file for the Creative Writing Assistant application.
 Contains settings for emotional analysis and suggestion generation.
 """
 
+import os
+
 # OpenAI API settings
 OPENAI_MODEL = "gpt-3.5-turbo-instruct"
 OPENAI_MAX_TOKENS = 150
@@ -10,6 +12,208 @@ OPENAI_TEMPERATURE = 0.7
 OPENAI_TOP_P = 1.0
 OPENAI_FREQUENCY_PENALTY = 0.0
 OPENAI_PRESENCE_PENALTY = 0.0
+# Prompt used to rewrite sentences; bump the version whenever the text changes
+# so cached rewrites made with an older prompt are no longer used
+OPENAI_PROMPT_VERSION = 1
+OPENAI_PROMPT_TEMPLATE = """
+    Rewrite the following sentence to better express {target_emotion} at a {strength} level of intensity.
+    The rewritten sentence should maintain the core meaning but enhance the emotional impact.
+
+    Original sentence: "{original}"
+
+    Rewritten sentence to express {target_emotion}:
+    """
+# Maximum number of completion calls in flight, shared by all requests
+OPENAI_MAX_CONCURRENCY = 4
+# Seconds before a single completion call is abandoned, applied to
+# connecting and to each read of the response; a rewrite thread whose call
+# outlived SUGGESTIONS_DEADLINE is free again within this long
+OPENAI_REQUEST_TIMEOUT = 10
+# Seconds /suggestions waits for all rewrites before using the fallback
+SUGGESTIONS_DEADLINE = 12
+
+# Rewrite cache settings
+# SQLite file holding completed GPT rewrites across restarts
+REWRITE_CACHE_PATH = os.getenv(
+    "REWRITE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rewrite_cache.sqlite3")
+)
+# Seconds a cached rewrite stays valid
+REWRITE_CACHE_TTL = 30 * 24 * 60 * 60
+# Maximum number of cached rewrites before the least recently used are removed
+REWRITE_CACHE_MAX_ENTRIES = 100000
+# Seconds between writes of the hit counts and last use times collected
+# in memory; hits not yet written when a process exits are not counted
+REWRITE_CACHE_HIT_FLUSH_SECONDS = 60
+
+# Model inference settings
+SENTIMENT_MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+EMOTION_MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
+# How sentence sentiment is computed: "model" runs the sentiment model,
+# "derived" maps the emotion model's scores to a polarity, so every text
+# needs a single encoder pass and the sentiment model is never loaded
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "model")
+# Logistic mapping from emotion scores to the probability of a positive
+# sentiment. These are hand-set starting values, not yet fitted: before
+# switching SENTIMENT_MODE to "derived", run tools/fit_derived_sentiment.py
+# on a labeled sample and paste its output here, including the command and
+# agreement comment it prints
+DERIVED_SENTIMENT_WEIGHTS = {
+    "joy": 4.0,
+    "surprise": 1.0,
+    "neutral": 0.5,
+    "sadness": -3.0,
+    "anger": -3.0,
+    "fear": -3.0,
+    "disgust": -3.0
+}
+DERIVED_SENTIMENT_BIAS = 0.0
+# Backend running the two classifiers: "pytorch" (eager FP32), "torchscript",
+# "quantized" (dynamic INT8), "onnx" (ONNX Runtime, needs optimum) or "stub"
+# (deterministic scores from a hash of the text, for offline benchmarks)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch")
+# Milliseconds the stub backend spends per scored text, to mimic inference cost
+STUB_MODEL_MS_PER_TEXT = float(os.getenv("STUB_MODEL_MS_PER_TEXT", "0"))
+# Load all models in a background thread when the server starts, instead
+# of on the first request that needs them
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+# Preprocessing settings
+# Stages run besides those the analyzers require: "normalized" (the
+# normalized text), "sentences", "tokens", "filtered_tokens" or "parse"
+# (a spaCy dependency parse)
+PREPROCESSING_EXTRA_STAGES = ()
+# spaCy components that are never needed; they are not loaded at all
+SPACY_EXCLUDED_COMPONENTS = ["ner", "lemmatizer", "textcat"]
+
+# Number of texts sent to a transformer pipeline in one forward pass
+INFERENCE_BATCH_SIZE = 16
+# Gather the texts of concurrent requests into shared model batches
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "1") == "1"
+# Most texts gathered into one shared batch; it is split into forward
+# passes of INFERENCE_BATCH_SIZE texts of similar length
+MICRO_BATCH_MAX_SIZE = 64
+# Milliseconds a text may wait for others to join its batch
+MICRO_BATCH_MAX_WAIT_MS = 5
+# Number of spans scored between progress reports on long documents
+SCORING_CHUNK_SIZE = 128
+# Number of sentences scored per batch when streaming results to the browser
+STREAM_CHUNK_SIZE = 4
+
+# Document-level scoring settings
+# Documents longer than the model input limit are scored in overlapping
+# token windows whose scores are averaged by window length
+DOCUMENT_WINDOW_TOKENS = 512
+DOCUMENT_WINDOW_OVERLAP = 64
+# Upper bound on windows scored per document; longer documents are sampled
+DOCUMENT_MAX_WINDOWS = 16
+
+# Emotion lexicon settings
+# Word-emotion association file in the NRC lexicon format; the bundled seed
+# lexicon is small, so point this at the full NRC lexicon in production
+EMOTION_LEXICON_PATH = os.getenv(
+    "EMOTION_LEXICON_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "emotion_lexicon_seed.txt")
+)
+# Score sentence emotions with the lexicon first and run the emotion model
+# only on sentences the lexicon is not confident about
+EMOTION_CASCADE = os.getenv("EMOTION_CASCADE", "0") == "1"
+# Lexicon confidence below which a sentence is escalated to the emotion
+# model. Confidence is the margin between the top two emotions' shares of
+# the sentence's lexicon words plus the neutral prior: 0 without lexicon
+# words, 0.5 for a single emotion word, 0.67 for two agreeing words
+LEXICON_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICON_CONFIDENCE_THRESHOLD", "0.6"))
+# Weight of the neutral prior added to every sentence, so sentences with
+# few lexicon words stay close to neutral
+LEXICON_NEUTRAL_PRIOR = 1.0
+# Fraction of confidently scored sentences also run through the model to
+# measure how often the lexicon agrees with it
+LEXICON_AUDIT_RATE = float(os.getenv("LEXICON_AUDIT_RATE", "0.05"))
+
+# Emotional arc settings
+# Sentences averaged on each side of a sentence boundary when comparing
+# the emotions before and after it
+SHIFT_WINDOW = 3
+# Smallest total variation distance, from 0 to 1, between the emotions
+# before and after a boundary for a change of dominant emotion to count
+# as an emotional shift; 0 leaves only the SHIFT_SIGNIFICANCE test
+SHIFT_MIN_DISTANCE = 0.25
+# Sentences on each side of a boundary used to estimate how much the
+# emotions vary from sentence to sentence there
+SHIFT_NOISE_WINDOW = 10
+# How strongly the emotions before and after a boundary must differ to
+# count as an emotional shift, in multiples of that variation; on pure
+# noise about 1 in 300 boundaries passes at 4
+SHIFT_SIGNIFICANCE = 4.0
+# Fewest sentences in an emotional scene
+SCENE_MIN_SENTENCES = 3
+# How strongly the emotions must change to start a new scene, in multiples
+# of the sentence-to-sentence noise of the arc times log(sentences)
+SCENE_PENALTY = 1.0
+# Sentences averaged into each point of the smoothed emotional arc
+ARC_SMOOTHING_WINDOW = 5
+
+# Score cache settings
+# Maximum number of cached (model, sentence) scores; 0 disables the cache
+SCORE_CACHE_MAX_ENTRIES = 50000
+# Upper bound on the estimated memory used by the cache
+SCORE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Incremental analysis settings
+# SQLite file holding analyzed revisions and their rendered charts, shared
+# by all server processes on the host
+REVISION_STORE_PATH = os.getenv(
+    "REVISION_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "revisions.sqlite3")
+)
+# Number of analyzed revisions kept as bases for incremental updates and charts
+REVISION_STORE_MAX_REVISIONS = 256
+
+# Background job settings
+# SQLite file holding submitted jobs, their progress and results, shared by
+# all server processes on the host
+JOB_STORE_PATH = os.getenv(
+    "JOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")
+)
+# Number of worker threads analyzing submitted manuscripts, per server process
+JOB_WORKERS = 2
+# Maximum number of jobs waiting for a worker before submissions are rejected
+JOB_MAX_QUEUED = 16
+# Number of finished jobs whose status and result are kept for polling
+JOB_MAX_FINISHED = 128
+
+# Chart settings
+# Seconds browsers may cache the PNG charts of an analyzed revision
+CHART_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Metrics settings
+# Time every analysis stage and request for GET /metrics; counters are kept either way
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Add a Server-Timing header with the stage timings to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Directory where every server process keeps a snapshot of its metrics, so
+# /metrics reports all workers together; gunicorn.conf.py sets one up
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+# Seconds between the metric snapshots of a server process
+METRICS_SNAPSHOT_SECONDS = 1.0
+
+# Production server settings, used by gunicorn.conf.py
+# Address the server listens on
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+# Threads each worker process uses for model inference (intra-op parallelism)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+# Worker processes; 0 starts one per INFERENCE_THREADS available cores. Workers
+# share revisions and jobs through REVISION_STORE_PATH and JOB_STORE_PATH
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))
+# Request threads per worker process, so streams and polling don't block analyses
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "4"))
+# Pin every worker process to its own group of INFERENCE_THREADS cores
+SERVER_PIN_CPUS = os.getenv("SERVER_PIN_CPUS", "1") == "1"
+# Seconds a request may run before its worker is restarted
+SERVER_TIMEOUT = 300
 
 # Emotion categories
 EMOTION_CATEGORIES = [
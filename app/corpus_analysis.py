@@ -0,0 +1,418 @@
+"""
+Bulk analysis of whole corpora from the command line.
+Streams documents from a directory, a JSONL file or a tarball, analyzes
+them in a pool of worker processes and writes document-level and
+sentence-level results in chunks, as CSV or Parquet. Every chunk is
+committed by one manifest record listing its part files and documents,
+so an interrupted run can be resumed without losing or repeating rows.
+
+Usage:
+    python corpus_analysis.py manuscripts/ results/ --workers 4 --format parquet
+    python corpus_analysis.py backlist.jsonl results/ --resume
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tarfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import EMOTION_CATEGORIES
+
+EMOTION_COLUMNS = [f"emotion_{emotion}" for emotion in EMOTION_CATEGORIES]
+
+DOCUMENT_COLUMNS = [
+    "doc_id", "sentences", "paragraphs", "overall_sentiment", "positive", "negative",
+    "dominant_emotion", *EMOTION_COLUMNS, "emotional_shifts", "emotional_scenes", "is_consistent",
+    "main_emotion"
+]
+
+SENTENCE_COLUMNS = [
+    "doc_id", "index", "start", "end", "sentence", "overall_sentiment", "positive", "negative",
+    "dominant_emotion", *EMOTION_COLUMNS
+]
+
+# Column types for Parquet output; all other columns are strings
+INTEGER_COLUMNS = {"sentences", "paragraphs", "emotional_shifts", "emotional_scenes", "index", "start", "end"}
+FLOAT_COLUMNS = {"positive", "negative", *EMOTION_COLUMNS}
+BOOLEAN_COLUMNS = {"is_consistent"}
+
+
+def iter_documents(source, pattern=".txt", id_field="id", text_field="text"):
+    """
+    Stream (doc_id, text) pairs from a corpus without loading it whole
+
+    Parameters:
+    -----------
+    source : str
+        A directory of text files, a .jsonl file or a tarball
+    pattern : str
+        File name suffix of the documents in a directory or tarball
+    id_field : str
+        The JSONL field holding the document id; the line number is used if missing
+    text_field : str
+        The JSONL field holding the document text
+
+    Returns:
+    --------
+    iterator
+        (doc_id, text) pairs in a stable order
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(pattern):
+                    path = os.path.join(root, name)
+                    with open(path, encoding="utf-8", errors="replace") as f:
+                        yield os.path.relpath(path, source), f.read()
+
+    elif source.endswith(".jsonl"):
+        with open(source, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record.get(id_field, line_number)), record[text_field]
+
+    elif tarfile.is_tarfile(source):
+        # Stream mode reads each member once, in archive order
+        with tarfile.open(source, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(pattern):
+                    yield member.name, archive.extractfile(member).read().decode("utf-8", errors="replace")
+
+    else:
+        raise ValueError(f"Unsupported corpus source: {source}")
+
+
+# Analyzer of the current worker process, created by _init_worker
+_analyzer = None
+
+
+def _init_worker():
+    global _analyzer
+    from sentiment_analysis import EmotionalToneAnalyzer
+    _analyzer = EmotionalToneAnalyzer()
+
+
+def _emotion_values(emotions):
+    return {f"emotion_{emotion}": emotions["scores"].get(emotion, 0.0) for emotion in EMOTION_CATEGORIES}
+
+
+def _score_column(matrix, labels, label):
+    """Return the scores of one label from a score matrix, 0.0 where missing."""
+    if label not in labels:
+        return [0.0] * len(matrix)
+    return np.nan_to_num(matrix[:, labels.index(label)]).tolist()
+
+
+def analyze_corpus_document(doc_id, text, analyzer=None):
+    """
+    Analyze one document and flatten the result into table rows
+
+    Parameters:
+    -----------
+    doc_id : str
+        The id of the document
+    text : str
+        The document text
+    analyzer : EmotionalToneAnalyzer
+        The analyzer to use, the worker process's analyzer by default
+
+    Returns:
+    --------
+    tuple
+        The document row and the list of sentence rows
+    """
+    analysis = (analyzer or _analyzer).analyze_document(text)
+    sentiment = analysis.document_sentiment
+    emotions = analysis.document_emotions
+
+    document = {
+        "doc_id": doc_id,
+        "sentences": len(analysis.sentences),
+        "paragraphs": len(analysis.paragraphs),
+        "overall_sentiment": sentiment["overall_sentiment"],
+        "positive": sentiment["scores"].get("POSITIVE", 0.0),
+        "negative": sentiment["scores"].get("NEGATIVE", 0.0),
+        "dominant_emotion": emotions["dominant_emotion"],
+        **_emotion_values(emotions),
+        "emotional_shifts": len(analysis.shift_positions),
+        "emotional_scenes": len(analysis.scene_breaks),
+        "is_consistent": len(analysis.inconsistent_paragraphs()) == 0,
+        "main_emotion": analysis.main_emotion
+    }
+
+    # Build the sentence rows column by column from the score arrays
+    table = analysis.sentences
+    columns = {
+        "start": table.offsets[:, 0].tolist(),
+        "end": table.offsets[:, 1].tolist(),
+        "sentence": table.spans(),
+        "overall_sentiment": ["positive" if positive else "negative" for positive in table.positive.tolist()],
+        "positive": _score_column(table.sentiment, table.sentiment_labels, "POSITIVE"),
+        "negative": _score_column(table.sentiment, table.sentiment_labels, "NEGATIVE"),
+        "dominant_emotion": table.dominant_emotions(),
+        **{
+            f"emotion_{emotion}": _score_column(table.emotions, table.emotion_labels, emotion)
+            for emotion in EMOTION_CATEGORIES
+        }
+    }
+    sentences = [
+        {"doc_id": doc_id, "index": index, **{column: values[index] for column, values in columns.items()}}
+        for index in range(len(table))
+    ]
+
+    return document, sentences
+
+
+def _fsync(path):
+    """Flush a file, or the entries of a directory, to disk."""
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class ChunkedTableWriter:
+    """
+    Writes table rows as numbered part files, one part per flush.
+
+    Each part is written to a temporary file and renamed into place, so
+    an interrupted run never leaves a partial part behind. Parts only
+    count once the manifest lists them: any other part or temporary file
+    in the directory is left over from an interrupted run and is deleted.
+    Numbering continues after the kept parts.
+    """
+
+    def __init__(self, directory, columns, output_format, committed=()):
+        self.directory = directory
+        self.columns = columns
+        self.output_format = output_format
+        self.rows = []
+        os.makedirs(directory, exist_ok=True)
+
+        self.part = 0
+        for name in os.listdir(directory):
+            if not name.startswith("part-"):
+                continue
+            if name in committed:
+                self.part = max(self.part, int(name[len("part-"):].split(".")[0]) + 1)
+            else:
+                os.remove(os.path.join(directory, name))
+
+    def _arrow_schema(self):
+        # Every part gets the same schema, even when a column is all empty
+        import pyarrow as pa
+        types = {column: pa.int64() for column in INTEGER_COLUMNS}
+        types.update({column: pa.float64() for column in FLOAT_COLUMNS})
+        types.update({column: pa.bool_() for column in BOOLEAN_COLUMNS})
+        return pa.schema([(column, types.get(column, pa.string())) for column in self.columns])
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self):
+        """Write the buffered rows as the next part file and return its name, or None without rows."""
+        if not self.rows:
+            return None
+        name = f"part-{self.part:05d}.{self.output_format}"
+        path = os.path.join(self.directory, name)
+        temporary = path + ".tmp"
+
+        if self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.Table.from_pylist(self.rows, schema=self._arrow_schema()), temporary)
+        else:
+            with open(temporary, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns)
+                writer.writeheader()
+                writer.writerows(self.rows)
+
+        # The part and its name must be durable before the manifest commits it
+        _fsync(temporary)
+        os.replace(temporary, path)
+        _fsync(self.directory)
+        self.part += 1
+        self.rows = []
+        return name
+
+
+def read_manifest(path):
+    """
+    Read the chunks committed by earlier runs
+
+    Every line of the manifest is one JSON record. A "done" record commits
+    a chunk: its documents count as done only together with the part files
+    holding their rows. A line cut short by an interrupted run is not
+    valid JSON and commits nothing.
+
+    Returns:
+    --------
+    tuple
+        The set of done document ids and a dict of the committed part
+        file names of each table
+    """
+    done = set()
+    parts = {"documents": set(), "sentences": set()}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == "done":
+                    done.update(record["doc_ids"])
+                    for table, name in record["parts"].items():
+                        parts[table].add(name)
+    return done, parts
+
+
+def _drop_partial_line(path):
+    """Cut a line left incomplete by an interrupted run off the end of a file."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+
+
+def analyze_corpus(source, output_dir, workers=None, output_format="csv", chunk_documents=100,
+                   resume=False, **source_options):
+    """
+    Analyze every document of a corpus and write the results in chunks
+
+    Parameters:
+    -----------
+    source : str
+        A directory of text files, a .jsonl file or a tarball
+    output_dir : str
+        Directory receiving documents/, sentences/ and manifest.jsonl
+    workers : int
+        Number of worker processes, one per CPU by default
+    output_format : str
+        "csv" or "parquet" (needs pyarrow)
+    chunk_documents : int
+        Documents per written part file
+    resume : bool
+        Whether to skip documents completed by an earlier run
+
+    Returns:
+    --------
+    dict
+        Counts of the analyzed, skipped and failed documents
+    """
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow, install it with: pip install pyarrow")
+
+    manifest_path = os.path.join(output_dir, "manifest.jsonl")
+    os.makedirs(output_dir, exist_ok=True)
+    if not resume and os.path.exists(manifest_path):
+        raise RuntimeError(f"{output_dir} already holds results; pass resume=True to continue them")
+    done, parts = read_manifest(manifest_path)
+    # New records must start on a line of their own
+    _drop_partial_line(manifest_path)
+
+    # Part files written after the last committed chunk are discarded; their
+    # documents are not done and are analyzed again
+    documents = ChunkedTableWriter(
+        os.path.join(output_dir, "documents"), DOCUMENT_COLUMNS, output_format, parts["documents"]
+    )
+    sentences = ChunkedTableWriter(
+        os.path.join(output_dir, "sentences"), SENTENCE_COLUMNS, output_format, parts["sentences"]
+    )
+    counts = {"analyzed": 0, "skipped": 0, "failed": 0}
+    completed = []
+
+    def flush(manifest):
+        if not completed:
+            return
+        # The rows go to disk first; the single manifest line written after
+        # them commits the parts and their documents at once
+        written = {"documents": documents.flush(), "sentences": sentences.flush()}
+        record = {
+            "status": "done",
+            "doc_ids": completed,
+            "parts": {table: name for table, name in written.items() if name is not None}
+        }
+        manifest.write(json.dumps(record) + "\n")
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        completed.clear()
+
+    workers = workers or os.cpu_count() or 1
+    # At most this many documents are held in memory at once
+    max_in_flight = workers * 2
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        in_flight = {}
+
+        def collect(return_when):
+            finished, _ = wait(in_flight, return_when=return_when)
+            for future in finished:
+                doc_id = in_flight.pop(future)
+                try:
+                    document, sentence_rows = future.result()
+                except Exception as e:
+                    print(f"Error analyzing {doc_id}: {e}")
+                    manifest.write(json.dumps({"doc_id": doc_id, "status": "failed", "error": str(e)}) + "\n")
+                    counts["failed"] += 1
+                    continue
+                documents.write([document])
+                sentences.write(sentence_rows)
+                completed.append(doc_id)
+                counts["analyzed"] += 1
+                if len(completed) >= chunk_documents:
+                    flush(manifest)
+
+        for doc_id, text in iter_documents(source, **source_options):
+            if doc_id in done:
+                counts["skipped"] += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                collect(FIRST_COMPLETED)
+            in_flight[pool.submit(analyze_corpus_document, doc_id, text)] = doc_id
+
+        if in_flight:
+            collect(ALL_COMPLETED)
+        flush(manifest)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the emotional tone of a whole corpus")
+    parser.add_argument("source", help="directory of text files, .jsonl file or tarball")
+    parser.add_argument("output_dir", help="directory for the results")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-documents", type=int, default=100, help="documents per output part file")
+    parser.add_argument("--resume", action="store_true", help="skip documents completed by an earlier run")
+    parser.add_argument("--pattern", default=".txt", help="suffix of document files in a directory or tarball")
+    parser.add_argument("--id-field", default="id", help="JSONL field holding the document id")
+    parser.add_argument("--text-field", default="text", help="JSONL field holding the document text")
+    args = parser.parse_args()
+
+    counts = analyze_corpus(
+        args.source, args.output_dir, workers=args.workers, output_format=args.format,
+        chunk_documents=args.chunk_documents, resume=args.resume,
+        pattern=args.pattern, id_field=args.id_field, text_field=args.text_field
+    )
+    print(f"Analyzed {counts['analyzed']} documents, skipped {counts['skipped']}, failed {counts['failed']}")
+
+
+if __name__ == "__main__":
+    main()
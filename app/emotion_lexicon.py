@@ -0,0 +1,154 @@
+"""
+Array-backed emotion lexicon.
+Loads word-emotion associations in the NRC lexicon format into a sorted
+vocabulary array and a word x emotion weight matrix, and scores whole
+batches of sentences with vectorized lookups.
+"""
+
+import re
+import threading
+
+import numpy as np
+
+# Lowercase words, keeping inner apostrophes ("don't")
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)*")
+
+
+def load_lexicon(path, emotions, neutral_prior=1.0):
+    """
+    Read a word-emotion lexicon file in the NRC format
+
+    Parameters:
+    -----------
+    path : str
+        File with one "word<TAB>emotion<TAB>association" line per pair;
+        blank lines and lines starting with "#" are ignored
+    emotions : list
+        The emotions to keep; other NRC categories such as "trust" or
+        "positive" are dropped
+    neutral_prior : float
+        Weight given to "neutral" in every scored text
+
+    Returns:
+    --------
+    EmotionLexicon
+        The lexicon of every word with a non-zero association
+    """
+    associations = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 3 or fields[0].startswith("#"):
+                continue
+            word, emotion, value = fields
+            if emotion in emotions and float(value) > 0:
+                associations.setdefault(word.lower(), {})[emotion] = float(value)
+    return EmotionLexicon(associations, emotions, neutral_prior)
+
+
+class EmotionLexicon:
+    """
+    Word-emotion associations as a sorted vocabulary and a weight matrix.
+
+    Row i of weights holds the association of words[i] with each emotion.
+    A text's emotion scores are the summed rows of its words plus a neutral
+    prior, normalized to sum to one.
+    """
+
+    def __init__(self, associations, emotions, neutral_prior=1.0):
+        self.emotions = list(emotions)
+        self.words = np.array(sorted(associations), dtype=str)
+        self.weights = np.zeros((len(self.words), len(self.emotions)), dtype=np.float32)
+        columns = {emotion: column for column, emotion in enumerate(self.emotions)}
+        for row, word in enumerate(self.words.tolist()):
+            for emotion, value in associations[word].items():
+                self.weights[row, columns[emotion]] = value
+
+        self.prior = np.zeros(len(self.emotions), dtype=np.float32)
+        if "neutral" in columns:
+            self.prior[columns["neutral"]] = neutral_prior
+
+    def __len__(self):
+        return len(self.words)
+
+    def word_weights(self, texts):
+        """Return the summed emotion weights of the lexicon words of every text, one row per text."""
+        tokens = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+        weights = np.zeros((len(texts), len(self.emotions)), dtype=np.float32)
+        flat = np.array([token for text_tokens in tokens for token in text_tokens], dtype=str)
+        if not len(flat) or not len(self.words):
+            return weights
+
+        # Find every token in the sorted vocabulary at once
+        rows = np.minimum(np.searchsorted(self.words, flat), len(self.words) - 1)
+        known = self.words[rows] == flat
+        owners = np.repeat(np.arange(len(texts)), [len(text_tokens) for text_tokens in tokens])
+        np.add.at(weights, owners[known], self.weights[rows[known]])
+        return weights
+
+    def classify(self, texts):
+        """
+        Score the emotions of texts with the lexicon
+
+        Parameters:
+        -----------
+        texts : list
+            The texts to score
+
+        Returns:
+        --------
+        tuple
+            The emotion result of every text, in the analyzer's dict form,
+            and an array of confidences: the margin between the shares of
+            the top two emotions among the text's lexicon words and the
+            neutral prior
+        """
+        word_weights = self.word_weights(texts)
+        totals = word_weights.sum(axis=1, keepdims=True) + self.prior.sum()
+        scores = np.divide(word_weights + self.prior, totals, out=np.zeros_like(word_weights), where=totals > 0)
+
+        # Only the words count as evidence: a text without lexicon words has
+        # no confidence, however neutral its scores
+        word_scores = np.divide(word_weights, totals, out=np.zeros_like(word_weights), where=totals > 0)
+        top_two = np.sort(word_scores, axis=1)[:, -2:]
+        confidences = top_two[:, 1] - top_two[:, 0]
+        dominant = scores.argmax(axis=1)
+
+        results = [
+            {
+                "scores": dict(zip(self.emotions, row)),
+                "dominant_emotion": self.emotions[index]
+            }
+            for row, index in zip(scores.tolist(), dominant.tolist())
+        ]
+        return results, confidences
+
+
+class CascadeStats:
+    """Thread-safe counts of the texts scored by the lexicon-first cascade."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = 0
+        self._escalated = 0
+        self._audited = 0
+        self._agreed = 0
+
+    def record(self, texts, escalated, audited, agreed):
+        """Count one cascade call."""
+        with self._lock:
+            self._texts += texts
+            self._escalated += escalated
+            self._audited += audited
+            self._agreed += agreed
+
+    def stats(self):
+        """Return the escalation rate and the audited agreement with the model."""
+        with self._lock:
+            return {
+                "texts": self._texts,
+                "escalated": self._escalated,
+                "escalation_rate": self._escalated / self._texts if self._texts else 0.0,
+                "audited": self._audited,
+                "audit_agreement": self._agreed / self._audited if self._audited else None
+            }
@@ -0,0 +1,133 @@
+"""
+Gunicorn configuration for serving the app in production.
+The app and its models are loaded once in the master process and shared
+copy-on-write by the forked workers. Each worker is pinned to its own
+group of cores and runs inference on that many threads. Revisions, charts
+and background jobs are kept in SQLite files shared by all workers on the
+host, so any worker can serve any request. Every worker keeps a snapshot
+of its metrics in METRICS_MULTIPROC_DIR, so /metrics reports all workers.
+
+Usage (from the app directory):
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+import os
+import sys
+import tempfile
+
+# Workers share their metrics through this directory; it must be set
+# before the config is imported
+own_metrics_dir = not os.getenv("METRICS_MULTIPROC_DIR")
+if own_metrics_dir:
+    os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="writing-assistant-metrics-")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    SERVER_BIND,
+    SERVER_WORKERS,
+    SERVER_THREADS,
+    SERVER_PIN_CPUS,
+    SERVER_TIMEOUT,
+    INFERENCE_THREADS,
+    INFERENCE_BACKEND,
+    REVISION_STORE_PATH,
+    JOB_STORE_PATH
+)
+from metrics import REGISTRY
+
+# Cores this server may use, split into one group per worker
+if hasattr(os, "sched_getaffinity"):
+    cores = sorted(os.sched_getaffinity(0))
+else:
+    cores = list(range(os.cpu_count() or 1))
+
+bind = SERVER_BIND
+workers = SERVER_WORKERS or max(len(cores) // INFERENCE_THREADS, 1)
+worker_class = "gthread"
+threads = SERVER_THREADS
+timeout = SERVER_TIMEOUT
+# Import the app in the master so workers inherit it instead of loading their own
+preload_app = True
+
+
+def _core_group(slot):
+    """Return the cores of a worker slot."""
+    start = slot * INFERENCE_THREADS
+    return {cores[(start + i) % len(cores)] for i in range(INFERENCE_THREADS)}
+
+
+def on_starting(server):
+    # Counts of an earlier run must not add up with this one
+    REGISTRY.clear_snapshots()
+
+
+def when_ready(server):
+    from sentiment_analysis import models
+
+    # The master never serves requests; a single thread keeps OpenMP from
+    # starting a thread pool (e.g. while tracing) that forked workers could not use
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    # ONNX Runtime sessions do not survive a fork, so workers load those
+    # themselves
+    if INFERENCE_BACKEND == "onnx":
+        models.warm_up(["nltk"], background=False)
+    else:
+        models.warm_up(background=False)
+
+    # Keep the garbage collector from touching, and so copying, the shared objects
+    gc.collect()
+    gc.freeze()
+    server.log.info("Models loaded in the master: %s", ", ".join(
+        name for name, status in models.status().items() if status["state"] == "loaded"
+    ))
+    server.log.info("%s workers share the revisions in %s and the jobs in %s",
+                    workers, REVISION_STORE_PATH, JOB_STORE_PATH)
+    server.log.info("Workers report their metrics through %s", REGISTRY.multiproc_dir)
+
+
+def pre_fork(server, worker):
+    # Give the new worker the first core group no live worker is using
+    used = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(server.WORKERS) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    if SERVER_PIN_CPUS and hasattr(os, "sched_setaffinity"):
+        group = _core_group(worker.cpu_slot % workers)
+        os.sched_setaffinity(0, group)
+        server.log.info("Worker %s pinned to cores %s", worker.pid, sorted(group))
+
+    try:
+        import torch
+        torch.set_num_threads(INFERENCE_THREADS)
+    except ImportError:
+        pass
+
+    if INFERENCE_BACKEND == "onnx":
+        from sentiment_analysis import models
+        models.warm_up()
+
+    # Counts the worker inherited from the master would be reported by every worker
+    REGISTRY.reset()
+    REGISTRY.start_snapshots()
+
+
+def worker_exit(server, worker):
+    # Keep the counts since the last snapshot of a worker that shuts down
+    REGISTRY.write_snapshot()
+
+
+def child_exit(server, worker):
+    REGISTRY.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    REGISTRY.clear_snapshots()
+    if own_metrics_dir:
+        os.rmdir(REGISTRY.multiproc_dir)
@@ -0,0 +1,324 @@
+"""
+Incremental re-analysis of edited drafts.
+Finds the characters a new revision of a document changed and re-plans
+and re-scores only the paragraphs around them. The scores, shifts,
+scenes and document windows of the rest of the stored analysis are
+carried over, so an edit costs about the same in a short story as in a
+novel.
+"""
+
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from analysis_result import AnalysisResult, SpanTable
+from config import SHIFT_WINDOW, SHIFT_NOISE_WINDOW
+
+# Characters compared at once while looking for the unchanged start and end of a revision
+COMPARE_BLOCK = 4096
+
+# Paragraph breaks after an edit tried as the end of the re-planned text
+# before the rest of the document is re-planned too
+MAX_RESYNC_ATTEMPTS = 4
+
+
+def diff_spans(old_spans, new_spans):
+    """Return difflib opcodes turning the old list of spans into the new one."""
+    matcher = SequenceMatcher(None, old_spans, new_spans, autojunk=False)
+    return matcher.get_opcodes()
+
+
+def _common_prefix(old, new):
+    """Return the length of the longest common prefix of two strings."""
+    limit = min(len(old), len(new))
+    length = 0
+    # Whole blocks are compared at memcmp speed, then the first differing
+    # one is bisected
+    while length + COMPARE_BLOCK <= limit and old[length:length + COMPARE_BLOCK] == new[length:length + COMPARE_BLOCK]:
+        length += COMPARE_BLOCK
+    low, high = length, min(length + COMPARE_BLOCK, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[length:middle] == new[length:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(old, new, limit):
+    """Return the length of the longest common suffix of two strings, up to limit."""
+    def same(start, end):
+        # Whether the characters start to end from the ends of both strings match
+        return old[len(old) - end:len(old) - start] == new[len(new) - end:len(new) - start]
+
+    length = 0
+    while length + COMPARE_BLOCK <= limit and same(length, length + COMPARE_BLOCK):
+        length += COMPARE_BLOCK
+    low, high = length, min(length + COMPARE_BLOCK, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if same(length, middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def edited_range(old, new):
+    """
+    Return the characters that differ between two revisions of a text.
+
+    Returns (start, old_end, new_end) such that new[start:new_end]
+    replaced old[start:old_end] and everything around it is unchanged.
+    """
+    start = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - start)
+    return start, len(old) - suffix, len(new) - suffix
+
+
+def _replanned_range(previous, text, start, old_end, new_end):
+    """
+    Return the part of an edited document whose paragraphs are planned afresh.
+
+    The part starts right after the last paragraph break before the edit
+    and ends at the first paragraph break after it at which both
+    revisions split the text, so every paragraph outside it, and every
+    sentence, is the same in both revisions, only moved. Returns the
+    start of the part, its end in the old and in the new text, and the
+    range of old paragraph rows it replaces.
+    """
+    offsets = previous.paragraphs.offsets
+    shift = new_end - old_end
+
+    # Paragraphs ending, together with the break after them, before the edit are kept
+    first = int(np.searchsorted(offsets[:, 1] + 2, start, side="right"))
+    region_start = int(offsets[first - 1, 1]) + 2 if first else 0
+
+    # A paragraph after the edit starts a paragraph in the new text too when
+    # splitting the re-planned part at paragraph breaks leaves nothing after
+    # the last break, as segment_paragraphs splits the whole text
+    last = int(np.searchsorted(offsets[:, 0] - 2, old_end, side="left"))
+    for candidate in range(last, min(last + MAX_RESYNC_ATTEMPTS, len(offsets))):
+        old_region_end = int(offsets[candidate, 0])
+        if text[region_start:old_region_end + shift].split("\n\n")[-1] == "":
+            return region_start, old_region_end, old_region_end + shift, first, candidate
+    return region_start, len(previous.text), len(text), first, len(offsets)
+
+
+def _splice_opcodes(opcodes, first, old_end, old_count, new_end, new_count):
+    """
+    Return the opcodes of a whole table from the diff of its rows first to old_end.
+
+    Those rows became rows first to new_end; the rows around them are
+    unchanged and join the equal blocks next to them.
+    """
+    spliced = [("equal", 0, first, 0, first)]
+    spliced.extend((tag, i1 + first, i2 + first, j1 + first, j2 + first) for tag, i1, i2, j1, j2 in opcodes)
+    spliced.append(("equal", old_end, old_count, new_end, new_count))
+
+    merged = []
+    for opcode in spliced:
+        tag, i1, i2, j1, j2 = opcode
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged and tag == merged[-1][0] == "equal":
+            merged[-1] = ("equal", merged[-1][1], i2, merged[-1][3], j2)
+        else:
+            merged.append(opcode)
+    return merged
+
+
+def _reusable_positions(opcodes, count, old_count, halo):
+    """
+    Return a mask of the sentence positions whose shift status carries over.
+
+    A shift at position p depends on the scores of sentences p - halo to
+    p + halo - 1, so it carries over when all of them lie in one unchanged
+    block. Windows clipped at the start or end of the document carry over
+    when the block touches the same edge in both revisions.
+    """
+    reusable = np.zeros(count + 1, dtype=bool)
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            continue
+        first = j1 + 1 if i1 == j1 == 0 else j1 + halo
+        last = j2 - 1 if (i2 == old_count and j2 == count) else j2 - halo
+        first = max(first, j1 + 1)
+        if first <= last:
+            reusable[first:last + 1] = True
+    return reusable
+
+
+def _patch_shifts(analyzer, previous, sentences, opcodes):
+    """Reuse shifts inside unchanged blocks and recompute them around edits."""
+    # A shift depends on the sentences within both its window and its noise window
+    halo = max(SHIFT_WINDOW, SHIFT_NOISE_WINDOW)
+    reusable = _reusable_positions(opcodes, len(sentences), len(previous.sentences), halo)
+    shifts = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            continue
+        positions = previous.shift_positions[(previous.shift_positions > i1) & (previous.shift_positions < i2)]
+        positions = positions - i1 + j1
+        shifts.extend(positions[reusable[positions]].tolist())
+
+    positions = np.flatnonzero(~reusable[1:len(sentences)]) + 1
+    shifts.extend(analyzer._detect_emotional_shifts(sentences.emotions, sentences.dominant, positions).tolist())
+    return sorted(shifts)
+
+
+def _patch_scenes(analyzer, previous, emotions, first, old_end, new_end):
+    """
+    Segment the scenes around the re-planned sentences first to old_end again.
+
+    The scenes that hold those sentences and one scene on either side are
+    segmented again; the breaks of all other scenes are kept, moved.
+    """
+    breaks = previous.scene_breaks
+    old_count = len(previous.sentences)
+    if not len(breaks) or not len(emotions):
+        return analyzer._segment_scenes(emotions)
+
+    # The scene before the one holding the first re-planned sentence, and
+    # the scene after the one holding the last
+    low = max(int(np.searchsorted(breaks, first, side="right")) - 2, 0)
+    last = min(max(old_end - 1, first), old_count - 1)
+    high = min(int(np.searchsorted(breaks, last, side="right")), len(breaks) - 1)
+
+    start = int(breaks[low])
+    old_stop = int(breaks[high + 1]) if high + 1 < len(breaks) else old_count
+    stop = old_stop + new_end - old_end
+    if stop <= start:
+        return analyzer._segment_scenes(emotions)
+
+    kept = np.concatenate([breaks[:low + 1], breaks[high + 1:] + new_end - old_end])
+    return analyzer._resegment_scenes(emotions, kept, start, stop)
+
+
+def _patch_main_emotion(analyzer, previous_main_emotion, paragraphs):
+    """Keep the previous main emotion while it is still among the most common ones."""
+    labels = paragraphs.emotion_labels
+    if not len(paragraphs) or previous_main_emotion not in labels:
+        return analyzer._main_emotion(paragraphs)
+
+    counts = np.bincount(paragraphs.dominant, minlength=len(labels))
+    if counts[labels.index(previous_main_emotion)] != counts.max():
+        # The main emotion changed, so it is chosen afresh
+        return analyzer._main_emotion(paragraphs)
+    return previous_main_emotion
+
+
+def _patch_ops(opcodes, entries, key):
+    """
+    Describe the changed ranges of a diff together with their new entries.
+
+    entries is called as entries(start, end) to build the new entries of a range.
+    """
+    return [
+        {
+            "op": tag,
+            "old_range": [i1, i2],
+            "new_range": [j1, j2],
+            key: entries(j1, j2)
+        }
+        for tag, i1, i2, j1, j2 in opcodes
+        if tag != "equal"
+    ]
+
+
+def analyze_incremental(analyzer, previous, text):
+    """
+    Analyze a new revision of a document against a previous analysis.
+
+    Parameters:
+    -----------
+    analyzer : EmotionalToneAnalyzer
+        The analyzer used for the previous revision
+    previous : AnalysisResult
+        The analyze_document result of the previous revision
+    text : str
+        The full text of the new revision
+
+    Returns:
+    --------
+    tuple
+        The AnalysisResult of the new revision and a patch describing
+        how it differs from the previous one
+
+    Only the paragraphs around the edited characters are planned and
+    diffed, and only their new spans are scored. The sentences and
+    paragraphs, their scores and the shifts are those a fresh analysis
+    would find. The document scores are pooled from the previous
+    revision's token windows, with the windows the edit touched scored
+    again, so they can differ slightly from those of a fresh analysis,
+    whose windows may fall elsewhere. Emotional scenes are segmented
+    again near the edit only, so they can differ too.
+    """
+    start, old_end, new_end = edited_range(previous.text, text)
+    region_start, old_region_end, region_end, first_paragraph, last_paragraph = _replanned_range(
+        previous, text, start, old_end, new_end
+    )
+    shift = region_end - old_region_end
+    first_sentence, last_sentence = np.searchsorted(
+        previous.sentences.offsets[:, 0], [region_start, old_region_end]
+    ).tolist()
+
+    plan = analyzer.plan_document(text[region_start:region_end])
+
+    # Spans of the re-planned paragraphs that were already scored keep their
+    # scores; only new spans reach the models
+    scores = previous.sentences.span_scores(first_sentence, last_sentence)
+    scores.update(previous.paragraphs.span_scores(first_paragraph, last_paragraph))
+    missing = [span for span in plan["spans"] if span not in scores]
+    scores.update(analyzer.score_spans(missing))
+
+    new_sentences = SpanTable.from_scores(
+        text, [(span_start + region_start, span_end + region_start) for span_start, span_end in plan["sentence_offsets"]],
+        scores
+    )
+    new_paragraphs = SpanTable.from_scores(
+        text, [(span_start + region_start, span_end + region_start) for span_start, span_end in plan["paragraph_offsets"]],
+        scores
+    )
+    sentences = previous.sentences.splice(text, first_sentence, last_sentence, new_sentences, shift)
+    paragraphs = previous.paragraphs.splice(text, first_paragraph, last_paragraph, new_paragraphs, shift)
+
+    sentence_opcodes = _splice_opcodes(
+        diff_spans(previous.sentences.spans(first_sentence, last_sentence), new_sentences.spans()),
+        first_sentence, last_sentence, len(previous.sentences),
+        first_sentence + len(new_sentences), len(sentences)
+    )
+    paragraph_opcodes = _splice_opcodes(
+        diff_spans(previous.paragraphs.spans(first_paragraph, last_paragraph), new_paragraphs.spans()),
+        first_paragraph, last_paragraph, len(previous.paragraphs),
+        first_paragraph + len(new_paragraphs), len(paragraphs)
+    )
+
+    document_windows = analyzer.score_document_windows(text, previous.document_windows, (start, old_end, new_end))
+    document_sentiment, document_emotions = analyzer.document_scores(text, document_windows)
+
+    analysis = AnalysisResult(
+        text, sentences, paragraphs, document_sentiment, document_emotions,
+        _patch_shifts(analyzer, previous, sentences, sentence_opcodes),
+        _patch_main_emotion(analyzer, previous.main_emotion, paragraphs),
+        _patch_scenes(
+            analyzer, previous, sentences.emotions, first_sentence, last_sentence, first_sentence + len(new_sentences)
+        ),
+        document_windows
+    )
+
+    kept_rows = len(previous.sentences) - (last_sentence - first_sentence) \
+        + len(previous.paragraphs) - (last_paragraph - first_paragraph)
+    patch = {
+        "document_sentiment": analysis["document_sentiment"],
+        "document_emotions": analysis["document_emotions"],
+        "sentence_ops": _patch_ops(sentence_opcodes, analysis.sentence_entries, "sentences"),
+        "paragraph_ops": _patch_ops(paragraph_opcodes, analysis.paragraph_entries, "paragraphs"),
+        "emotional_shifts": analysis["emotional_shifts"],
+        "consistency_check": analysis["consistency_check"],
+        "rescored_spans": len(missing),
+        "reused_spans": kept_rows + len(plan["spans"]) - len(missing)
+    }
+
+    return analysis, patch
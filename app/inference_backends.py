@@ -0,0 +1,160 @@
+"""
+Inference backends for the transformer classifiers.
+Builds a text-classification pipeline for a model on one of several
+CPU backends. The backends trade load time for faster inference.
+
+- pytorch: eager PyTorch in FP32, the reference
+- torchscript: the model traced into a TorchScript graph
+- quantized: Linear layers quantized to INT8 with dynamic quantization
+- onnx: the model exported to ONNX and run by ONNX Runtime (needs optimum)
+- stub: no model at all, deterministic scores for offline benchmarks
+"""
+
+import hashlib
+import re
+import time
+
+from config import INFERENCE_THREADS, EMOTION_CATEGORIES, STUB_MODEL_MS_PER_TEXT
+
+INFERENCE_BACKENDS = ("pytorch", "torchscript", "quantized", "onnx", "stub")
+
+# Labels the stub backend scores for each pipeline task
+STUB_LABELS = {
+    "sentiment-analysis": ("NEGATIVE", "POSITIVE"),
+    "text-classification": tuple(EMOTION_CATEGORIES)
+}
+
+
+def load_pipeline(task, model_name, backend="pytorch"):
+    """
+    Build a transformers pipeline that runs the model on the given backend
+
+    Parameters:
+    -----------
+    task : str
+        The pipeline task, e.g. "text-classification"
+    model_name : str
+        The name of the pre-trained model
+    backend : str
+        One of INFERENCE_BACKENDS
+
+    Returns:
+    --------
+    Pipeline
+        A pipeline returning the scores of all labels for every input
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    if backend == "stub":
+        return StubPipeline(model_name, STUB_LABELS[task], STUB_MODEL_MS_PER_TEXT)
+
+    from transformers import pipeline
+
+    if backend == "pytorch":
+        return pipeline(task, model=model_name, return_all_scores=True)
+
+    if backend == "onnx":
+        model, tokenizer = _load_onnx_model(model_name)
+    else:
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if backend == "quantized":
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+            model = _quantize_model(model)
+        else:
+            # TorchScript needs the model to return plain tuples
+            model = AutoModelForSequenceClassification.from_pretrained(model_name, torchscript=True).eval()
+            model = _trace_model(model, tokenizer)
+
+    return pipeline(task, model=model, tokenizer=tokenizer, return_all_scores=True)
+
+
+def _quantize_model(model):
+    """Quantize the Linear layers of a model to INT8 weights."""
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _trace_model(model, tokenizer):
+    """
+    Replace the forward pass of a model with a traced TorchScript graph.
+
+    The model object is kept, so the pipeline still finds its config and
+    label names; only the computation runs through the traced graph.
+    """
+    import torch
+    from transformers.modeling_outputs import SequenceClassifierOutput
+
+    sample = tokenizer(["A short sample sentence.", "Another one."], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask") if name in sample]
+    with torch.no_grad():
+        traced = torch.jit.trace(model, tuple(sample[name] for name in input_names))
+    traced = torch.jit.freeze(traced.eval())
+
+    def forward(**inputs):
+        return SequenceClassifierOutput(logits=traced(*(inputs[name] for name in input_names))[0])
+
+    model.forward = forward
+    return model
+
+
+def _load_onnx_model(model_name):
+    """Export a model to ONNX and load it into an ONNX Runtime session."""
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError:
+        print("The onnx backend needs optimum, install it with: pip install optimum[onnxruntime]")
+        raise
+    import onnxruntime
+    from transformers import AutoTokenizer
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = INFERENCE_THREADS
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_name, export=True, session_options=session_options
+    )
+    return model, tokenizer
+
+
+class StubTokenizer:
+    """Splits text into word and punctuation tokens, with their offsets, like a fast tokenizer."""
+
+    TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, **kwargs):
+        return {"offset_mapping": [match.span() for match in self.TOKEN_PATTERN.finditer(text)]}
+
+
+class StubPipeline:
+    """
+    A deterministic stand-in for a text-classification pipeline.
+
+    The scores of a text come from a hash of the model name and the text,
+    so every run gives the same results without downloading or running a
+    model. Each call sleeps ms_per_text for every text it scores.
+    """
+
+    def __init__(self, model_name, labels, ms_per_text=0.0):
+        self.model_name = model_name
+        self.labels = labels
+        self.ms_per_text = ms_per_text
+        self.tokenizer = StubTokenizer()
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        if self.ms_per_text:
+            time.sleep(self.ms_per_text * len(texts) / 1000)
+        return [self._scores(text) for text in texts]
+
+    def _scores(self, text):
+        digest = hashlib.blake2b(f"{self.model_name}\0{text}".encode("utf-8"), digest_size=16).digest()
+        weights = [byte + 1 for byte in digest[:len(self.labels)]]
+        total = sum(weights)
+        return [{"label": label, "score": weight / total} for label, weight in zip(self.labels, weights)]
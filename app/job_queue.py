@@ -0,0 +1,311 @@
+"""
+Job queue for long-running analyses, shared by all server processes.
+Keeps submitted jobs, their progress and results in SQLite, and runs
+them on a bounded pool of worker threads in every process that uses the
+queue, so large manuscripts are analyzed outside the request thread and
+any process on the host can report on or cancel any job.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation was requested."""
+
+
+# Columns of the jobs table read into a Job
+JOB_COLUMNS = (
+    "id", "status", "done", "total", "result", "error", "cancel_requested",
+    "created_at", "started_at", "finished_at"
+)
+
+
+class Job:
+    """A unit of work tracked by the job queue, as last read from or written to the store."""
+
+    def __init__(self, id, status="queued", done=0, total=0, result=None, error=None,
+                 cancel_requested=False, created_at=None, started_at=None, finished_at=None, queue=None):
+        self.id = id
+        self.status = status
+        self.done = done
+        self.total = total
+        self.result = json.loads(result) if isinstance(result, str) else result
+        self.error = error
+        self.cancel_requested = bool(cancel_requested)
+        self.created_at = created_at
+        self.started_at = started_at
+        self.finished_at = finished_at
+        # Set while a worker of this process runs the job
+        self._queue = queue
+        self._reported_at = 0.0
+
+    @classmethod
+    def from_row(cls, row, queue=None):
+        return cls(*row, queue=queue)
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def report_progress(self, done, total):
+        """
+        Record progress; raises JobCancelled if the job was cancelled.
+
+        Progress is written, and cancellation checked, at most every
+        progress_interval seconds of the queue, plus on completion.
+        """
+        self.done = done
+        self.total = total
+        now = time.monotonic()
+        if self._queue is None or (now - self._reported_at < self._queue.progress_interval and done < total):
+            return
+        self._reported_at = now
+        if self._queue._report_progress(self):
+            raise JobCancelled()
+
+    def to_dict(self):
+        """Return the job status without its result."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobQueue:
+    """
+    A bounded job queue in SQLite served by worker threads in every process.
+
+    handler is called as handler(job, *args) and its JSON-serializable
+    return value becomes the job result. Handlers report progress through
+    job.report_progress, which is also where cancellation of a running
+    job takes effect. Workers claim queued jobs in submission order;
+    running jobs of a process that exited are marked as failed.
+    """
+
+    def __init__(self, path, handler, workers, max_queued, max_finished, poll_seconds=1.0,
+                 progress_interval=0.5):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.poll_seconds = poll_seconds
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._threads = []
+        self._wake = threading.Event()
+
+    def _connect(self):
+        # Connections must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " done INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " error TEXT,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " args BLOB,"
+                " owner_pid INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def submit(self, *args):
+        """Queue a new job and return it; raises QueueFullError when full."""
+        self._ensure_workers()
+
+        job = Job(uuid.uuid4().hex, created_at=time.time())
+        data = pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            connection = self._connect()
+            # The count and the insert happen in one transaction, so
+            # concurrent submissions cannot overfill the queue
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                queued = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= self.max_queued:
+                    raise QueueFullError("Too many jobs are waiting, try again later")
+                connection.execute(
+                    "INSERT INTO jobs (id, status, created_at, args) VALUES (?, 'queued', ?, ?)",
+                    (job.id, job.created_at, data)
+                )
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given id, or None if it is unknown."""
+        self._ensure_workers()
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def cancel(self, job_id):
+        """Request cancellation of a job; returns the job or None if unknown."""
+        with self._lock:
+            connection = self._connect()
+            # A queued job is cancelled at once, a running one at its next progress report
+            connection.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?, args = NULL"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            connection.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+            connection.commit()
+        return self.get(job_id)
+
+    def pending(self):
+        """Return the number of jobs waiting for a worker."""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _ensure_workers(self):
+        # Workers start on first use so importing the app (or forking
+        # server processes) never leaves threads behind; a forked process
+        # starts its own
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _claim(self):
+        """Mark the oldest queued job as running in this process and return it with its arguments."""
+        with self._lock:
+            connection = self._connect()
+            self._fail_orphans(connection)
+            # The select and the update happen in one write transaction, so
+            # no other process can claim the same job in between
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    f"SELECT {', '.join(JOB_COLUMNS)}, args FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    job = Job.from_row(row[:-1], queue=self)
+                    job.status = "running"
+                    job.started_at = time.time()
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, owner_pid = ? WHERE id = ?",
+                        (job.started_at, os.getpid(), job.id)
+                    )
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+        if row is None:
+            return None, None
+        return job, pickle.loads(row[-1])
+
+    def _fail_orphans(self, connection):
+        # Jobs whose process exited while running them can never finish
+        running = connection.execute(
+            "SELECT id, owner_pid FROM jobs WHERE status = 'running'"
+        ).fetchall()
+        for job_id, pid in running:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, args = NULL"
+                    " WHERE id = ? AND status = 'running'",
+                    ("The process running this job exited", time.time(), job_id)
+                )
+            except PermissionError:
+                pass
+        connection.commit()
+
+    def _report_progress(self, job):
+        """Write the progress of a running job and return whether it was cancelled."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("UPDATE jobs SET done = ?, total = ? WHERE id = ?", (job.done, job.total, job.id))
+            connection.commit()
+            cancelled = connection.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job.id,)
+            ).fetchone()
+        job.cancel_requested = bool(cancelled and cancelled[0])
+        return job.cancel_requested
+
+    def _work(self):
+        while True:
+            try:
+                job, args = self._claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming a job: {e}")
+                job = None
+            if job is None:
+                # Jobs submitted by this process wake the worker at once,
+                # those of other processes are found by polling
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            try:
+                result = self.handler(job, *args)
+                self._finish(job, "completed", result=result)
+            except JobCancelled:
+                self._finish(job, "cancelled")
+            except Exception as e:
+                print(f"Error running job {job.id}: {e}")
+                self._finish(job, "failed", error=str(e))
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "UPDATE jobs SET status = ?, done = ?, total = ?, result = ?, error = ?, finished_at = ?,"
+                " args = NULL WHERE id = ?",
+                (status, job.done, job.total, json.dumps(result) if result is not None else None, error,
+                 time.time(), job.id)
+            )
+            # Forget the oldest finished jobs beyond the retention limit
+            connection.execute(
+                "DELETE FROM jobs WHERE id IN ("
+                " SELECT id FROM jobs WHERE status IN ('completed', 'failed', 'cancelled')"
+                " ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_finished,)
+            )
+            connection.commit()
@@ -0,0 +1,342 @@
+"""
+Lightweight in-process metrics.
+Counters, latency histograms and stage timers that are rendered in the
+Prometheus text format by GET /metrics, plus per-request stage timings
+for the Server-Timing header. With several server processes, each one
+keeps a snapshot of its metrics in a shared directory and /metrics
+reports all of them together.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from config import METRICS_ENABLED, LATENCY_BUCKETS, METRICS_MULTIPROC_DIR, METRICS_SNAPSHOT_SECONDS
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def histogram_samples(buckets, counts, total, labels=None):
+    """
+    Build the samples of a Prometheus histogram from per-bucket counts
+
+    Parameters:
+    -----------
+    buckets : list
+        Upper bounds of the buckets, in increasing order
+    counts : list
+        Number of observations in each bucket, plus one for the
+        observations above the last bound
+    total : float
+        Sum of all observations
+    labels : dict
+        Labels shared by all samples
+
+    Returns:
+    --------
+    list
+        (suffix, labels, value) samples with cumulative bucket counts
+    """
+    labels = labels or {}
+    samples = []
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [float("inf")], counts):
+        cumulative += count
+        samples.append(("_bucket", dict(labels, le=_format_value(float(bound))), cumulative))
+    samples.append(("_sum", labels, total))
+    samples.append(("_count", labels, cumulative))
+    return samples
+
+
+class Counter:
+    """A monotonically increasing count, one per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        """Add amount to the count of the given label values."""
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Observations counted into fixed buckets, one histogram per combination of label values."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """Count one observation for the given label values."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labelvalues, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[labelvalues] = (counts, total + value)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            samples.extend(histogram_samples(self.buckets, counts, total, dict(zip(self.labelnames, key))))
+        return samples
+
+
+class Registry:
+    """
+    The metrics of one process.
+
+    Metrics created through counter() and histogram() are rendered with
+    their current values. Collectors are called on every render and
+    return (name, type, help, samples) families, which lets components
+    that keep their own statistics report them without double counting.
+
+    With a multiproc_dir, every process writes its families to a file of
+    its own there, and render() reports the families of all processes:
+    counters and histograms are summed, gauges get a pid label.
+    """
+
+    def __init__(self, multiproc_dir=""):
+        self.multiproc_dir = multiproc_dir
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._snapshot_pid = None
+
+    def counter(self, name, help, labelnames=()):
+        """Create and register a counter."""
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        """Create and register a histogram."""
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """Register a callable returning a list of (name, type, help, samples) families."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collect(self):
+        """Return the (name, type, help, samples) family of every metric."""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        families = [(metric.name, metric.type, metric.help, metric.samples()) for metric in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return families
+
+    def reset(self):
+        """Forget the values of all counters and histograms, e.g. those a forked process inherited."""
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            metric.reset()
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiproc_dir, f"metrics-{pid}.json")
+
+    def write_snapshot(self):
+        """Write the families of this process to its file in the multiprocess directory."""
+        path = self._snapshot_path(os.getpid())
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.collect(), f)
+        # Readers see either the previous snapshot or this one
+        os.replace(temporary, path)
+
+    def start_snapshots(self, interval=METRICS_SNAPSHOT_SECONDS):
+        """Write a snapshot of this process every interval seconds from a background thread."""
+        if not self.multiproc_dir or self._snapshot_pid == os.getpid():
+            return
+        self._snapshot_pid = os.getpid()
+
+        def write_snapshots():
+            while True:
+                try:
+                    self.write_snapshot()
+                except OSError as e:
+                    print(f"Error writing metrics snapshot: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=write_snapshots, name="metrics-snapshots", daemon=True).start()
+
+    def mark_process_dead(self, pid):
+        """
+        Drop the gauges of a process that exited.
+
+        Its counters and histograms are kept, so the totals over all
+        processes never go down.
+        """
+        path = self._snapshot_path(pid)
+        try:
+            with open(path, encoding="utf-8") as f:
+                families = json.load(f)
+        except (OSError, ValueError):
+            return
+        families = [family for family in families if family[1] != "gauge"]
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(families, f)
+        os.replace(f"{path}.tmp", path)
+
+    def clear_snapshots(self):
+        """Remove the snapshots of earlier runs from the multiprocess directory."""
+        for path in glob.glob(os.path.join(self.multiproc_dir, "metrics-*.json*")):
+            os.remove(path)
+
+    def collect_all_processes(self):
+        """Return the families of every process that wrote a snapshot, merged."""
+        self.write_snapshot()
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, "metrics-*.json"))):
+            pid = os.path.basename(path)[len("metrics-"):-len(".json")]
+            try:
+                with open(path, encoding="utf-8") as f:
+                    families = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading metrics snapshot {path}: {e}")
+                continue
+
+            for name, type, help, samples in families:
+                _, _, values = merged.setdefault(name, (type, help, {}))
+                for suffix, labels, value in samples:
+                    if type == "gauge":
+                        labels = dict(labels, pid=pid)
+                    key = (suffix, tuple(labels.items()))
+                    values[key] = values.get(key, 0) + value
+
+        return [
+            (name, type, help, [(suffix, dict(labels), value) for (suffix, labels), value in values.items()])
+            for name, (type, help, values) in merged.items()
+        ]
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        families = self.collect_all_processes() if self.multiproc_dir else self.collect()
+        lines = []
+        for name, type, help, samples in families:
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} {type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# The metrics of this process, shared by all modules
+REGISTRY = Registry(METRICS_MULTIPROC_DIR)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "analysis_stage_seconds", "Time spent in each stage of an analysis or request", ("stage",)
+)
+
+# Stage timings of the request handled by the current thread
+_trace = threading.local()
+
+
+def start_trace():
+    """Start collecting the stage timings of the current thread for Server-Timing."""
+    _trace.stages = {}
+
+
+def end_trace():
+    """Stop collecting stage timings and return the seconds spent per stage."""
+    stages = getattr(_trace, "stages", None)
+    _trace.stages = None
+    return stages or {}
+
+
+@contextmanager
+def timer(stage):
+    """
+    Time a block of code as one analysis stage.
+
+    The time is added to the stage latency histogram and, while a trace
+    is active on the current thread, to the request's stage timings.
+    Does nothing when METRICS_ENABLED is off.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage)
+        stages = getattr(_trace, "stages", None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def timed(stage):
+    """Decorate a function so every call is timed as the given stage."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(stages):
+    """Format stage timings, in seconds, as a Server-Timing header value."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items())
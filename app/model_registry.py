@@ -0,0 +1,114 @@
+"""
+Lazy registry of the models used by the analyzer.
+Each model is loaded on first use instead of at import time, so the app
+starts quickly and can report which models are ready.
+"""
+
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    A thread-safe registry of named, lazily loaded models.
+
+    Loaders are registered by name and called at most once, on the first
+    get() or during warm_up(). Concurrent callers of the same model wait
+    for the one load in progress. Models registered as not required are
+    left out of warm-up and readiness, and only load when first used.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._locks = {}
+        self._required = set()
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, required=True):
+        """Register a zero-argument loader for the named model."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            self._status[name] = {"state": "pending", "load_seconds": None, "error": None,
+                                  "required": required}
+            if required:
+                self._required.add(name)
+            else:
+                self._required.discard(name)
+
+    def get(self, name):
+        """Return the named model, loading it first if needed."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            status = self._status[name]
+            status["state"] = "loading"
+            started = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                status["state"] = "failed"
+                status["error"] = str(e)
+                raise
+            status["state"] = "loaded"
+            status["load_seconds"] = round(time.perf_counter() - started, 3)
+            status["error"] = None
+            print(f"Loaded {name} in {status['load_seconds']:.2f}s")
+
+            self._models[name] = model
+            return model
+
+    def is_loaded(self, name):
+        """Return whether the named model has been loaded."""
+        return name in self._models
+
+    def ready(self):
+        """Return whether every required model has been loaded."""
+        return all(name in self._models for name in self._required)
+
+    def status(self):
+        """Return the load state of every registered model."""
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+    def warm_up(self, names=None, background=True):
+        """
+        Load models ahead of their first use.
+
+        Parameters:
+        -----------
+        names : list
+            The models to load, all required models by default
+        background : bool
+            Whether to load in a daemon thread instead of blocking
+
+        Returns:
+        --------
+        threading.Thread or None
+            The warm-up thread when loading in the background
+        """
+        if names is None:
+            names = [name for name in self._loaders if name in self._required]
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Error loading {name}: {e}")
+
+        if not background:
+            load_all()
+            return None
+
+        thread = threading.Thread(target=load_all, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
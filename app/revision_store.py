@@ -0,0 +1,122 @@
+"""
+Persistent store of analyzed document revisions.
+Keeps the most recent analyses, and the charts rendered from them, in
+SQLite so every server process on a host can serve incremental analyses
+and charts of a revision another process created, even after restarts.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class RevisionStore:
+    """
+    A bounded SQLite store of document analyses by revision id.
+
+    Revisions never change once saved, so the few most recently used
+    ones are also kept in memory by each process. When the table grows
+    past max_revisions, the oldest revisions and their charts are removed.
+    """
+
+    def __init__(self, path, max_revisions, memory_revisions=8):
+        self.path = path
+        self.max_revisions = max_revisions
+        self.memory_revisions = memory_revisions
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._recent = OrderedDict()
+
+    def _connect(self):
+        # Connections must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS revisions ("
+                " id TEXT PRIMARY KEY,"
+                " analysis BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS revisions_created ON revisions (created_at)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS charts ("
+                " revision_id TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " png BLOB NOT NULL,"
+                " PRIMARY KEY (revision_id, kind))"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def _remember(self, revision_id, analysis):
+        self._recent[revision_id] = analysis
+        self._recent.move_to_end(revision_id)
+        while len(self._recent) > self.memory_revisions:
+            self._recent.popitem(last=False)
+
+    def save(self, analysis):
+        """Store an analysis, which holds its document text, and return its new revision id."""
+        revision_id = uuid.uuid4().hex
+        data = pickle.dumps(analysis, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT INTO revisions (id, analysis, created_at) VALUES (?, ?, ?)",
+                (revision_id, data, time.time())
+            )
+            count = connection.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+            if count > self.max_revisions:
+                evicted = [row[0] for row in connection.execute(
+                    "SELECT id FROM revisions ORDER BY created_at LIMIT ?", (count - self.max_revisions,)
+                )]
+                connection.executemany("DELETE FROM revisions WHERE id = ?", [(id,) for id in evicted])
+                connection.executemany("DELETE FROM charts WHERE revision_id = ?", [(id,) for id in evicted])
+            connection.commit()
+            self._remember(revision_id, analysis)
+        return revision_id
+
+    def get(self, revision_id):
+        """Return the analysis of a stored revision, or None if it is unknown or evicted."""
+        with self._lock:
+            analysis = self._recent.get(revision_id)
+            if analysis is not None:
+                self._recent.move_to_end(revision_id)
+                return analysis
+
+            row = self._connect().execute(
+                "SELECT analysis FROM revisions WHERE id = ?", (revision_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            analysis = pickle.loads(row[0])
+            self._remember(revision_id, analysis)
+            return analysis
+
+    def get_chart(self, revision_id, kind):
+        """Return a chart rendered earlier for a revision as PNG bytes, or None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT png FROM charts WHERE revision_id = ? AND kind = ?", (revision_id, kind)
+            ).fetchone()
+            return row[0] if row is not None else None
+
+    def save_chart(self, revision_id, kind, png):
+        """Store a rendered chart of a revision, unless the revision was evicted meanwhile."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO charts (revision_id, kind, png)"
+                " SELECT id, ?, ? FROM revisions WHERE id = ?",
+                (kind, png, revision_id)
+            )
+            connection.commit()
@@ -0,0 +1,161 @@
+"""
+Persistent cache of GPT sentence rewrites.
+Stores completed rewrites in SQLite so repeated requests for the same
+sentence, emotion and settings skip the completion API, even across
+process restarts.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_rewrite_key(model, prompt_version, sentence, target_emotion, strength, temperature):
+    """Build the cache key for one rewrite request."""
+    content = json.dumps(
+        [model, prompt_version, sentence, target_emotion, strength, temperature],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class RewriteCache:
+    """
+    A SQLite-backed rewrite cache with TTL and size-based eviction.
+
+    Entries older than ttl seconds are treated as missing, and all of them
+    are deleted whenever a process opens the cache. When the table grows
+    past max_entries, the least recently used entries are removed. Every
+    entry counts how often it was served; hits are collected in memory and
+    written at most every hit_flush_seconds, so lookups stay read-only.
+    """
+
+    def __init__(self, path, ttl, max_entries, hit_flush_seconds=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hit_flush_seconds = hit_flush_seconds
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        # Hit count and last use of the entries served since the last flush
+        self._hits = {}
+        self._flushed_at = time.monotonic()
+
+    def _connect(self):
+        # Connections must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS rewrites ("
+                " key TEXT PRIMARY KEY,"
+                " rewrite TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used_at REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS rewrites_last_used ON rewrites (last_used_at)"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+            # Hits collected by the parent process were its to write
+            self._hits = {}
+            self._purge_expired(self._connection)
+        return self._connection
+
+    def get(self, key):
+        """Return the cached rewrite for key, or None if missing or expired."""
+        try:
+            return self._get(key)
+        except sqlite3.Error as e:
+            print(f"Error reading rewrite cache: {e}")
+            return None
+
+    def put(self, key, rewrite):
+        """Store a rewrite, evicting the least recently used entries if full."""
+        try:
+            self._put(key, rewrite)
+        except sqlite3.Error as e:
+            print(f"Error writing rewrite cache: {e}")
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT rewrite, created_at FROM rewrites WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            rewrite, created_at = row
+            if now - created_at > self.ttl:
+                connection.execute("DELETE FROM rewrites WHERE key = ?", (key,))
+                connection.commit()
+                return None
+
+            hits, _ = self._hits.get(key, (0, now))
+            self._hits[key] = (hits + 1, now)
+            if time.monotonic() - self._flushed_at >= self.hit_flush_seconds:
+                self._flush_hits(connection)
+            return rewrite
+
+    def _put(self, key, rewrite):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            # Pending hits decide which entries are least recently used
+            self._flush_hits(connection)
+            connection.execute(
+                "INSERT INTO rewrites (key, rewrite, created_at, last_used_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET rewrite = excluded.rewrite,"
+                " created_at = excluded.created_at, last_used_at = excluded.last_used_at",
+                (key, rewrite, now, now)
+            )
+            count = connection.execute("SELECT COUNT(*) FROM rewrites").fetchone()[0]
+            if count > self.max_entries:
+                connection.execute(
+                    "DELETE FROM rewrites WHERE key IN ("
+                    " SELECT key FROM rewrites ORDER BY last_used_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            connection.commit()
+
+    def _flush_hits(self, connection):
+        """Write the hits collected in memory to the table."""
+        if self._hits:
+            connection.executemany(
+                "UPDATE rewrites SET hits = hits + ?, last_used_at = MAX(last_used_at, ?) WHERE key = ?",
+                [(hits, last_used_at, key) for key, (hits, last_used_at) in self._hits.items()]
+            )
+            connection.commit()
+            self._hits = {}
+        self._flushed_at = time.monotonic()
+
+    def _purge_expired(self, connection):
+        cursor = connection.execute(
+            "DELETE FROM rewrites WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        connection.commit()
+        return cursor.rowcount
+
+    def purge_expired(self):
+        """Delete every expired entry and return how many were removed."""
+        with self._lock:
+            return self._purge_expired(self._connect())
+
+    def stats(self):
+        """Return the number of entries and the total hits served."""
+        with self._lock:
+            connection = self._connect()
+            self._flush_hits(connection)
+            entries, hits = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM rewrites"
+            ).fetchone()
+            return {"entries": entries, "hits": hits}
@@ -0,0 +1,116 @@
+"""
+Content-addressed LRU cache for model scores.
+Keeps the raw pipeline output of recently scored texts so unchanged
+sentences of a re-submitted draft never reach the models again.
+"""
+
+import hashlib
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize text for cache lookups by collapsing whitespace."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def make_cache_key(model_id, text):
+    """Build the cache key for a (model id, normalized text) pair."""
+    content = f"{model_id}\0{normalize_text(text)}".encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+def _estimate_size(key, scores):
+    """Estimate the memory used by one cache entry in bytes."""
+    size = sys.getsizeof(key) + sys.getsizeof(scores)
+    for item in scores:
+        size += sys.getsizeof(item)
+        for label, value in item.items():
+            size += sys.getsizeof(label) + sys.getsizeof(value)
+    return size
+
+
+class ScoreCache:
+    """
+    A bounded, thread-safe LRU cache of pipeline scores.
+
+    Entries are evicted least recently used first whenever either the
+    entry limit or the memory limit is exceeded.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, model_id, text):
+        """Return the cached scores for text, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        key = make_cache_key(model_id, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model_id, text, scores):
+        """Store the scores for text, evicting old entries if needed."""
+        if not self.enabled:
+            return
+
+        key = make_cache_key(model_id, text)
+        size = _estimate_size(key, scores)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._entries[key] = (scores, size)
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return the current size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,35 +1,141 @@
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
-from nltk.corpus import stopwords
+import math
+import time
+import zlib
 import numpy as np
-import pandas as pd
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import re
-import spacy
-import matplotlib.pyplot as plt
-from config import EMOTION_COLORS
+from io import BytesIO
+from types import SimpleNamespace
+from config import (
+    EMOTION_COLORS,
+    SENTIMENT_MODEL_NAME,
+    EMOTION_MODEL_NAME,
+    INFERENCE_BATCH_SIZE,
+    SCORING_CHUNK_SIZE,
+    DOCUMENT_WINDOW_TOKENS,
+    DOCUMENT_WINDOW_OVERLAP,
+    DOCUMENT_MAX_WINDOWS,
+    SCORE_CACHE_MAX_ENTRIES,
+    SCORE_CACHE_MAX_BYTES,
+    PREPROCESSING_EXTRA_STAGES,
+    SPACY_EXCLUDED_COMPONENTS,
+    INFERENCE_BACKEND,
+    SENTIMENT_MODE,
+    DERIVED_SENTIMENT_WEIGHTS,
+    DERIVED_SENTIMENT_BIAS,
+    MICRO_BATCHING,
+    MICRO_BATCH_MAX_SIZE,
+    MICRO_BATCH_MAX_WAIT_MS,
+    EMOTION_CATEGORIES,
+    EMOTION_LEXICON_PATH,
+    EMOTION_CASCADE,
+    LEXICON_CONFIDENCE_THRESHOLD,
+    LEXICON_NEUTRAL_PRIOR,
+    LEXICON_AUDIT_RATE,
+    SHIFT_WINDOW,
+    SHIFT_MIN_DISTANCE,
+    SHIFT_NOISE_WINDOW,
+    SHIFT_SIGNIFICANCE,
+    SCENE_MIN_SENTENCES,
+    SCENE_PENALTY,
+    ARC_SMOOTHING_WINDOW
+)
+import arc_analytics
+from analysis_result import AnalysisResult, SpanTable, shift_entries
+from batch_scheduler import BatchScheduler
+from emotion_lexicon import CascadeStats, load_lexicon
+from inference_backends import load_pipeline
+from metrics import REGISTRY, timed, timer
+from model_registry import ModelRegistry
+from score_cache import ScoreCache
 import os
 
 # Set tokenizer parallelism configuration
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-# Ensure necessary NLTK data is downloaded
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-# Load spaCy model for syntactic parsing
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    import sys
-    print("Please install the spaCy model with: python -m spacy download en_core_web_sm")
-    sys.exit(1)
+def _load_nltk():
+    """Import the NLTK tokenizers, downloading their data if missing."""
+    import nltk
+    from nltk.tokenize import word_tokenize
+    from nltk.corpus import stopwords
+
+    # Ensure necessary NLTK data is downloaded
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt')
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        nltk.download('stopwords')
+
+    # Punkt reports the character offsets of every sentence it finds
+    sentence_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+
+    return SimpleNamespace(
+        span_tokenize=sentence_tokenizer.span_tokenize,
+        word_tokenize=word_tokenize,
+        stop_words=set(stopwords.words('english'))
+    )
+
+def _load_spacy():
+    """Load the spaCy model used for syntactic parsing."""
+    import spacy
+    try:
+        return spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDED_COMPONENTS)
+    except OSError:
+        print("Please install the spaCy model with: python -m spacy download en_core_web_sm")
+        raise
+
+def _load_lexicon():
+    """Load the emotion lexicon used for the cascade and as the model fallback."""
+    return load_lexicon(EMOTION_LEXICON_PATH, EMOTION_CATEGORIES, LEXICON_NEUTRAL_PRIOR)
+
+def _load_pipeline(task, model_name):
+    """Return a loader for a transformers pipeline on the configured backend."""
+    def load():
+        return load_pipeline(task, model_name, INFERENCE_BACKEND)
+    return load
+
+# Model call metrics, reported by GET /metrics
+MODEL_TEXTS = REGISTRY.counter("model_texts_total", "Texts run through each model", ("model",))
+MODEL_CALL_SECONDS = REGISTRY.histogram("model_call_seconds", "Duration of each batched model call", ("model",))
+LEXICON_FALLBACKS = REGISTRY.counter(
+    "lexicon_fallbacks_total", "Texts scored with the emotion lexicon because the emotion model failed"
+)
+
+# Models are loaded on first use, or ahead of time with models.warm_up()
+models = ModelRegistry()
+models.register("nltk", _load_nltk)
+models.register("spacy", _load_spacy, required="parse" in PREPROCESSING_EXTRA_STAGES)
+models.register(
+    "sentiment",
+    _load_pipeline("sentiment-analysis", SENTIMENT_MODEL_NAME),
+    required=SENTIMENT_MODE != "derived"
+)
+models.register("emotion", _load_pipeline("text-classification", EMOTION_MODEL_NAME))
+models.register("lexicon", _load_lexicon, required=EMOTION_CASCADE)
+
+# Preprocessing stages, each with the stages it builds on
+PREPROCESSING_STAGES = {
+    "normalized": (),
+    "sentences": (),
+    "tokens": ("sentences",),
+    "filtered_tokens": ("tokens",),
+    "parse": ()
+}
+
+def resolve_stages(stages):
+    """Return the given preprocessing stages plus every stage they depend on."""
+    resolved = set()
+    pending = list(stages)
+    while pending:
+        stage = pending.pop()
+        if stage not in PREPROCESSING_STAGES:
+            raise ValueError(f"Unknown preprocessing stage: {stage}")
+        if stage not in resolved:
+            resolved.add(stage)
+            pending.extend(PREPROCESSING_STAGES[stage])
+    return resolved
 
 class EmotionalToneAnalyzer:
     """
@@ -40,86 +146,168 @@ class EmotionalToneAnalyzer:
     """
     
     def __init__(self):
-        """Initialize the emotional tone analyzer with required models."""
-        # Load pre-trained sentiment analysis model
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="distilbert-base-uncased-finetuned-sst-2-english",
-            return_all_scores=True
-        )
+        """Initialize the emotional tone analyzer; models load on first use."""
+        # Preprocessing stages needed by the analyses; sentence splitting
+        # drives every view of the document
+        self.required_stages = resolve_stages(("sentences",) + tuple(PREPROCESSING_EXTRA_STAGES))
 
-        # Load emotion detection model
-        self.emotion_analyzer = pipeline(
-            "text-classification", 
-            model="j-hartmann/emotion-english-distilroberta-base", 
-            return_all_scores=True
-        )
+        # Cache of recent model scores, keyed by model and sentence text
+        self.score_cache = ScoreCache(SCORE_CACHE_MAX_ENTRIES, SCORE_CACHE_MAX_BYTES)
+
+        # Shared batches for the model calls of concurrent requests
+        self.schedulers = {
+            model_id: BatchScheduler(
+                lambda texts, model_id=model_id, name=name: self._run_model(model_id, models.get(name), texts),
+                MICRO_BATCH_MAX_SIZE,
+                MICRO_BATCH_MAX_WAIT_MS / 1000,
+                name=f"{name}-batches"
+            )
+            for model_id, name in ((SENTIMENT_MODEL_NAME, "sentiment"), (EMOTION_MODEL_NAME, "emotion"))
+        }
 
         # Define emotion categories we're tracking
         self.emotion_categories = [
             "joy", "sadness", "anger", "fear", "surprise", "disgust", "neutral"
         ]
         
-        # NRC Emotion Lexicon simulation (simplified version)
-        # In a production environment, you would load the actual NRC lexicon
-        self.emotion_lexicon = {
-            "happy": ["joy"],
-            "sad": ["sadness"],
-            "angry": ["anger"],
-            "afraid": ["fear"],
-            "surprised": ["surprise"],
-            "disgusted": ["disgust"],
-            "content": ["joy"],
-            "miserable": ["sadness"],
-            "furious": ["anger"],
-            "terrified": ["fear"],
-            "astonished": ["surprise"],
-            "revolted": ["disgust"],
-            # Add more words as needed
-        }
-        
-        # Stop words to filter out
-        self.stop_words = set(stopwords.words('english'))
+        # Escalation and audit counts of the lexicon-first cascade
+        self.cascade_stats = CascadeStats()
+
+    @property
+    def sentiment_analyzer(self):
+        """The pre-trained sentiment analysis pipeline."""
+        return models.get("sentiment")
+
+    @property
+    def emotion_analyzer(self):
+        """The emotion detection pipeline."""
+        return models.get("emotion")
+
+    @property
+    def lexicon(self):
+        """The array-backed emotion lexicon."""
+        return models.get("lexicon")
+
+    @property
+    def stop_words(self):
+        """Stop words to filter out."""
+        return models.get("nltk").stop_words
     
-    def preprocess_text(self, text):
-        """Preprocess text for analysis."""
-        # Normalize text: lowercase, remove special chars, etc.
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+    def preprocess_text(self, text, stages=None):
+        """
+        Preprocess text for analysis.
+
+        Sentences are split from the original text, with their character
+        offsets; the normalized text is only used for word-level features.
+        Only the given stages, or the stages required by the analyzer, are
+        run; the results of skipped stages are None.
+
+        The "normalized" stage normalizes the whole text, "sentences" splits
+        it, "tokens" and "filtered_tokens" tokenize the normalized
+        sentences with and without stop words, and "parse" runs spaCy.
+        """
+        stages = self.required_stages if stages is None else resolve_stages(stages)
 
-        # Tokenize into sentences
-        sentences = sent_tokenize(text)
+        normalized_text = None
+        sentences = None
+        sentence_offsets = None
+        tokenized_sentences = None
+        filtered_sentences = None
+        parsed_doc = None
 
-        # Tokenize into words and remove stopwords (for word-level analysis)
-        tokenized_sentences = []
-        filtered_sentences = []
+        if "normalized" in stages:
+            normalized_text = self.normalize_text(text)
 
-        for sentence in sentences:
-            words = word_tokenize(sentence)
-            tokenized_sentences.append(words)
+        # Split into sentences
+        if "sentences" in stages:
+            with timer("segment_sentences"):
+                sentence_offsets = self.segment_sentences(text)
+                sentences = [text[start:end] for start, end in sentence_offsets]
 
-            # Filter stopwords
-            filtered_words = [word for word in words if word.lower() not in self.stop_words]
-            filtered_sentences.append(filtered_words)
+        # Tokenize the normalized sentences into words (for word-level analysis)
+        if "tokens" in stages:
+            word_tokenize = models.get("nltk").word_tokenize
+            with timer("tokenize"):
+                tokenized_sentences = [word_tokenize(self.normalize_text(sentence)) for sentence in sentences]
+
+        # Filter stopwords
+        if "filtered_tokens" in stages:
+            stop_words = self.stop_words
+            filtered_sentences = [
+                [word for word in words if word.lower() not in stop_words]
+                for words in tokenized_sentences
+            ]
 
         # Syntactic parsing using spaCy
-        parsed_doc = nlp(text)
+        if "parse" in stages:
+            nlp = models.get("spacy")
+            with timer("parse"):
+                parsed_doc = nlp(text)
         
         return {
             "original_text": text,
+            "normalized_text": normalized_text,
             "sentences": sentences,
+            "sentence_offsets": sentence_offsets,
             "tokenized_sentences": tokenized_sentences,
             "filtered_sentences": filtered_sentences,
             "parsed_doc": parsed_doc
         }
+
+    def normalize_text(self, text):
+        """Normalize text for word-level features: lowercase, remove special chars, etc."""
+        text = text.lower()
+        text = re.sub(r'[^\w\s]', ' ', text)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def segment_paragraphs(self, text):
+        """Return the (start, end) offsets of the non-blank paragraphs of text."""
+        offsets = []
+        start = 0
+        for paragraph in text.split('\n\n'):
+            end = start + len(paragraph)
+            if paragraph.strip():
+                offsets.append((start, end))
+            start = end + 2
+        return offsets
+
+    def segment_sentences(self, text):
+        """
+        Return the (start, end) offsets of the sentences of text.
+
+        Sentences never cross paragraph breaks, so a paragraph on its own
+        is split into exactly the sentences it has within the document.
+        """
+        span_tokenize = models.get("nltk").span_tokenize
+        offsets = []
+        for start, end in self.segment_paragraphs(text):
+            offsets.extend(
+                (start + sentence_start, start + sentence_end)
+                for sentence_start, sentence_end in span_tokenize(text[start:end])
+            )
+        return offsets
     
     def analyze_sentiment(self, text):
         """Analyze the overall sentiment of the text."""
-        results = self.sentiment_analyzer(text)
+        return self.analyze_sentiment_batch([text])[0]
+    
+    def analyze_sentiment_batch(self, texts, batch_size=None):
+        """
+        Analyze the sentiment of many texts with batched model calls.
+        
+        In the "derived" sentiment mode the emotion model's scores are
+        mapped to a polarity instead.
+        """
+        if SENTIMENT_MODE == "derived":
+            results = self._run_cached(self.emotion_analyzer, EMOTION_MODEL_NAME, texts, batch_size)
+            return [self._sentiment_from_emotion_scores(self._emotions_from_scores(scores)["scores"])
+                    for scores in results]
         
-        # Extract positive/negative sentiment scores
-        sentiment_scores = results[0]
+        results = self._run_cached(self.sentiment_analyzer, SENTIMENT_MODEL_NAME, texts, batch_size)
+        return [self._sentiment_from_scores(scores) for scores in results]
+    
+    def _sentiment_from_scores(self, sentiment_scores):
+        """Build a sentiment result from the raw pipeline scores of one text."""
         sentiment_dict = {item['label']: item['score'] for item in sentiment_scores}
         
         # Determine overall sentiment
@@ -133,251 +321,702 @@ class EmotionalToneAnalyzer:
             "overall_sentiment": overall_sentiment
         }
     
+    def _sentiment_from_emotion_scores(self, emotion_scores):
+        """Derive a sentiment result from the emotion scores of one text."""
+        logit = DERIVED_SENTIMENT_BIAS + sum(
+            DERIVED_SENTIMENT_WEIGHTS.get(emotion, 0) * score for emotion, score in emotion_scores.items()
+        )
+        positive = 1 / (1 + math.exp(-logit))
+        
+        return self._sentiment_from_scores([
+            {'label': 'NEGATIVE', 'score': 1 - positive},
+            {'label': 'POSITIVE', 'score': positive}
+        ])
+    
     def analyze_emotions(self, text):
         """Analyze the emotions expressed in the text."""
         try:
             # Get emotion scores from the model
-            results = self.emotion_analyzer(text)
+            results = self._run_cached(self.emotion_analyzer, EMOTION_MODEL_NAME, [text])
             
             # Extract emotion scores
-            emotion_scores = results[0]
-            emotion_dict = {item['label']: item['score'] for item in emotion_scores}
-            
-            # Find dominant emotion
-            dominant_emotion = max(emotion_dict.items(), key=lambda x: x[1])[0]
-
-            return {
-                "scores": emotion_dict,
-                "dominant_emotion": dominant_emotion
-            }
+            return self._emotions_from_scores(results[0])
         except Exception as e:
             print(f"Error analyzing emotions: {e}")
             # Fallback to lexicon-based approach if model fails
             return self._analyze_emotions_lexicon_based(text)
     
-    def _analyze_emotions_lexicon_based(self, text):
-        """Fallback method using lexicon-based approach."""
-        emotion_counts = {emotion: 0 for emotion in self.emotion_categories}
-        
-        # Tokenize and check words against our lexicon
-        words = word_tokenize(text.lower())
-        for word in words:
-            if word in self.emotion_lexicon:
-                for emotion in self.emotion_lexicon[word]:
-                    if emotion in emotion_counts:
-                        emotion_counts[emotion] += 1
-        
-        # Calculate proportions
-        total = sum(emotion_counts.values())
-        if total > 0:
-            emotion_scores = {emotion: count/total for emotion, count in emotion_counts.items()}
-        else:
-            emotion_scores = {emotion: 0 for emotion in emotion_counts}
+    def analyze_emotions_batch(self, texts, batch_size=None):
+        """
+        Analyze the emotions of many texts with batched model calls.
+        
+        With EMOTION_CASCADE enabled, texts are scored with the lexicon
+        first and only the uncertain ones reach the model.
+        """
+        if EMOTION_CASCADE:
+            return self._analyze_emotions_cascade(texts, batch_size)
+        return self._analyze_emotions_model(texts, batch_size)
+    
+    def _analyze_emotions_model(self, texts, batch_size=None):
+        """Analyze the emotions of many texts with the emotion model."""
+        try:
+            results = self._run_cached(self.emotion_analyzer, EMOTION_MODEL_NAME, texts, batch_size)
+        except Exception as e:
+            print(f"Error analyzing emotions in batch: {e}")
+            # Retry item by item so only the failing texts use the lexicon
+            return [self.analyze_emotions(text) for text in texts]
+        
+        return [self._emotions_from_scores(scores) for scores in results]
+    
+    def _analyze_emotions_cascade(self, texts, batch_size=None):
+        """
+        Score texts with the lexicon and escalate the uncertain ones to the model.
+        
+        A fixed sample of the confidently scored texts, chosen by a hash of
+        their text, is also run through the model to measure how often the
+        lexicon agrees with it.
+        """
+        results, confidences = self.lexicon.classify(texts)
+        escalated = [i for i, confidence in enumerate(confidences.tolist())
+                     if confidence < LEXICON_CONFIDENCE_THRESHOLD]
+        audited = [i for i, confidence in enumerate(confidences.tolist())
+                   if confidence >= LEXICON_CONFIDENCE_THRESHOLD and self._is_audited(texts[i])]
+        
+        agreed = 0
+        if escalated or audited:
+            model_results = self._analyze_emotions_model([texts[i] for i in escalated + audited], batch_size)
+            for i, result in zip(escalated, model_results):
+                results[i] = result
+            for i, result in zip(audited, model_results[len(escalated):]):
+                agreed += result["dominant_emotion"] == results[i]["dominant_emotion"]
+        
+        self.cascade_stats.record(len(texts), len(escalated), len(audited), agreed)
+        return results
+    
+    def _is_audited(self, text):
+        """Whether a confidently scored text belongs to the audit sample."""
+        return zlib.crc32(text.encode("utf-8")) % 10000 < LEXICON_AUDIT_RATE * 10000
+    
+    def _emotions_from_scores(self, emotion_scores):
+        """Build an emotion result from the raw pipeline scores of one text."""
+        emotion_dict = {item['label']: item['score'] for item in emotion_scores}
         
         # Find dominant emotion
-        dominant_emotion = max(emotion_scores.items(), key=lambda x: x[1])[0]
-        if dominant_emotion == 0:
-            dominant_emotion = "neutral"
-            
+        dominant_emotion = max(emotion_dict.items(), key=lambda x: x[1])[0]
+
         return {
-            "scores": emotion_scores,
+            "scores": emotion_dict,
             "dominant_emotion": dominant_emotion
         }
     
-    def analyze_sentence_level(self, sentences):
-        """Analyze emotions at the sentence level."""
-        sentence_emotions = []
+    def analyze_document_scores(self, text):
+        """
+        Score a whole document with both models.
         
-        for sentence in sentences:
-            if not sentence.strip():
-                continue
-                
-            sentiment = self.analyze_sentiment(sentence)
-            emotions = self.analyze_emotions(sentence)
+        Texts longer than the model input limit are split into overlapping
+        token windows that are scored as a batch and combined by averaging
+        the window scores weighted by their token counts.
+        """
+        return self.document_scores(text, self.score_document_windows(text))
+    
+    def document_scores(self, text, windows):
+        """Pool the score_document_windows result of a text into its sentiment and emotion results."""
+        if windows.get(EMOTION_MODEL_NAME) is None:
+            # Fallback to lexicon-based approach if model fails
+            emotions = self._analyze_emotions_lexicon_based(text)
+        else:
+            emotions = self._emotions_from_scores(self._pool_window_scores(windows[EMOTION_MODEL_NAME]["windows"]))
+        
+        if SENTIMENT_MODE == "derived":
+            # One pass of the emotion model feeds both results
+            return self._sentiment_from_emotion_scores(emotions["scores"]), emotions
+        
+        sentiment = self._sentiment_from_scores(
+            self._pool_window_scores(windows[SENTIMENT_MODEL_NAME]["windows"])
+        )
+        return sentiment, emotions
+    
+    def score_document_windows(self, text, previous=None, edit=None):
+        """
+        Score the token windows of a whole document with the models it needs.
+        
+        Returns {model id: {"windows": [...], "sampled": bool}} with the
+        (start, end, token count, raw scores) of every window and whether
+        the windows only sample a document too long to cover. The emotion
+        model's entry is None if it failed, so the lexicon is used instead.
+        
+        Given the windows of a previous revision and the edit turning it
+        into text, as (start, old end, new end) character offsets, only
+        the windows the edit touched are scored again; see _update_windows.
+        """
+        previous = previous or {}
+        windows = {}
+        if SENTIMENT_MODE != "derived":
+            windows[SENTIMENT_MODEL_NAME] = self._score_model_windows(
+                self.sentiment_analyzer, SENTIMENT_MODEL_NAME, text, previous.get(SENTIMENT_MODEL_NAME), edit
+            )
+        
+        try:
+            windows[EMOTION_MODEL_NAME] = self._score_model_windows(
+                self.emotion_analyzer, EMOTION_MODEL_NAME, text, previous.get(EMOTION_MODEL_NAME), edit
+            )
+        except Exception as e:
+            print(f"Error analyzing document emotions: {e}")
+            windows[EMOTION_MODEL_NAME] = None
+        
+        return windows
+    
+    def _score_model_windows(self, model, model_id, text, previous=None, edit=None):
+        """Lay out the token windows of a text for one model and score the new ones."""
+        if previous is None or edit is None:
+            windows, sampled = self._document_windows(text, model.tokenizer)
+        else:
+            windows, sampled = self._update_windows(previous, text, model.tokenizer, *edit)
+        
+        # Windows kept from the previous revision already have their scores
+        missing = [i for i, window in enumerate(windows) if window[3] is None]
+        results = self._run_cached(model, model_id, [text[windows[i][0]:windows[i][1]] for i in missing])
+        for i, scores in zip(missing, results):
+            windows[i] = windows[i][:3] + (scores,)
+        return {"windows": windows, "sampled": sampled}
+    
+    def _document_windows(self, text, tokenizer, start=0, end=None, max_windows=DOCUMENT_MAX_WINDOWS):
+        """
+        Split text into overlapping windows that fit a model's input limit.
+        
+        Returns a list of (start, end, token count, None) windows, as
+        character offsets into text, and whether they only sample it. At
+        most max_windows windows are returned; longer texts are covered by
+        windows spread evenly across them. Given start and end, only that
+        part of the text is split, and nothing is returned if it has no
+        tokens.
+        """
+        end = len(text) if end is None else end
+        whole = start == 0 and end == len(text)
+        window_size = DOCUMENT_WINDOW_TOKENS - tokenizer.num_special_tokens_to_add()
+        offsets = tokenizer(
+            text[start:end], add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )["offset_mapping"]
+        
+        if not offsets and not whole:
+            return [], False
+        if len(offsets) <= window_size:
+            return [(start, end, max(len(offsets), 1), None)], max_windows < 1
+        
+        stride = window_size - DOCUMENT_WINDOW_OVERLAP
+        starts = list(range(0, len(offsets) - DOCUMENT_WINDOW_OVERLAP, stride))
+        sampled = len(starts) > max_windows
+        if len(starts) > max_windows > 1:
+            last = len(starts) - 1
+            starts = [
+                starts[round(i * last / (max_windows - 1))]
+                for i in range(max_windows)
+            ]
+        elif len(starts) > max_windows:
+            starts = starts[:1]
+        
+        windows = []
+        for first in starts:
+            last = min(first + window_size, len(offsets))
+            windows.append((start + offsets[first][0], start + offsets[last - 1][1], last - first, None))
+        return windows, sampled
+    
+    def _update_windows(self, previous, text, tokenizer, start, old_end, new_end):
+        """
+        Lay out the token windows of an edited document from those of its previous revision.
+        
+        The windows that end before the edit or start after it keep their
+        scores, moved by the change in length. The text the others covered,
+        together with the edit, is split into windows afresh: into as many
+        as it needs when the document was covered completely, or into as
+        many as it had when the windows only sampled it, so the sample
+        keeps its size. A covered document that outgrows
+        DOCUMENT_MAX_WINDOWS is laid out afresh.
+        """
+        shift = new_end - old_end
+        before = [window for window in previous["windows"] if window[1] < start]
+        after = [
+            (window_start + shift, window_end + shift, tokens, scores)
+            for window_start, window_end, tokens, scores in previous["windows"]
+            if window_start > old_end
+        ]
+        touched = previous["windows"][len(before):len(previous["windows"]) - len(after)]
+        
+        if previous["sampled"]:
+            if not touched:
+                return before + after, True
+            region_start = min(touched[0][0], start)
+            region_end = max(touched[-1][1] + shift, new_end)
+            windows, _ = self._document_windows(text, tokenizer, region_start, region_end, len(touched))
+            return before + windows + after, True
+        
+        # The edit and the windows around it are covered up to the first and last kept windows
+        region_start = min(touched[0][0], start) if touched and before else (start if before else 0)
+        region_end = max(touched[-1][1] + shift, new_end) if touched and after else (new_end if after else len(text))
+        windows, sampled = self._document_windows(
+            text, tokenizer, region_start, region_end, DOCUMENT_MAX_WINDOWS - len(before) - len(after)
+        )
+        if sampled:
+            return self._document_windows(text, tokenizer)
+        return before + windows + after, False
+    
+    def _pool_window_scores(self, windows):
+        """Average the raw scores of scored windows, weighted by their token counts."""
+        total = sum(tokens for _, _, tokens, _ in windows)
+        pooled = {}
+        for _, _, tokens, scores in windows:
+            for item in scores:
+                pooled[item['label']] = pooled.get(item['label'], 0) + item['score'] * tokens / total
+        return [{'label': label, 'score': score} for label, score in pooled.items()]
+    
+    def _run_cached(self, model, model_id, texts, batch_size=None):
+        """
+        Run a pipeline over texts, skipping texts whose scores are cached.
+        
+        Only cache misses reach the model; their scores are stored for
+        later requests. Results are returned in the order of the input.
+        Unless a batch size is given, cache misses share batches with
+        concurrent requests when micro-batching is enabled.
+        """
+        results = [self.score_cache.get(model_id, text) for text in texts]
+        missing = [i for i, scores in enumerate(results) if scores is None]
+        
+        if missing:
+            pending = [texts[i] for i in missing]
+            if MICRO_BATCHING and batch_size is None:
+                outputs = self.schedulers[model_id].run(pending)
+            else:
+                outputs = self._run_model(model_id, model, pending, batch_size)
+            for i, scores in zip(missing, outputs):
+                self.score_cache.put(model_id, texts[i], scores)
+                results[i] = scores
+        
+        return results
+    
+    def _run_model(self, model_id, model, texts, batch_size=None):
+        """Run a pipeline over texts in batches, recording the call in the model metrics."""
+        started = time.perf_counter()
+        results = self._run_batched(model, texts, batch_size)
+        MODEL_CALL_SECONDS.observe(time.perf_counter() - started, model_id)
+        MODEL_TEXTS.inc(model_id, amount=len(texts))
+        return results
+    
+    def _run_batched(self, model, texts, batch_size=None):
+        """
+        Run a pipeline over texts in length-sorted batches.
+        
+        Texts of similar length are grouped together so each batch needs
+        little padding. Results are returned in the order of the input.
+        """
+        batch_size = batch_size or INFERENCE_BATCH_SIZE
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results = [None] * len(texts)
+        
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            outputs = model([texts[i] for i in bucket], batch_size=len(bucket), truncation=True)
+            for i, scores in zip(bucket, outputs):
+                results[i] = scores
+        
+        return results
+    
+    def _analyze_emotions_lexicon_based(self, text):
+        """Fallback method using lexicon-based approach."""
+        LEXICON_FALLBACKS.inc()
+        results, _ = self.lexicon.classify([text])
+        return results[0]
+    
+    def score_spans(self, texts, progress=None):
+        """
+        Score each unique text span exactly once.
+        
+        Returns a table mapping every span to its sentiment and emotion
+        results, shared by the sentence, paragraph and document views.
+        If progress is given, it is called as progress(done, total) after
+        every chunk of SCORING_CHUNK_SIZE spans.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        chunk_size = SCORING_CHUNK_SIZE if progress else None
+        
+        scores = {}
+        if progress:
+            progress(0, len(unique_texts))
+        for text, result in self.iter_score_spans(unique_texts, chunk_size):
+            scores[text] = result
+            if progress and len(scores) % chunk_size == 0:
+                progress(len(scores), len(unique_texts))
+        if progress and len(scores) % chunk_size:
+            progress(len(scores), len(unique_texts))
+        
+        return scores
+    
+    def iter_score_spans(self, texts, chunk_size=None):
+        """
+        Score text spans chunk by chunk, yielding (text, result) pairs.
+        
+        Each chunk is scored with batched model calls before any of its
+        results are yielded. Without a chunk size all texts form one chunk.
+        """
+        chunk_size = chunk_size or max(len(texts), 1)
+        
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts[start:start + chunk_size]
+            if SENTIMENT_MODE == "derived":
+                # A single emotion model pass feeds both results
+                emotions = self.analyze_emotions_batch(chunk)
+                sentiments = [self._sentiment_from_emotion_scores(emotion["scores"]) for emotion in emotions]
+            else:
+                sentiments = self.analyze_sentiment_batch(chunk)
+                emotions = self.analyze_emotions_batch(chunk)
             
-            sentence_emotions.append({
-                "sentence": sentence,
-                "sentiment": sentiment,
-                "emotions": emotions
-            })
+            for text, sentiment, emotion in zip(chunk, sentiments, emotions):
+                yield text, {"sentiment": sentiment, "emotions": emotion}
+    
+    def analyze_sentence_level(self, sentences, scores=None, offsets=None):
+        """
+        Analyze emotions at the sentence level.
+        
+        If the (start, end) offsets of the sentences are given, each result
+        also holds the position of its sentence in the document.
+        """
+        if scores is None:
+            return list(self.iter_sentence_level(sentences, offsets=offsets))
+        
+        sentence_emotions = []
+        for sentence, offset in self._with_offsets(sentences, offsets):
+            sentence_emotions.append(self._sentence_entry(sentence, offset, scores[sentence]))
             
         return sentence_emotions
     
-    def analyze_paragraph_level(self, paragraphs):
+    def iter_sentence_level(self, sentences, chunk_size=None, offsets=None):
+        """
+        Analyze emotions at the sentence level, yielding results in order.
+        
+        Sentences are scored chunk by chunk, and each result is yielded as
+        soon as its chunk is done, so callers can show the first sentences
+        before the rest of the document has been scored.
+        """
+        sentences = self._with_offsets(sentences, offsets)
+        
+        scores = {}
+        position = 0
+        unique_sentences = list(dict.fromkeys(sentence for sentence, _ in sentences))
+        for text, result in self.iter_score_spans(unique_sentences, chunk_size):
+            scores[text] = result
+            while position < len(sentences) and sentences[position][0] in scores:
+                sentence, offset = sentences[position]
+                yield self._sentence_entry(sentence, offset, scores[sentence])
+                position += 1
+    
+    def _with_offsets(self, sentences, offsets):
+        """Pair the non-blank sentences with their offsets, or with None."""
+        offsets = offsets if offsets is not None else [None] * len(sentences)
+        return [(sentence, offset) for sentence, offset in zip(sentences, offsets) if sentence.strip()]
+    
+    def _sentence_entry(self, sentence, offset, scores):
+        """Build the sentence-level result of one sentence."""
+        entry = {
+            "sentence": sentence,
+            "sentiment": scores["sentiment"],
+            "emotions": scores["emotions"]
+        }
+        if offset is not None:
+            entry["start"], entry["end"] = offset
+        return entry
+    
+    def analyze_paragraph_level(self, paragraphs, scores=None):
         """Analyze emotions at the paragraph level."""
-        paragraph_emotions = []
+        paragraphs = [paragraph for paragraph in paragraphs if paragraph.strip()]
+        paragraph_sentences = [
+            [paragraph[start:end] for start, end in self.segment_sentences(paragraph)]
+            for paragraph in paragraphs
+        ]
         
-        for paragraph in paragraphs:
-            if not paragraph.strip():
-                continue
-                
-            sentiment = self.analyze_sentiment(paragraph)
-            emotions = self.analyze_emotions(paragraph)
-            
-            # Get sentence-level analysis for this paragraph
-            sentences = sent_tokenize(paragraph)
-            sentence_analysis = self.analyze_sentence_level(sentences)
-            
+        # Score the paragraphs and all of their sentences in shared batches
+        if scores is None:
+            scores = self.score_spans(
+                paragraphs + [s for sentences in paragraph_sentences for s in sentences if s.strip()]
+            )
+        
+        paragraph_emotions = []
+        for paragraph, sentences in zip(paragraphs, paragraph_sentences):
             paragraph_emotions.append({
                 "paragraph": paragraph,
-                "sentiment": sentiment,
-                "emotions": emotions,
-                "sentence_analysis": sentence_analysis
+                "sentiment": scores[paragraph]["sentiment"],
+                "emotions": scores[paragraph]["emotions"],
+                "sentence_analysis": self.analyze_sentence_level(sentences, scores)
             })
             
         return paragraph_emotions
     
-    def analyze_document(self, text):
-        """Analyze the entire document for emotional tone."""
+    def plan_document(self, text):
+        """
+        Split a document into the spans that need scoring.
+        
+        The plan lists the sentence and paragraph segmentation used by every
+        view of the document, plus the unique spans across all of them. The
+        document as a whole is scored separately by analyze_document_scores.
+        """
         # Preprocess the text
         preprocessed = self.preprocess_text(text)
 
-        # Split into paragraphs
-        paragraphs = text.split('\n\n')
-        paragraphs = [p for p in paragraphs if p.strip()]
+        # Split into paragraphs; their sentences are the document's sentences
+        paragraph_offsets = self.segment_paragraphs(text)
+        paragraphs = [text[start:end] for start, end in paragraph_offsets]
 
-        # Analyze at different levels
-        document_sentiment = self.analyze_sentiment(text)
-        document_emotions = self.analyze_emotions(text)
-        sentence_analysis = self.analyze_sentence_level(preprocessed["sentences"])
-        paragraph_analysis = self.analyze_paragraph_level(paragraphs)
+        spans = paragraphs + preprocessed["sentences"]
 
+        return {
+            "preprocessed": preprocessed,
+            "sentences": preprocessed["sentences"],
+            "sentence_offsets": preprocessed["sentence_offsets"],
+            "paragraphs": paragraphs,
+            "paragraph_offsets": paragraph_offsets,
+            "spans": list(dict.fromkeys(s for s in spans if s.strip()))
+        }
+    
+    def analyze_document(self, text, progress=None):
+        """
+        Analyze the entire document for emotional tone.
+        
+        If progress is given, it is called as progress(done, total) with
+        the number of text spans scored so far.
+        """
+        with timer("plan"):
+            plan = self.plan_document(text)
+        
+        # Score every unique span once, then keep the scores as arrays
+        with timer("score_spans"):
+            scores = self.score_spans(plan["spans"], progress)
+        with timer("document_scores"):
+            document_windows = self.score_document_windows(text)
+            document_sentiment, document_emotions = self.document_scores(text, document_windows)
+        with timer("build_result"):
+            return self.build_result(
+                text, plan, scores, document_sentiment, document_emotions, document_windows=document_windows
+            )
+    
+    def build_result(self, text, plan, scores, document_sentiment, document_emotions,
+                     shift_positions=None, main_emotion=None, scene_breaks=None, document_windows=None):
+        """
+        Collect the scores of a planned document into an AnalysisResult
+        
+        Parameters:
+        -----------
+        text : str
+            The document text
+        plan : dict
+            The plan_document result of the text
+        scores : dict
+            Scores of every span of the plan, keyed by span text
+        document_sentiment, document_emotions : dict
+            The analyze_document_scores result of the text
+        shift_positions : list
+            Sentence positions of the emotional shifts, detected if not given
+        main_emotion : str
+            The main emotion across paragraphs, chosen if not given
+        scene_breaks : list
+            First sentence of every emotional scene, segmented if not given
+        document_windows : dict
+            The score_document_windows result the document scores were
+            pooled from, kept for incremental updates
+        
+        Returns:
+        --------
+        AnalysisResult
+            The analysis, with its nested views built on access
+        """
+        sentences = SpanTable.from_scores(text, plan["sentence_offsets"], scores)
+        paragraphs = SpanTable.from_scores(text, plan["paragraph_offsets"], scores)
+        
         # Track emotional shifts and consistency
-        emotional_shifts = self._detect_emotional_shifts(sentence_analysis)
-        consistency_check = self._check_emotional_consistency(paragraph_analysis)
+        if shift_positions is None:
+            shift_positions = self._detect_emotional_shifts(sentences.emotions, sentences.dominant)
+        if main_emotion is None:
+            main_emotion = self._main_emotion(paragraphs)
+        if scene_breaks is None:
+            scene_breaks = self._segment_scenes(sentences.emotions)
+        
+        return AnalysisResult(
+            text, sentences, paragraphs, document_sentiment, document_emotions,
+            shift_positions, main_emotion, scene_breaks, document_windows
+        )
+    
+    def iter_document_analysis(self, text, chunk_size=None):
+        """
+        Analyze the entire document step by step, yielding (event, data) pairs.
+        
+        A "sentence" event is yielded for every sentence as soon as it is
+        scored, followed by the "shifts" between sentences, a "paragraph"
+        event for every paragraph, the "consistency" check and finally a
+        "summary" event holding the complete AnalysisResult.
+        """
+        with timer("plan"):
+            plan = self.plan_document(text)
+        scores = {}
+        
+        sentences = self.iter_sentence_level(plan["sentences"], chunk_size, plan["sentence_offsets"])
+        for index, entry in enumerate(sentences):
+            scores[entry["sentence"]] = {"sentiment": entry["sentiment"], "emotions": entry["emotions"]}
+            yield "sentence", dict(entry, index=index)
+        
+        sentence_table = SpanTable.from_scores(text, plan["sentence_offsets"], scores)
+        shift_positions = self._detect_emotional_shifts(sentence_table.emotions, sentence_table.dominant)
+        yield "shifts", shift_entries(sentence_table, shift_positions)
+        
+        # Paragraphs reuse the scores of sentences that were already streamed
+        with timer("score_spans"):
+            scores.update(self.score_spans([span for span in plan["spans"] if span not in scores]))
+        with timer("document_scores"):
+            document_windows = self.score_document_windows(text)
+            document_sentiment, document_emotions = self.document_scores(text, document_windows)
+        with timer("build_result"):
+            result = self.build_result(
+                text, plan, scores, document_sentiment, document_emotions, shift_positions=shift_positions,
+                document_windows=document_windows
+            )
+        for index in range(len(result.paragraphs)):
+            yield "paragraph", {
+                "index": index,
+                "paragraph": result.paragraphs.span(index),
+                "sentiment": result.paragraphs.sentiment_at(index),
+                "emotions": result.paragraphs.emotions_at(index)
+            }
+        
+        yield "consistency", result["consistency_check"]
+        yield "summary", result
+    
+    def _detect_emotional_shifts(self, emotions, dominant, positions=None):
+        """
+        Detect significant shifts in emotional tone between sentences.
+        
+        Takes the sentences x emotions score matrix and the dominant emotion
+        index of every sentence, and returns the positions whose sentence
+        differs from the one before while the emotions of the SHIFT_WINDOW
+        sentences on either side differ by at least SHIFT_MIN_DISTANCE and
+        by SHIFT_SIGNIFICANCE standard deviations more than the local noise
+        of the arc would explain. If positions is given, only the boundaries between sentence
+        position - 1 and position are checked.
+        """
+        return arc_analytics.detect_shifts(
+            emotions, dominant, SHIFT_WINDOW, SHIFT_MIN_DISTANCE, SHIFT_NOISE_WINDOW, SHIFT_SIGNIFICANCE,
+            positions
+        )
+    
+    def _segment_scenes(self, emotions):
+        """Return the first sentence of every emotional scene of a sentences x emotions score matrix."""
+        return arc_analytics.segment_scenes(emotions, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+    
+    def _resegment_scenes(self, emotions, breaks, start, end):
+        """Segment the sentences start to end of a score matrix into scenes again, keeping the other scene breaks."""
+        return arc_analytics.resegment_scenes(emotions, breaks, start, end, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+    
+    def _main_emotion(self, paragraphs):
+        """Return the most common dominant emotion across paragraphs, or None without paragraphs."""
+        if not len(paragraphs):
+            return None
+        
+        return paragraphs.emotion_labels[arc_analytics.most_common(paragraphs.dominant, len(paragraphs.emotion_labels))]
+    
+    def emotional_arc_data(self, analysis_result):
+        """
+        Extract the per-sentence emotion series behind the emotional arc.
+        
+        Returns compact numeric arrays that a client can draw directly:
+        one score list per emotion, the same scores averaged over
+        ARC_SMOOTHING_WINDOW sentences, plus the dominant emotion per
+        sentence.
+        """
+        sentences = analysis_result.sentences
+        columns = {emotion: column for column, emotion in enumerate(sentences.emotion_labels)}
+        smoothed = arc_analytics.rolling_mean(sentences.emotions, ARC_SMOOTHING_WINDOW)
+        
+        def series(scores):
+            return {
+                emotion: scores[:, columns[emotion]].tolist() if emotion in columns else [0] * len(sentences)
+                for emotion in self.emotion_categories
+            }
         
         return {
-            "document_sentiment": document_sentiment,
-            "document_emotions": document_emotions,
-            "sentence_analysis": sentence_analysis,
-            "paragraph_analysis": paragraph_analysis,
-            "emotional_shifts": emotional_shifts,
-            "consistency_check": consistency_check
+            "labels": [f"S{i+1}" for i in range(len(sentences))],
+            "series": series(np.nan_to_num(sentences.emotions)),
+            "smoothed": series(smoothed),
+            "dominant": sentences.dominant_emotions()
         }
     
-    def _detect_emotional_shifts(self, sentence_analysis):
-        """Detect significant shifts in emotional tone between sentences."""
-        shifts = []
-
-        if len(sentence_analysis) < 2:
-            return shifts
-
-        for i in range(1, len(sentence_analysis)):
-            prev_dominant = sentence_analysis[i-1]["emotions"]["dominant_emotion"]
-            curr_dominant = sentence_analysis[i]["emotions"]["dominant_emotion"]
-
-            if prev_dominant != curr_dominant:
-                shifts.append({
-                    "position": i,
-                    "from_sentence": sentence_analysis[i-1]["sentence"],
-                    "to_sentence": sentence_analysis[i]["sentence"],
-                    "from_emotion": prev_dominant,
-                    "to_emotion": curr_dominant
-                })
-    
-        return shifts
-    
-    def _check_emotional_consistency(self, paragraph_analysis):
-        """Check for consistency in emotional tone across paragraphs."""
-        if not paragraph_analysis:
-            return {"is_consistent": True, "inconsistencies": []}
-    
-        dominant_emotions = [p["emotions"]["dominant_emotion"] for p in paragraph_analysis]
-        main_emotion = max(set(dominant_emotions), key=dominant_emotions.count)
-
-        inconsistencies = []
-        for i, paragraph in enumerate(paragraph_analysis):
-            if paragraph["emotions"]["dominant_emotion"] != main_emotion:
-                inconsistencies.append({
-                    "paragraph_index": i,
-                    "paragraph": paragraph["paragraph"],
-                    "emotion": paragraph["emotions"]["dominant_emotion"],
-                    "main_emotion": main_emotion
-                })
-                
+    def emotion_radar_data(self, analysis_result):
+        """Calculate the average score of every emotion across all sentences."""
+        sentences = analysis_result.sentences
+        if not len(sentences):
+            return {"labels": [], "values": []}
+        
         return {
-            "is_consistent": len(inconsistencies) == 0,
-            "main_emotion": main_emotion,
-            "inconsistencies": inconsistencies
+            "labels": list(sentences.emotion_labels),
+            "values": np.nanmean(sentences.emotions, axis=0, dtype=np.float64).tolist()
         }
     
-    def visualize_emotional_arc(self, analysis_result):
-        """Create an enhanced visualization of the emotional arc throughout the text."""
-        # Extract emotions from sentence analysis
-        sentences = analysis_result["sentence_analysis"]
-        positions = list(range(len(sentences)))
+    @timed("plot_arc")
+    def visualize_emotional_arc(self, analysis_result, figure=None):
+        """
+        Create an enhanced visualization of the emotional arc throughout the text.
         
-        # Extract all emotions and their scores for each sentence
-        sentence_emotions = []
-        for s in sentences:
-            if "emotions" in s and "scores" in s["emotions"]:
-                sentence_emotions.append({
-                    "text": s["sentence"],
-                    "scores": s["emotions"]["scores"],
-                    "dominant": s["emotions"]["dominant_emotion"]
-                })
-        
-        # Create emotion categories and color mapping
-        emotion_categories = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
-        emotion_colors = {
-            "joy": "green",
-            "sadness": "blue",
-            "anger": "red",
-            "fear": "purple",
-            "surprise": "orange",
-            "disgust": "brown",
-            "neutral": "gray"
-        }
+        The chart is drawn on the given matplotlib Figure, or on a new
+        standalone Figure, without touching the global pyplot state.
+        """
+        arc = self.emotional_arc_data(analysis_result)
+        positions = list(range(len(arc["labels"])))
         
+        from matplotlib.figure import Figure
+
         # Create figure with appropriate size
-        plt.figure(figsize=(14, 8))
+        fig = figure if figure is not None else Figure(figsize=(14, 8))
+        ax = fig.add_subplot(111)
         
-        # Create a subplot for each emotion
-        for emotion in emotion_categories:
-            if emotion not in emotion_colors:
+        # Create a line for each emotion
+        for emotion in self.emotion_categories:
+            if emotion not in EMOTION_COLORS:
                 continue
-                
-            # Extract y-values (emotion scores) for this emotion
-            y_values = [sent["scores"].get(emotion, 0) for sent in sentence_emotions]
             
             # Plot this emotion as a line
-            plt.plot(
+            y_values = arc["series"][emotion]
+            ax.plot(
                 positions, 
                 y_values, 
                 marker='o', 
                 linestyle='-', 
-                color=emotion_colors[emotion], 
+                color=EMOTION_COLORS[emotion], 
                 alpha=0.7,
                 label=emotion.capitalize()
             )
             
             # Add emphasis on dominant emotions
-            for i, sent in enumerate(sentence_emotions):
-                if sent["dominant"] == emotion:
-                    plt.scatter(
-                        i, 
-                        sent["scores"].get(emotion, 0), 
-                        color=emotion_colors[emotion], 
-                        s=100, 
-                        edgecolor='black', 
-                        zorder=10
-                    )
+            dominant_positions = [i for i in positions if arc["dominant"][i] == emotion]
+            if dominant_positions:
+                ax.scatter(
+                    dominant_positions, 
+                    [y_values[i] for i in dominant_positions], 
+                    color=EMOTION_COLORS[emotion], 
+                    s=100, 
+                    edgecolor='black', 
+                    zorder=10
+                )
         
         # Add sentence numbers on x-axis
-        plt.xticks(positions, [f"S{i+1}" for i in positions], rotation=45, fontsize=8)
+        ax.set_xticks(positions)
+        ax.set_xticklabels(arc["labels"], rotation=45, fontsize=8)
         
         # Add labels and title
-        plt.xlabel('Sentence Number')
-        plt.ylabel('Emotion Intensity')
-        plt.title('Emotional Arc Across Sentences')
-        plt.grid(True, linestyle='--', alpha=0.7)
+        ax.set_xlabel('Sentence Number')
+        ax.set_ylabel('Emotion Intensity')
+        ax.set_title('Emotional Arc Across Sentences')
+        ax.grid(True, linestyle='--', alpha=0.7)
         
         # Add legend
-        plt.legend(loc='upper right')
+        ax.legend(loc='upper right')
         
         # Add sentence text as annotations on hover (for interactive environments)
         # In a non-interactive environment like a static image, we can add text below
-        text_box = plt.figtext(
+        fig.text(
             0.5, 0.01, 
             "Hover over points or refer to sentence numbers to track emotional changes", 
             ha="center", 
@@ -386,40 +1025,29 @@ class EmotionalToneAnalyzer:
         )
         
         # Ensure everything fits nicely
-        plt.tight_layout(rect=[0, 0.05, 1, 0.95])  # Adjust the layout to make room for the text
-        
-        return plt
-    
-    def create_emotion_radar_chart(self, analysis_result):
-        """Create a radar chart visualization of emotions throughout the text."""
-        # Get sentence-level emotions for radar chart
-        emotions_data = []
-        for sentence in analysis_result["sentence_analysis"]:
-            emotion_scores = sentence["emotions"]["scores"]
-            emotions_data.append({
-                "sentence": sentence["sentence"],
-                "emotions": emotion_scores
-            })
-
-        # Calculate average emotion scores across all sentences
-        all_emotions = {}
-        for entry in emotions_data:
-            for emotion, score in entry["emotions"].items():
-                if emotion in all_emotions:
-                    all_emotions[emotion].append(score)
-                else:
-                    all_emotions[emotion] = [score]
-
-        # Calculate averages
-        emotion_averages = {emotion: sum(scores)/len(scores) for emotion, scores in all_emotions.items()}
+        fig.tight_layout(rect=[0, 0.05, 1, 0.95])  # Adjust the layout to make room for the text
         
+        return fig
+    
+    @timed("plot_radar")
+    def create_emotion_radar_chart(self, analysis_result, figure=None):
+        """
+        Create a radar chart visualization of emotions throughout the text.
+        
+        The chart is drawn on the given matplotlib Figure, or on a new
+        standalone Figure, without touching the global pyplot state.
+        """
+        radar = self.emotion_radar_data(analysis_result)
+        
+        from matplotlib.figure import Figure
+
         # Create the radar chart
-        fig = plt.figure(figsize=(8, 8))
+        fig = figure if figure is not None else Figure(figsize=(8, 8))
         ax = fig.add_subplot(111, polar=True)
         
         # Get emotion labels and values
-        emotions = list(emotion_averages.keys())
-        values = [emotion_averages[e] for e in emotions]
+        emotions = radar["labels"]
+        values = list(radar["values"])
         
         # Number of variables
         N = len(emotions)
@@ -440,18 +1068,27 @@ class EmotionalToneAnalyzer:
         ax.set_theta_direction(-1)
         
         # Draw axis lines for each angle and label
-        plt.xticks(angles[:-1], emotions)
+        ax.set_xticks(angles[:-1])
+        ax.set_xticklabels(emotions)
         
         # Draw ylabels
         ax.set_rlabel_position(0)
-        plt.yticks([0.25, 0.5, 0.75], ["0.25", "0.5", "0.75"], color="grey", size=8)
-        plt.ylim(0, 1)
+        ax.set_yticks([0.25, 0.5, 0.75])
+        ax.set_yticklabels(["0.25", "0.5", "0.75"], color="grey", size=8)
+        ax.set_ylim(0, 1)
         
         # Add title
-        plt.title("Emotional Distribution", size=14, color='black', y=1.1)
+        ax.set_title("Emotional Distribution", size=14, color='black', y=1.1)
         
-        # Return the plot
-        return plt
+        # Return the figure
+        return fig
+    
+    @timed("render_png")
+    def render_chart_png(self, figure):
+        """Render a chart Figure to PNG bytes."""
+        img = BytesIO()
+        figure.savefig(img, format='png', bbox_inches='tight')
+        return img.getvalue()
 
 # Example usage function
 def analyze_text_emotions(text):
@@ -479,8 +1116,9 @@ def analyze_text_emotions(text):
             print(f"  \"{shift['to_sentence']}\"")
     
     # Create visualization
-    plot = analyzer.visualize_emotional_arc(analysis)
-    plot.show()
+    import matplotlib.pyplot as plt
+    analyzer.visualize_emotional_arc(analysis, figure=plt.figure(figsize=(14, 8)))
+    plt.show()
     
     return analysis
 
@@ -1,6 +1,31 @@
 $(document).ready(function() {
     let sentimentChart = null;
     let emotionChart = null;
+    let arcChart = null;
+    let radarChart = null;
+    
+    // Emotion categories and chart colors shared by all charts
+    const emotionCategories = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral'];
+    
+    const emotionColors = {
+        joy: 'rgba(40, 167, 69, 0.6)',
+        sadness: 'rgba(23, 162, 184, 0.6)',
+        anger: 'rgba(220, 53, 69, 0.6)',
+        fear: 'rgba(111, 66, 193, 0.6)',
+        surprise: 'rgba(255, 193, 7, 0.6)',
+        disgust: 'rgba(73, 80, 87, 0.6)',
+        neutral: 'rgba(108, 117, 125, 0.6)'
+    };
+    
+    const emotionBorderColors = {
+        joy: 'rgba(40, 167, 69, 1)',
+        sadness: 'rgba(23, 162, 184, 1)',
+        anger: 'rgba(220, 53, 69, 1)',
+        fear: 'rgba(111, 66, 193, 1)',
+        surprise: 'rgba(255, 193, 7, 1)',
+        disgust: 'rgba(73, 80, 87, 1)',
+        neutral: 'rgba(108, 117, 125, 1)'
+    };
     
     // Handle the analyze button click
     $('#analyzeBtn').click(function() {
@@ -18,6 +43,20 @@ $(document).ready(function() {
         $analyzeBtn.html('<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Analyzing...');
         $analyzeBtn.prop('disabled', true);
         
+        const resetButton = function() {
+            $analyzeBtn.html('Analyze Emotional Tone');
+            $analyzeBtn.prop('disabled', false);
+        };
+        
+        // Stream results sentence by sentence where the browser supports it
+        if (window.fetch && window.ReadableStream && window.TextDecoder) {
+            analyzeStreaming(text).catch(function(error) {
+                console.error('Error:', error);
+                alert('An error occurred during analysis. Please try again.');
+            }).finally(resetButton);
+            return;
+        }
+        
         // Send analysis request
         $.ajax({
             url: '/analyze',
@@ -85,11 +124,228 @@ $(document).ready(function() {
         });
     });
     
+    // Function to analyze text over a stream of Server-Sent Events
+    async function analyzeStreaming(text) {
+        const response = await fetch('/analyze/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ text: text })
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error('Streaming request failed with status ' + response.status);
+        }
+        
+        $('#results').removeClass('d-none');
+        $('#consistencyCard, #shiftsCard').addClass('d-none');
+        resetCharts();
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Messages are separated by a blank line
+            let boundary = buffer.indexOf('\n\n');
+            while (boundary !== -1) {
+                handleStreamMessage(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                boundary = buffer.indexOf('\n\n');
+            }
+        }
+    }
+    
+    // Function to dispatch one Server-Sent Events message
+    function handleStreamMessage(message) {
+        let event = 'message';
+        let data = '';
+        
+        message.split('\n').forEach(function(line) {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        
+        if (!data) {
+            return;
+        }
+        
+        const payload = JSON.parse(data);
+        
+        if (event === 'sentence') {
+            addArcSentence(payload);
+        } else if (event === 'shifts') {
+            displayShifts(payload);
+        } else if (event === 'consistency') {
+            displayConsistency(payload);
+        } else if (event === 'summary') {
+            displayOverview(payload);
+            displayChartLinks(payload.chart_urls);
+        } else if (event === 'error') {
+            throw new Error(payload.error);
+        }
+    }
+    
+    // Function to prepare empty arc and radar charts
+    function resetCharts() {
+        $('#arcPngLink, #radarPngLink').addClass('d-none');
+        
+        if (arcChart) {
+            arcChart.destroy();
+        }
+        
+        arcChart = new Chart(document.getElementById('arcChart').getContext('2d'), {
+            type: 'line',
+            data: {
+                labels: [],
+                datasets: emotionCategories.map(function(emotion) {
+                    return {
+                        label: emotion.charAt(0).toUpperCase() + emotion.slice(1),
+                        data: [],
+                        borderColor: emotionBorderColors[emotion],
+                        backgroundColor: emotionColors[emotion],
+                        pointRadius: [],
+                        tension: 0.2
+                    };
+                })
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                animation: false,
+                scales: {
+                    y: {
+                        beginAtZero: true,
+                        max: 1,
+                        title: { display: true, text: 'Emotion Intensity' }
+                    },
+                    x: {
+                        title: { display: true, text: 'Sentence Number' }
+                    }
+                }
+            }
+        });
+        
+        if (radarChart) {
+            radarChart.destroy();
+        }
+        
+        radarChart = new Chart(document.getElementById('radarChart').getContext('2d'), {
+            type: 'radar',
+            data: {
+                labels: emotionCategories,
+                datasets: [{
+                    label: 'Average Emotion Score',
+                    data: emotionCategories.map(function() { return 0; }),
+                    backgroundColor: 'rgba(23, 162, 184, 0.4)',
+                    borderColor: 'rgba(23, 162, 184, 1)',
+                    borderWidth: 2
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                animation: false,
+                scales: {
+                    r: { beginAtZero: true, max: 1 }
+                },
+                plugins: {
+                    legend: { display: false }
+                }
+            }
+        });
+    }
+    
+    // Function to append one scored sentence to the emotional arc
+    function addArcSentence(sentence) {
+        const scores = sentence.emotions.scores;
+        const count = arcChart.data.labels.length;
+        
+        arcChart.data.labels.push('S' + (sentence.index + 1));
+        arcChart.data.datasets.forEach(function(dataset, i) {
+            const emotion = emotionCategories[i];
+            dataset.data.push(scores[emotion] || 0);
+            // Emphasize the dominant emotion of each sentence
+            dataset.pointRadius.push(sentence.emotions.dominant_emotion === emotion ? 6 : 3);
+        });
+        
+        // Keep a running average of every emotion for the radar chart
+        const averages = radarChart.data.datasets[0].data;
+        emotionCategories.forEach(function(emotion, i) {
+            averages[i] = (averages[i] * count + (scores[emotion] || 0)) / (count + 1);
+        });
+        
+        scheduleChartUpdate();
+    }
+    
+    // Function to redraw the streaming charts at most once per frame
+    let chartUpdatePending = false;
+    function scheduleChartUpdate() {
+        if (chartUpdatePending) {
+            return;
+        }
+        
+        chartUpdatePending = true;
+        window.requestAnimationFrame(function() {
+            chartUpdatePending = false;
+            arcChart.update();
+            radarChart.update();
+        });
+    }
+    
+    // Function to link the server-rendered PNG versions of the charts
+    function displayChartLinks(urls) {
+        if (!urls) {
+            return;
+        }
+        
+        $('#arcPngLink').attr('href', urls.arc).removeClass('d-none');
+        $('#radarPngLink').attr('href', urls.radar).removeClass('d-none');
+    }
+    
     // Function to display analysis results
     function displayResults(data) {
         // Show results container
         $('#results').removeClass('d-none');
+        resetCharts();
+        
+        // Draw the emotional arc from the per-sentence score series
+        const arc = data.chart_data.arc;
+        arcChart.data.labels = arc.labels;
+        arcChart.data.datasets.forEach(function(dataset, i) {
+            const emotion = emotionCategories[i];
+            dataset.data = arc.series[emotion] || [];
+            dataset.pointRadius = arc.dominant.map(function(dominant) {
+                return dominant === emotion ? 6 : 3;
+            });
+        });
+        arcChart.update();
         
+        // Draw the radar chart from the average emotion scores
+        const radar = data.chart_data.radar;
+        radarChart.data.datasets[0].data = emotionCategories.map(function(emotion) {
+            const index = radar.labels.indexOf(emotion);
+            return index === -1 ? 0 : radar.values[index];
+        });
+        radarChart.update();
+        
+        displayChartLinks(data.chart_urls);
+        displayOverview(data);
+        displayConsistency(data.consistency_check);
+        displayShifts(data.emotional_shifts);
+    }
+    
+    // Function to display the document-level sentiment and emotions
+    function displayOverview(data) {
         // Display overall sentiment
         const sentimentText = data.document_sentiment.overall_sentiment.charAt(0).toUpperCase() + 
                              data.document_sentiment.overall_sentiment.slice(1);
@@ -99,12 +355,6 @@ $(document).ready(function() {
         const emotionText = data.document_emotions.dominant_emotion.charAt(0).toUpperCase() + 
                            data.document_emotions.dominant_emotion.slice(1);
         $('#dominantEmotion').text(emotionText);
-
-        // Display emotional arc image
-        $('#emotionalArc').attr('src', 'data:image/png;base64,' + data.plot_url);
-        
-        // Display emotion radar chart
-        $('#emotionRadar').attr('src', 'data:image/png;base64,' + data.radar_plot_url);
         
         // Create sentiment chart
         if (sentimentChart) {
@@ -169,27 +419,6 @@ $(document).ready(function() {
         
         const emotionCtx = document.getElementById('emotionChart').getContext('2d');
         
-        // Set colors for emotions
-        const emotionColors = {
-            joy: 'rgba(40, 167, 69, 0.6)',
-            sadness: 'rgba(23, 162, 184, 0.6)',
-            anger: 'rgba(220, 53, 69, 0.6)',
-            fear: 'rgba(111, 66, 193, 0.6)',
-            surprise: 'rgba(255, 193, 7, 0.6)',
-            disgust: 'rgba(73, 80, 87, 0.6)',
-            neutral: 'rgba(108, 117, 125, 0.6)'
-        };
-        
-        const emotionBorderColors = {
-            joy: 'rgba(40, 167, 69, 1)',
-            sadness: 'rgba(23, 162, 184, 1)',
-            anger: 'rgba(220, 53, 69, 1)',
-            fear: 'rgba(111, 66, 193, 1)',
-            surprise: 'rgba(255, 193, 7, 1)',
-            disgust: 'rgba(73, 80, 87, 1)',
-            neutral: 'rgba(108, 117, 125, 1)'
-        };
-        
         const emotions = data.document_emotions.scores;
         const emotionLabels = [];
         const emotionData = [];
@@ -237,14 +466,16 @@ $(document).ready(function() {
                 }
             }
         });
-        
-        // Display consistency information
-        if (!data.consistency_check.is_consistent) {
+    }
+    
+    // Function to display emotional consistency across paragraphs
+    function displayConsistency(consistencyCheck) {
+        if (!consistencyCheck.is_consistent) {
             $('#consistencyCard').removeClass('d-none');
             
-            let consistencyHtml = `<p>Main emotion throughout the text is <strong>${data.consistency_check.main_emotion}</strong>, but some paragraphs have different emotions:</p><ul>`;
+            let consistencyHtml = `<p>Main emotion throughout the text is <strong>${consistencyCheck.main_emotion}</strong>, but some paragraphs have different emotions:</p><ul>`;
             
-            data.consistency_check.inconsistencies.forEach(function(item) {
+            consistencyCheck.inconsistencies.forEach(function(item) {
                 consistencyHtml += `<li>Paragraph ${item.paragraph_index + 1} shows <span class="emotion-tag emotion-${item.emotion}">${item.emotion}</span> instead of <span class="emotion-tag emotion-${item.main_emotion}">${item.main_emotion}</span></li>`;
             });
             
@@ -253,14 +484,16 @@ $(document).ready(function() {
         } else {
             $('#consistencyCard').addClass('d-none');
         }
-        
-        // Display emotional shifts
-        if (data.emotional_shifts && data.emotional_shifts.length > 0) {
+    }
+    
+    // Function to display emotional shifts between sentences
+    function displayShifts(shifts) {
+        if (shifts && shifts.length > 0) {
             $('#shiftsCard').removeClass('d-none');
             
             let shiftsHtml = '<p>Significant emotional shifts detected:</p>';
             
-            data.emotional_shifts.forEach(function(shift) {
+            shifts.forEach(function(shift) {
                 shiftsHtml += `
                 <div class="shift-item mb-3">
                     <p>Shift from <span class="emotion-tag emotion-${shift.from_emotion}">${shift.from_emotion}</span> to 
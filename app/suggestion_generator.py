@@ -4,9 +4,14 @@ Uses GPT-3 when available or falls back to pattern-based approach.
 """
 
 import re
-import openai
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 import os
+import requests
 from dotenv import load_dotenv
+from rewrite_cache import RewriteCache, make_rewrite_key
+from metrics import REGISTRY
 from config import (
     OPENAI_MODEL, 
     OPENAI_MAX_TOKENS, 
@@ -14,6 +19,15 @@ from config import (
     OPENAI_TOP_P,
     OPENAI_FREQUENCY_PENALTY,
     OPENAI_PRESENCE_PENALTY,
+    OPENAI_PROMPT_TEMPLATE,
+    OPENAI_PROMPT_VERSION,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_REQUEST_TIMEOUT,
+    SUGGESTIONS_DEADLINE,
+    REWRITE_CACHE_PATH,
+    REWRITE_CACHE_TTL,
+    REWRITE_CACHE_MAX_ENTRIES,
+    REWRITE_CACHE_HIT_FLUSH_SECONDS,
     EMOTION_WORD_REPLACEMENTS,
     EMOTION_SENTENCE_ENDINGS,
     EMOTION_GENERAL_SUGGESTIONS
@@ -21,9 +35,118 @@ from config import (
 
 # Load API key from .env file
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-def generate_improved_sentence_with_gpt(original, target_emotion, strength="moderate"):
+def _make_openai_session():
+    """Create an HTTP session whose connections are reused across rewrites."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=OPENAI_MAX_CONCURRENCY,
+        max_retries=2
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# The OpenAI client is slow to import, so it is set up on first use
+_openai = None
+_openai_lock = threading.Lock()
+
+def _get_openai():
+    """Return the configured OpenAI client module."""
+    global _openai
+    with _openai_lock:
+        if _openai is None:
+            import openai
+            openai.api_key = OPENAI_API_KEY
+            # Allow pointing the client at a local stand-in of the completion API
+            openai.api_base = os.getenv("OPENAI_API_BASE", openai.api_base)
+            # Share one connection pool between all threads calling the API
+            openai.requestssession = _make_openai_session()
+            _openai = openai
+        return _openai
+
+# Worker threads for concurrent rewrites, created on first use
+_rewrite_executor = None
+_rewrite_executor_lock = threading.Lock()
+
+def _get_rewrite_executor():
+    """Return the shared thread pool that bounds concurrent API calls."""
+    global _rewrite_executor
+    with _rewrite_executor_lock:
+        if _rewrite_executor is None:
+            _rewrite_executor = ThreadPoolExecutor(
+                max_workers=OPENAI_MAX_CONCURRENCY,
+                thread_name_prefix="gpt-rewrite"
+            )
+        return _rewrite_executor
+
+# Completed GPT rewrites, kept across requests and restarts
+rewrite_cache = RewriteCache(
+    REWRITE_CACHE_PATH, REWRITE_CACHE_TTL, REWRITE_CACHE_MAX_ENTRIES, REWRITE_CACHE_HIT_FLUSH_SECONDS
+)
+
+# Rewrite metrics, reported by GET /metrics
+REWRITE_CACHE_LOOKUPS = REGISTRY.counter(
+    "rewrite_cache_lookups_total", "Rewrite cache lookups by result", ("result",)
+)
+GPT_CALL_SECONDS = REGISTRY.histogram("gpt_call_seconds", "Duration of GPT completion calls by outcome", ("outcome",))
+GPT_FALLBACKS = REGISTRY.counter(
+    "gpt_fallbacks_total", "Rewrites made with the pattern-based fallback, by reason", ("reason",)
+)
+
+def _cached_rewrite(key):
+    """Look a rewrite up in the rewrite cache, counting the hit or miss."""
+    cached = rewrite_cache.get(key)
+    REWRITE_CACHE_LOOKUPS.inc("hit" if cached is not None else "miss")
+    return cached
+
+def _rewrite_key(original, target_emotion, strength):
+    """Build the rewrite cache key for a sentence and the current GPT settings."""
+    return make_rewrite_key(
+        OPENAI_MODEL, OPENAI_PROMPT_VERSION, original, target_emotion, strength, OPENAI_TEMPERATURE
+    )
+
+class ReplacementMatcher:
+    """
+    Applies a table of word replacements in a single pass.
+
+    All phrases are compiled into one case-insensitive alternation bounded
+    by word boundaries. Longer phrases are tried first, and replaced text
+    is never matched again.
+    """
+
+    def __init__(self, replacements):
+        self.replacements = {self._normalize(word): replacement
+                             for word, replacement in replacements.items()}
+        phrases = sorted(self.replacements, key=len, reverse=True)
+        alternation = "|".join(r"\s+".join(map(re.escape, phrase.split())) for phrase in phrases)
+        self.pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+    @staticmethod
+    def _normalize(phrase):
+        return " ".join(phrase.lower().split())
+
+    def _replace(self, match):
+        matched = match.group(0)
+        replacement = self.replacements[self._normalize(matched)]
+        # Keep a capital letter at the start of the matched text, e.g. at sentence starts
+        if matched[0].isupper():
+            replacement = replacement[0].upper() + replacement[1:]
+        return replacement
+
+    def apply(self, text):
+        """Return text with every matched phrase replaced."""
+        return self.pattern.sub(self._replace, text)
+
+# Compiled once per emotion, since the fallback serves every request without an API key
+_REPLACEMENT_MATCHERS = {
+    emotion: ReplacementMatcher(replacements)
+    for emotion, replacements in EMOTION_WORD_REPLACEMENTS.items()
+}
+
+def generate_improved_sentence_with_gpt(original, target_emotion, strength="moderate", use_cache=True):
     """
     Use GPT-3 to improve a sentence to better express a specific emotion
 
@@ -35,37 +158,46 @@ def generate_improved_sentence_with_gpt(original, target_emotion, strength="mode
         The target emotion (joy, sadness, anger, fear, surprise, disgust)
     strength : str
         The intensity of the emotion (subtle, moderate, strong)
+    use_cache : bool
+        Whether to return a cached rewrite; fresh rewrites are cached either way
 
     Returns:
     --------
     str
         The improved sentence
     """
+    key = _rewrite_key(original, target_emotion, strength)
+    if use_cache:
+        cached = _cached_rewrite(key)
+        if cached is not None:
+            return cached
+
     # Check if API key is available
-    if not openai.api_key:
+    if not OPENAI_API_KEY:
         # Fallback to pattern-based replacement if no API key
         print("OpenAI API key not found. Using fallback sentence improvement method.")
+        GPT_FALLBACKS.inc("no_api_key")
         return generate_improved_sentence_fallback(original, target_emotion)
 
-    prompt = f"""
-    Rewrite the following sentence to better express {target_emotion} at a {strength} level of intensity.
-    The rewritten sentence should maintain the core meaning but enhance the emotional impact.
-
-    Original sentence: "{original}"
-
-    Rewritten sentence to express {target_emotion}:
-    """
+    prompt = OPENAI_PROMPT_TEMPLATE.format(
+        original=original,
+        target_emotion=target_emotion,
+        strength=strength
+    )
 
+    started = time.perf_counter()
     try:
-        response = openai.Completion.create(
+        response = _get_openai().Completion.create(
             model=OPENAI_MODEL,
             prompt=prompt,
             max_tokens=OPENAI_MAX_TOKENS,
             temperature=OPENAI_TEMPERATURE,
             top_p=OPENAI_TOP_P,
             frequency_penalty=OPENAI_FREQUENCY_PENALTY,
-            presence_penalty=OPENAI_PRESENCE_PENALTY
+            presence_penalty=OPENAI_PRESENCE_PENALTY,
+            request_timeout=OPENAI_REQUEST_TIMEOUT
         )
+        GPT_CALL_SECONDS.observe(time.perf_counter() - started, "ok")
         
         improved_text = response.choices[0].text.strip()
 
@@ -77,13 +209,77 @@ def generate_improved_sentence_with_gpt(original, target_emotion, strength="mode
         elif improved_text.endswith('"'):
             improved_text = improved_text[:-1]
 
+        rewrite_cache.put(key, improved_text)
         return improved_text
     
     except Exception as e:
         print(f"Error in GPT API call: {e}")
+        GPT_CALL_SECONDS.observe(time.perf_counter() - started, "error")
+        GPT_FALLBACKS.inc("error")
         # Fallback to pattern-based method if API call fails
         return generate_improved_sentence_fallback(original, target_emotion)
 
+def generate_improved_sentences(originals, target_emotion, strength="moderate", deadline=None,
+                                use_cache=True):
+    """
+    Improve several sentences at once with concurrent GPT-3 calls
+
+    Parameters:
+    -----------
+    originals : list
+        The original sentences to improve
+    target_emotion : str
+        The target emotion (joy, sadness, anger, fear, surprise, disgust)
+    strength : str
+        The intensity of the emotion (subtle, moderate, strong)
+    deadline : float
+        Seconds to wait for all rewrites, SUGGESTIONS_DEADLINE by default
+    use_cache : bool
+        Whether to return cached rewrites; fresh rewrites are cached either way
+
+    Returns:
+    --------
+    list
+        The improved sentences, in the order of the originals. Rewrites
+        that miss the deadline use the pattern-based fallback.
+    """
+    # Cached rewrites are answered directly, without a worker thread
+    improved = [None] * len(originals)
+    if use_cache:
+        improved = [_cached_rewrite(_rewrite_key(original, target_emotion, strength))
+                    for original in originals]
+    pending = [i for i, sentence in enumerate(improved) if sentence is None]
+
+    if not OPENAI_API_KEY:
+        if pending:
+            print("OpenAI API key not found. Using fallback sentence improvement method.")
+            GPT_FALLBACKS.inc("no_api_key", amount=len(pending))
+            fallbacks = generate_improved_sentences_fallback([originals[i] for i in pending], target_emotion)
+            for i, sentence in zip(pending, fallbacks):
+                improved[i] = sentence
+        return improved
+
+    executor = _get_rewrite_executor()
+    futures = {
+        i: executor.submit(
+            generate_improved_sentence_with_gpt, originals[i], target_emotion, strength, False
+        )
+        for i in pending
+    }
+    done, _ = wait(futures.values(), timeout=deadline if deadline is not None else SUGGESTIONS_DEADLINE)
+
+    for i, future in futures.items():
+        if future in done:
+            improved[i] = future.result()
+        else:
+            # Calls still running are bounded by OPENAI_REQUEST_TIMEOUT
+            future.cancel()
+            print("GPT rewrite missed the deadline. Using fallback sentence improvement method.")
+            GPT_FALLBACKS.inc("deadline")
+            improved[i] = generate_improved_sentence_fallback(originals[i], target_emotion)
+
+    return improved
+
 def generate_improved_sentence_fallback(original, target_emotion):
     """
     Fallback method for sentence improvement when GPT-3 is unavailable
@@ -101,23 +297,35 @@ def generate_improved_sentence_fallback(original, target_emotion):
     str
         The improved sentence using pattern-based replacements
     """
-    # Get the appropriate replacements for the target emotion
-    if target_emotion in EMOTION_WORD_REPLACEMENTS:
-        improvements = EMOTION_WORD_REPLACEMENTS[target_emotion]
-    else:
-        improvements = EMOTION_WORD_REPLACEMENTS['default']
-
-    # Apply the replacements
-    improved = original
-    for word, replacement in improvements.items():
-        # Case-insensitive replacement
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
-        improved = pattern.sub(replacement, improved)
-
-    # If the sentence didn't change much, add some emotion-specific modifications
-    if improved == original or len(set(improved.split()) - set(original.split())) < 2:
-        ending = EMOTION_SENTENCE_ENDINGS.get(target_emotion, EMOTION_SENTENCE_ENDINGS['default'])
-        improved = improved.rstrip('.') + ending
+    return generate_improved_sentences_fallback([original], target_emotion)[0]
+
+def generate_improved_sentences_fallback(originals, target_emotion):
+    """
+    Improve several sentences with the pattern-based fallback
+
+    Parameters:
+    -----------
+    originals : list
+        The original sentences to improve
+    target_emotion : str
+        The target emotion
+
+    Returns:
+    --------
+    list
+        The improved sentences, in the order of the originals
+    """
+    matcher = _REPLACEMENT_MATCHERS.get(target_emotion, _REPLACEMENT_MATCHERS['default'])
+    ending = EMOTION_SENTENCE_ENDINGS.get(target_emotion, EMOTION_SENTENCE_ENDINGS['default'])
+
+    improved = []
+    for original in originals:
+        sentence = matcher.apply(original)
+
+        # If the sentence didn't change much, add some emotion-specific modifications
+        if sentence == original or len(set(sentence.split()) - set(original.split())) < 2:
+            sentence = sentence.rstrip('.') + ending
+        improved.append(sentence)
 
     return improved
 
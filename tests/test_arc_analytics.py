@@ -0,0 +1,130 @@
+"""
+Checks of the emotional arc analytics on synthetic arcs with known scenes.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import arc_analytics
+from config import (
+    SHIFT_WINDOW,
+    SHIFT_MIN_DISTANCE,
+    SHIFT_NOISE_WINDOW,
+    SHIFT_SIGNIFICANCE,
+    SCENE_MIN_SENTENCES,
+    SCENE_PENALTY
+)
+
+EMOTIONS = 7
+
+
+def noise_arc(sentences, rng, concentration=1.0):
+    """Return an arc of random emotion distributions without any scenes."""
+    return rng.dirichlet(np.full(EMOTIONS, concentration), sentences).astype(np.float32)
+
+
+def scene_arc(sentences, rng, min_length, max_length, concentration=8.0):
+    """
+    Return an arc of scenes alternating between two emotions, and the first
+    sentence of every scene.
+    """
+    centers = np.eye(EMOTIONS) * 0.6 + 0.4 / EMOTIONS
+    rows, breaks = [], []
+    while len(rows) < sentences:
+        breaks.append(len(rows))
+        length = rng.integers(min_length, max_length + 1)
+        rows.extend(rng.dirichlet(centers[len(breaks) % 2] * concentration, length))
+    return np.array(rows, dtype=np.float32), np.array(breaks)
+
+
+def detect_shifts(matrix, positions=None):
+    return arc_analytics.detect_shifts(
+        matrix, matrix.argmax(axis=1), SHIFT_WINDOW, SHIFT_MIN_DISTANCE, SHIFT_NOISE_WINDOW,
+        SHIFT_SIGNIFICANCE, positions
+    )
+
+
+def found(expected, actual, tolerance=1):
+    """Return the fraction of expected positions with an actual one within tolerance."""
+    if not len(actual):
+        return 0.0
+    return np.mean(np.abs(expected[:, None] - actual[None, :]).min(axis=1) <= tolerance)
+
+
+def test_prefix_sums_window_means():
+    matrix = np.array([[1.0, np.nan], [2.0, 4.0], [3.0, 8.0]])
+    sums = arc_analytics.prefix_sums(matrix)
+    assert sums.shape == (4, 2)
+    means = arc_analytics.window_means(sums, np.array([0, 1]), np.array([2, 3]))
+    np.testing.assert_allclose(means, [[1.5, 2.0], [2.5, 6.0]])
+
+
+def test_rolling_mean_is_centered():
+    matrix = np.arange(5, dtype=np.float64)[:, None]
+    np.testing.assert_allclose(arc_analytics.rolling_mean(matrix, 3)[:, 0], [0.5, 1, 2, 3, 3.5])
+
+
+def test_noise_has_no_scenes_and_few_shifts():
+    rng = np.random.default_rng(0)
+    for concentration in (0.2, 1.0, 5.0):
+        matrix = noise_arc(20000, rng, concentration)
+        scenes = arc_analytics.segment_scenes(matrix, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+        assert scenes.tolist() == [0]
+        assert len(detect_shifts(matrix)) < 0.01 * len(matrix)
+
+
+def test_short_alternating_scenes_are_found():
+    rng = np.random.default_rng(1)
+    matrix, breaks = scene_arc(5000, rng, 3, 5)
+
+    scenes = arc_analytics.segment_scenes(matrix, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+    assert found(breaks, scenes) > 0.95
+    assert found(scenes, breaks) > 0.95
+
+    shifts = detect_shifts(matrix)
+    assert found(breaks[1:], shifts) > 0.95
+    assert found(shifts, breaks) > 0.9
+
+
+def test_long_scenes_are_found_exactly():
+    rng = np.random.default_rng(2)
+    matrix, breaks = scene_arc(3000, rng, 40, 120, concentration=4.0)
+    scenes = arc_analytics.segment_scenes(matrix, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+    assert len(scenes) == len(breaks)
+    assert found(breaks, scenes, tolerance=2) == 1.0
+
+
+def test_shifts_at_positions_match_full_detection():
+    rng = np.random.default_rng(3)
+    matrix, _ = scene_arc(2000, rng, 3, 30)
+    shifts = detect_shifts(matrix)
+    for first, last in ((1, 40), (900, 1100), (1950, 2000)):
+        positions = np.arange(first, min(last, len(matrix)))
+        expected = shifts[(shifts >= first) & (shifts < last)]
+        np.testing.assert_array_equal(detect_shifts(matrix, positions), expected)
+
+
+def test_resegmenting_an_edited_scene_keeps_the_others():
+    rng = np.random.default_rng(4)
+    matrix, _ = scene_arc(3000, rng, 40, 120, concentration=4.0)
+    scenes = arc_analytics.segment_scenes(matrix, SCENE_MIN_SENTENCES, SCENE_PENALTY)
+
+    # Insert a scene of the other emotion into the middle of one scene
+    middle = len(scenes) // 2
+    start, stop = scenes[middle - 1], scenes[middle + 2]
+    split = (scenes[middle] + scenes[middle + 1]) // 2
+    inserted, _ = scene_arc(60, rng, 60, 60, concentration=4.0)
+    inserted = inserted[:, [(1 - middle) % 2, middle % 2] + list(range(2, EMOTIONS))]
+    edited = np.concatenate([matrix[:split], inserted, matrix[split:]])
+
+    kept = np.concatenate([scenes[:middle], scenes[middle + 2:] + len(inserted)])
+    resegmented = arc_analytics.resegment_scenes(
+        edited, kept, start, stop + len(inserted), SCENE_MIN_SENTENCES, SCENE_PENALTY
+    )
+    np.testing.assert_array_equal(resegmented[resegmented < start], scenes[scenes < start])
+    np.testing.assert_array_equal(resegmented[resegmented >= stop + len(inserted)], scenes[middle + 2:] + len(inserted))
+    expected = np.array([scenes[middle], split, split + len(inserted)])
+    assert found(expected, resegmented[(resegmented > start) & (resegmented < stop + len(inserted))], 2) == 1.0
@@ -0,0 +1,95 @@
+"""
+Checks that batched model scoring gives the same results as scoring one
+text at a time, in the order of the input.
+"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import sentiment_analysis
+from config import EMOTION_CATEGORIES
+from model_registry import ModelRegistry
+from sentiment_analysis import EmotionalToneAnalyzer
+
+# Tokens the tiny pipeline keeps of a text when truncating
+MAX_TOKENS = 12
+
+TEXTS = [
+    "She laughed.",
+    " ".join(["The storm tore at the shutters all night"] * 10),
+    "He waited by the gate until the lamps went out.",
+    "Why?",
+    " ".join(["Nobody came back from the hill"] * 4),
+    "The letter lay unopened on the table for a week.",
+    "She laughed.",
+    "Run."
+]
+
+
+class TinyPipeline:
+    """
+    A text-classification pipeline scoring each text from a hash of its
+    first MAX_TOKENS tokens, recording the batches it is called with.
+    """
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.batches = []
+
+    def __call__(self, texts, batch_size=None, truncation=False):
+        self.batches.append(list(texts))
+        return [self._scores(text, truncation) for text in texts]
+
+    def _scores(self, text, truncation):
+        tokens = text.split()
+        if truncation:
+            tokens = tokens[:MAX_TOKENS]
+        digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=16).digest()
+        weights = [byte + 1 for byte in digest[:len(self.labels)]]
+        return [{"label": label, "score": weight / sum(weights)} for label, weight in zip(self.labels, weights)]
+
+
+@pytest.fixture
+def pipelines(monkeypatch):
+    """Serve the analyzer's models from tiny pipelines."""
+    pipelines = {
+        "sentiment": TinyPipeline(("NEGATIVE", "POSITIVE")),
+        "emotion": TinyPipeline(tuple(EMOTION_CATEGORIES))
+    }
+    registry = ModelRegistry()
+    for name, pipeline in pipelines.items():
+        registry.register(name, lambda pipeline=pipeline: pipeline)
+    monkeypatch.setattr(sentiment_analysis, "models", registry)
+    monkeypatch.setattr(sentiment_analysis, "SENTIMENT_MODE", "pipeline")
+    monkeypatch.setattr(sentiment_analysis, "EMOTION_CASCADE", False)
+    return pipelines
+
+
+def test_batched_sentiment_matches_per_text_calls(pipelines):
+    batched = EmotionalToneAnalyzer().analyze_sentiment_batch(TEXTS, batch_size=3)
+    single = EmotionalToneAnalyzer()
+    assert batched == [single.analyze_sentiment(text) for text in TEXTS]
+
+
+def test_batched_emotions_match_per_text_calls(pipelines):
+    batched = EmotionalToneAnalyzer().analyze_emotions_batch(TEXTS, batch_size=3)
+    single = EmotionalToneAnalyzer()
+    assert batched == [single.analyze_emotions(text) for text in TEXTS]
+
+
+def test_batches_are_sorted_by_length_and_results_restored(pipelines):
+    analyzer = EmotionalToneAnalyzer()
+    texts = list(dict.fromkeys(TEXTS))
+    results = analyzer._run_batched(pipelines["emotion"], texts, batch_size=3)
+
+    # Every batch holds texts of similar length, shortest first
+    lengths = [len(text) for batch in pipelines["emotion"].batches for text in batch]
+    assert lengths == sorted(lengths)
+    assert [len(batch) for batch in pipelines["emotion"].batches] == [3, 3, 1]
+
+    # Results come back in the order of the input, truncated like a single call
+    assert results == [pipelines["emotion"]([text], truncation=True)[0] for text in texts]
@@ -0,0 +1,124 @@
+"""
+Checks of the concurrent GPT rewrites in /suggestions against the local
+stand-in of the OpenAI completion API in tools/openai_stub.py.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "app"))
+sys.path.append(os.path.join(ROOT, "tools"))
+import openai
+import suggestion_generator
+from config import OPENAI_MAX_CONCURRENCY
+from openai_stub import CompletionHandler, make_server
+from rewrite_cache import RewriteCache
+
+SENTENCES = [f"The boat drifted toward the {place} at dusk." for place in (
+    "harbor", "island", "reef", "lighthouse", "pier", "cliffs", "dunes", "bay", "cove", "shoal"
+)]
+
+
+class CountingHandler(CompletionHandler):
+    """A stub handler recording the requests in flight and the connections used."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = 0
+    connections = set()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.requests += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.connections.add(self.client_address)
+        try:
+            super().do_POST()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    """
+    Return a function starting the stub with the given options, with the
+    suggestion generator pointed at it through a fresh client, session,
+    thread pool and rewrite cache.
+    """
+    servers = []
+
+    def start(latency=0.0, error_rate=0.0):
+        server = make_server("127.0.0.1", 0, latency, error_rate=error_rate, seed=0, handler_class=CountingHandler)
+        # Every server counts its own connections
+        server.RequestHandlerClass.connections = set()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_API_BASE", f"http://127.0.0.1:{server.server_port}/v1")
+        return server.RequestHandlerClass
+
+    monkeypatch.setattr(openai, "api_key", openai.api_key)
+    monkeypatch.setattr(openai, "api_base", openai.api_base)
+    monkeypatch.setattr(openai, "requestssession", getattr(openai, "requestssession", None))
+    monkeypatch.setattr(suggestion_generator, "OPENAI_API_KEY", "stub")
+    monkeypatch.setattr(suggestion_generator, "_openai", None)
+    monkeypatch.setattr(suggestion_generator, "_rewrite_executor", None)
+    monkeypatch.setattr(suggestion_generator, "rewrite_cache",
+                        RewriteCache(str(tmp_path / "rewrites.sqlite3"), ttl=3600, max_entries=1000))
+    yield start
+
+    # Let calls that outlived a deadline finish before the stub goes away
+    if suggestion_generator._rewrite_executor is not None:
+        suggestion_generator._rewrite_executor.shutdown(wait=True)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fallbacks(sentences, emotion):
+    return suggestion_generator.generate_improved_sentences_fallback(sentences, emotion)
+
+
+def test_rewrites_come_from_the_api_in_order(stub):
+    stub()
+    improved = suggestion_generator.generate_improved_sentences(SENTENCES, "joy", use_cache=False)
+    assert improved == [sentence.rstrip(".") + ", full of joy." for sentence in SENTENCES]
+
+
+def test_concurrent_calls_are_capped_and_share_connections(stub):
+    handler = stub(latency=0.2)
+    started = time.perf_counter()
+    improved = suggestion_generator.generate_improved_sentences(SENTENCES, "fear", deadline=10, use_cache=False)
+    elapsed = time.perf_counter() - started
+
+    assert improved == [sentence.rstrip(".") + ", full of fear." for sentence in SENTENCES]
+    assert handler.requests == len(SENTENCES)
+    assert handler.max_in_flight == OPENAI_MAX_CONCURRENCY
+    # The calls overlap instead of running one after another
+    assert elapsed < 0.2 * len(SENTENCES)
+    # Connections of the shared session are kept open and reused
+    assert len(handler.connections) <= OPENAI_MAX_CONCURRENCY
+
+
+def test_rewrites_missing_the_deadline_fall_back(stub):
+    stub(latency=1.0)
+    started = time.perf_counter()
+    improved = suggestion_generator.generate_improved_sentences(SENTENCES[:3], "sadness", deadline=0.2,
+                                                                use_cache=False)
+    assert time.perf_counter() - started < 1.0
+    assert improved == fallbacks(SENTENCES[:3], "sadness")
+
+
+def test_failed_api_calls_fall_back(stub):
+    handler = stub(error_rate=1.0)
+    improved = suggestion_generator.generate_improved_sentences(SENTENCES[:3], "anger", use_cache=False)
+    assert handler.requests >= 3
+    assert improved == fallbacks(SENTENCES[:3], "anger")
@@ -0,0 +1,191 @@
+"""
+Checks of what incremental re-analysis keeps from the previous revision:
+the rows of unchanged sentences and paragraphs, and the shifts and scenes
+away from the edit. Scenes next to the edit and the document scores are
+only recomputed locally, so they are not compared with a fresh analysis.
+"""
+
+import hashlib
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+import sentiment_analysis
+from config import EMOTION_CATEGORIES, SHIFT_WINDOW, SHIFT_NOISE_WINDOW
+from incremental_analysis import analyze_incremental
+from inference_backends import StubTokenizer
+from model_registry import ModelRegistry
+from sentiment_analysis import EmotionalToneAnalyzer
+
+# Words that make the keyword pipeline score a text as one emotion
+KEYWORDS = {"sunlit": "joy", "rain": "sadness", "slammed": "anger", "shadows": "fear"}
+
+# Emotion of every scene of the document, five paragraphs each
+SCENES = ("joy", "fear", "sadness", "anger", "sadness", "joy", "fear", "anger")
+PLACES = ("garden", "kitchen", "harbor", "attic", "station")
+SENTENCE_TEMPLATES = {
+    "joy": "The sunlit {place} rang with laughter number {n}.",
+    "sadness": "The rain kept falling on the {place} for hour {n}.",
+    "anger": "Someone slammed the door of the {place} for the {n}th time.",
+    "fear": "The shadows crept across the {place} at minute {n}."
+}
+
+
+class KeywordPipeline:
+    """
+    A text-classification pipeline scoring each text as the emotion of its
+    keywords, with a little hashed noise, recording the texts it scores.
+    """
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.tokenizer = StubTokenizer()
+        self.texts = []
+
+    def __call__(self, texts, batch_size=None, truncation=False):
+        self.texts.extend(texts)
+        return [self._scores(text) for text in texts]
+
+    def _scores(self, text):
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        weights = [1 + byte / 255 for byte in digest[:len(self.labels)]]
+        for word, emotion in KEYWORDS.items():
+            if word in text and emotion in self.labels:
+                weights[self.labels.index(emotion)] += 6
+        return [{"label": label, "score": weight / sum(weights)} for label, weight in zip(self.labels, weights)]
+
+
+def span_tokenize(text):
+    """Split text into sentences ending in a full stop."""
+    return [match.span() for match in re.finditer(r"[^.\s][^.]*\.", text)]
+
+
+def paragraph(emotion, index):
+    template = SENTENCE_TEMPLATES[emotion]
+    return " ".join(template.format(place=PLACES[index % len(PLACES)], n=index * 3 + i) for i in range(3))
+
+
+def document():
+    return "\n\n".join(
+        paragraph(emotion, scene * 5 + i) for scene, emotion in enumerate(SCENES) for i in range(5)
+    )
+
+
+@pytest.fixture
+def pipelines(monkeypatch):
+    """Serve the analyzer's models from keyword pipelines and a full-stop sentence splitter."""
+    pipelines = {
+        "sentiment": KeywordPipeline(("NEGATIVE", "POSITIVE")),
+        "emotion": KeywordPipeline(tuple(EMOTION_CATEGORIES))
+    }
+    registry = ModelRegistry()
+    for name, pipeline in pipelines.items():
+        registry.register(name, lambda pipeline=pipeline: pipeline)
+    registry.register("nltk", lambda: SimpleNamespace(span_tokenize=span_tokenize))
+    monkeypatch.setattr(sentiment_analysis, "models", registry)
+    monkeypatch.setattr(sentiment_analysis, "SENTIMENT_MODE", "pipeline")
+    monkeypatch.setattr(sentiment_analysis, "EMOTION_CASCADE", False)
+    monkeypatch.setattr(sentiment_analysis, "MICRO_BATCHING", False)
+    return pipelines
+
+
+def edit_sentence(text):
+    """Replace a sentence in the middle of the document by two, returning the new text and edited range."""
+    old = paragraph("sadness", 22).split(". ")[1] + "."
+    new = "The rain drummed on the roof. The gutters overflowed in the rain."
+    start = text.index(old)
+    return text[:start] + new + text[start + len(old):], start, start + len(old)
+
+
+def unchanged_rows(patch, key, old_count):
+    """Return pairs of old and new row positions outside the changed ranges of a patch."""
+    pairs = []
+    old_position = new_position = 0
+    for op in patch[key] + [{"old_range": [old_count, old_count], "new_range": [None, None]}]:
+        while old_position < op["old_range"][0]:
+            pairs.append((old_position, new_position))
+            old_position += 1
+            new_position += 1
+        old_position, new_position = op["old_range"][1], op["new_range"][1]
+    return pairs
+
+
+def test_only_the_edited_spans_are_scored_again(pipelines):
+    analyzer = EmotionalToneAnalyzer()
+    previous = analyzer.analyze_document(document())
+    text, _, _ = edit_sentence(document())
+    pipelines["emotion"].texts.clear()
+
+    analysis, patch = analyze_incremental(analyzer, previous, text)
+
+    # The two new sentences and their paragraph
+    assert patch["rescored_spans"] == 3
+    assert [span for span in pipelines["emotion"].texts if span in analysis.sentences.spans()] == [
+        "The rain drummed on the roof.", "The gutters overflowed in the rain."
+    ]
+    assert len(analysis.sentences) == len(previous.sentences) + 1
+
+
+def test_reused_rows_are_unchanged(pipelines):
+    analyzer = EmotionalToneAnalyzer()
+    previous = analyzer.analyze_document(document())
+    text, start, old_end = edit_sentence(document())
+    shift = len(text) - len(previous.text)
+
+    analysis, patch = analyze_incremental(analyzer, previous, text)
+
+    for table, key in (("sentences", "sentence_ops"), ("paragraphs", "paragraph_ops")):
+        old, new = getattr(previous, table), getattr(analysis, table)
+        pairs = unchanged_rows(patch, key, len(old))
+        assert len(pairs) == len(old) - 1
+        for i, j in pairs:
+            assert new.span(j) == old.span(i)
+            assert np.array_equal(new.emotions[j], old.emotions[i])
+            assert np.array_equal(new.sentiment[j], old.sentiment[i])
+            assert new.dominant[j] == old.dominant[i]
+            moved = shift if old.offsets[i, 0] >= old_end else 0
+            assert new.offsets[j].tolist() == (old.offsets[i] + moved).tolist()
+
+
+def test_shifts_and_scenes_away_from_the_edit_are_kept(pipelines):
+    analyzer = EmotionalToneAnalyzer()
+    previous = analyzer.analyze_document(document())
+    text, start, _ = edit_sentence(document())
+
+    analysis, _ = analyze_incremental(analyzer, previous, text)
+
+    edited = int(np.searchsorted(previous.sentences.offsets[:, 0], start))
+    halo = max(SHIFT_WINDOW, SHIFT_NOISE_WINDOW)
+    before = previous.shift_positions[previous.shift_positions < edited - halo]
+    after = previous.shift_positions[previous.shift_positions > edited + 1 + halo]
+    assert len(before) and len(after)
+    assert analysis.shift_positions[analysis.shift_positions < edited - halo].tolist() == before.tolist()
+    assert analysis.shift_positions[analysis.shift_positions > edited + 2 + halo].tolist() == (after + 1).tolist()
+
+    # Scenes more than one scene away from the edit keep their breaks
+    breaks = previous.scene_breaks
+    scene = int(np.searchsorted(breaks, edited, side="right")) - 1
+    assert scene >= 2 and scene + 2 < len(breaks)
+    kept_before = breaks[:scene - 1]
+    kept_after = breaks[scene + 2:]
+    assert analysis.scene_breaks[:len(kept_before)].tolist() == kept_before.tolist()
+    assert analysis.scene_breaks[len(analysis.scene_breaks) - len(kept_after):].tolist() == (kept_after + 1).tolist()
+
+
+def test_spans_and_shifts_match_a_fresh_analysis(pipelines):
+    analyzer = EmotionalToneAnalyzer()
+    previous = analyzer.analyze_document(document())
+    text, _, _ = edit_sentence(document())
+
+    analysis, _ = analyze_incremental(analyzer, previous, text)
+    fresh = EmotionalToneAnalyzer().analyze_document(text)
+
+    assert analysis.sentences.spans() == fresh.sentences.spans()
+    assert analysis.paragraphs.spans() == fresh.paragraphs.spans()
+    assert np.array_equal(analysis.sentences.emotions, fresh.sentences.emotions)
+    assert analysis.shift_positions.tolist() == fresh.shift_positions.tolist()
@@ -0,0 +1,55 @@
+"""
+Checks that /metrics reports the metrics of all server processes together.
+"""
+
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from metrics import Registry
+
+OTHER_PID = 999999
+
+
+def registry_with_other_process(directory):
+    """Return a registry of this process next to the snapshot of another process."""
+    registry = Registry(str(directory))
+    registry.counter("requests_total", "Requests", ("endpoint",)).inc("analyze", amount=2)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1)).observe(0.5)
+    registry.register_collector(lambda: [("cache_entries", "gauge", "Entries", [("", {}, 7)])])
+
+    other = Registry(str(directory))
+    other.counter("requests_total", "Requests", ("endpoint",)).inc("analyze", amount=3)
+    other.histogram("latency_seconds", "Latency", buckets=(0.1, 1)).observe(0.05)
+    other.register_collector(lambda: [("cache_entries", "gauge", "Entries", [("", {}, 5)])])
+    with open(directory / f"metrics-{OTHER_PID}.json", "w", encoding="utf-8") as f:
+        json.dump(other.collect(), f)
+    return registry
+
+
+def test_counters_and_histograms_are_summed_over_processes(tmp_path):
+    lines = registry_with_other_process(tmp_path).render().splitlines()
+    assert 'requests_total{endpoint="analyze"} 5' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert "latency_seconds_count 2" in lines
+    assert "latency_seconds_sum 0.55" in lines
+    assert lines.count("# TYPE requests_total counter") == 1
+
+
+def test_gauges_are_reported_per_process(tmp_path):
+    lines = registry_with_other_process(tmp_path).render().splitlines()
+    assert f'cache_entries{{pid="{os.getpid()}"}} 7' in lines
+    assert f'cache_entries{{pid="{OTHER_PID}"}} 5' in lines
+
+
+def test_counts_of_an_exited_process_are_kept(tmp_path):
+    registry = registry_with_other_process(tmp_path)
+    registry.mark_process_dead(OTHER_PID)
+    lines = registry.render().splitlines()
+    assert 'requests_total{endpoint="analyze"} 5' in lines
+    assert not any(f'pid="{OTHER_PID}"' in line for line in lines)
+
+    registry.clear_snapshots()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,58 @@
+"""
+Checks of the single-pass word replacements of the pattern-based
+rewrite fallback.
+"""
+
+import os
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import EMOTION_WORD_REPLACEMENTS
+from suggestion_generator import ReplacementMatcher
+
+
+def sequential_replace(replacements, text):
+    """Apply the replacements one after another, like the fallback used to."""
+    for word, replacement in replacements.items():
+        text = re.compile(re.escape(word), re.IGNORECASE).sub(replacement, text)
+    return text
+
+
+def test_longer_overlapping_phrases_win():
+    matcher = ReplacementMatcher({"the morning": "the glorious morning", "morning": "dawn", "the": "a"})
+    assert matcher.apply("In the morning the bells rang.") == "In the glorious morning a bells rang."
+    assert matcher.apply("Every morning.") == "Every dawn."
+
+
+def test_phrases_match_across_any_whitespace():
+    matcher = ReplacementMatcher({"the morning": "the glorious morning"})
+    assert matcher.apply("All through the\n  morning.") == "All through the glorious morning."
+
+
+def test_words_inside_other_words_are_kept():
+    matcher = ReplacementMatcher({"sun": "golden sun", "sad": "thoughtful"})
+    assert matcher.apply("On Sunday the sun was sadder.") == "On Sunday the golden sun was sadder."
+    assert matcher.apply("sun, sad; sun.") == "golden sun, thoughtful; golden sun."
+
+
+def test_capital_letters_are_kept():
+    matcher = ReplacementMatcher({"happy": "content", "the morning": "the lonely morning"})
+    assert matcher.apply("Happy and happy.") == "Content and content."
+    assert matcher.apply("The Morning came.") == "The lonely morning came."
+    assert matcher.apply("HAPPY") == "Content"
+
+
+def test_replacements_are_not_replaced_again():
+    replacements = {"sad": "gloomy", "gloomy": "dark"}
+    text = "A sad and gloomy day."
+    assert sequential_replace(replacements, text) == "A dark and dark day."
+    assert ReplacementMatcher(replacements).apply(text) == "A gloomy and dark day."
+
+
+def test_configured_replacements_are_applied_once():
+    # "walked" becomes "stormed", which the old loop then matched as "storm"
+    replacements = EMOTION_WORD_REPLACEMENTS["anger"]
+    text = "He walked into the storm."
+    assert sequential_replace(replacements, text) == "He violent stormed into the violent storm."
+    assert ReplacementMatcher(replacements).apply(text) == "He stormed into the violent storm."
@@ -0,0 +1,128 @@
+"""
+Benchmark of sentence segmentation on a real chapter.
+Analyzes a text file with the old segmentation, which split the
+lowercased, punctuation-free text, and with the current one, and reports
+the sentences found, the model calls made and the latency of each.
+
+Usage:
+    python tools/benchmark_segmentation.py chapter.txt --runs 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import INFERENCE_BATCH_SIZE
+from sentiment_analysis import EmotionalToneAnalyzer, models
+from analysis_result import SpanTable
+
+
+def legacy_plan(analyzer, text):
+    """Plan a document the way preprocess_text used to split it."""
+    from nltk.tokenize import sent_tokenize
+
+    sentences = sent_tokenize(analyzer.normalize_text(text))
+    paragraphs = [p for p in text.split('\n\n') if p.strip()]
+
+    # Paragraph sentences were split from the original text all along
+    spans = paragraphs + sentences
+    for paragraph in paragraphs:
+        spans.extend(paragraph[start:end] for start, end in analyzer.segment_sentences(paragraph))
+
+    return {
+        "sentences": sentences,
+        "spans": list(dict.fromkeys(s for s in spans if s.strip()))
+    }
+
+
+def legacy_analysis(analyzer, text):
+    """
+    Score a document as analyze_document did with the old segmentation.
+
+    Returns the number of sentences and of emotional shifts found.
+    """
+    plan = legacy_plan(analyzer, text)
+    scores = analyzer.score_spans(plan["spans"])
+    analyzer.document_scores(text, analyzer.score_document_windows(text))
+
+    # The old sentences are not spans of the text, so they get a text of their own
+    sentence_text = "\n".join(plan["sentences"])
+    offsets = []
+    start = 0
+    for sentence in plan["sentences"]:
+        offsets.append((start, start + len(sentence)))
+        start += len(sentence) + 1
+    sentences = SpanTable.from_scores(sentence_text, offsets, scores)
+    shifts = analyzer._detect_emotional_shifts(sentences.emotions, sentences.dominant)
+    return len(sentences), len(shifts)
+
+
+def analysis(analyzer, text):
+    """Analyze a document with the current segmentation, returning its sentence and shift counts."""
+    result = analyzer.analyze_document(text)
+    return len(result.sentences), len(result.shift_positions)
+
+
+def count_model_calls(analyzer):
+    """Count the batches and texts the analyzer sends to its models."""
+    counts = {"calls": 0, "texts": 0}
+    run_batched = analyzer._run_batched
+
+    def counted(model, texts, batch_size=None):
+        results = run_batched(model, texts, batch_size)
+        batch_size = batch_size or INFERENCE_BATCH_SIZE
+        counts["calls"] += -(-len(texts) // batch_size)
+        counts["texts"] += len(texts)
+        return results
+
+    analyzer._run_batched = counted
+    return counts
+
+
+def run(analyzer, analyze, text, runs):
+    """Analyze text repeatedly with analyze(analyzer, text) from a cold score cache."""
+    counts = count_model_calls(analyzer)
+    latencies = []
+    for _ in range(runs):
+        analyzer.score_cache.clear()
+        counts.update(calls=0, texts=0)
+        started = time.perf_counter()
+        sentences, shifts = analyze(analyzer, text)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "sentences": sentences,
+        "shifts": shifts,
+        "model_calls": counts["calls"],
+        "texts_scored": counts["texts"],
+        "latency_seconds": statistics.median(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the old and new sentence segmentation")
+    parser.add_argument("path", help="text file holding a chapter")
+    parser.add_argument("--runs", type=int, default=3, help="analyses per segmentation")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        text = f.read()
+
+    models.warm_up(background=False)
+
+    results = {
+        "before": run(EmotionalToneAnalyzer(), legacy_analysis, text, args.runs),
+        "after": run(EmotionalToneAnalyzer(), analysis, text, args.runs)
+    }
+
+    print(f"{'':<10}{'sentences':>10}{'shifts':>8}{'calls':>8}{'texts':>8}{'latency':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['sentences']:>10}{result['shifts']:>8}{result['model_calls']:>8}"
+              f"{result['texts_scored']:>8}{result['latency_seconds']:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
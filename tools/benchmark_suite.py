@@ -0,0 +1,271 @@
+"""
+Microbenchmarks of the analysis and suggestion hot paths.
+Times preprocessing, the sentence, paragraph and document analyses,
+shift detection, both chart builders and the fallback rewriter on
+synthetic corpora of 1, 10, 100 and 1,000 paragraphs, and reports
+throughput, peak RSS, the peak memory allocated by a run and the
+number of blocks it allocated that were still alive after it.
+
+Usage:
+    python tools/benchmark_suite.py --output baseline.json
+    python tools/benchmark_suite.py --compare baseline.json --tolerance 0.1
+
+The models run on the deterministic stub backend unless INFERENCE_BACKEND
+is set, so results are stable offline. Micro-batching is off unless
+MICRO_BATCHING is set, since a single caller would only wait for batches.
+The NLTK sentence tokenizer data must be installed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("INFERENCE_BACKEND", "stub")
+os.environ.setdefault("MICRO_BATCHING", "0")
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import EMOTION_LEXICON_PATH, INFERENCE_BACKEND
+from sentiment_analysis import EmotionalToneAnalyzer, models
+from suggestion_generator import generate_improved_sentence_fallback
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+
+# Words mixed into the synthetic sentences besides the lexicon's emotion words
+FILLER_WORDS = (
+    "the a an and but of in on at to from with she he they it was were had "
+    "house road window morning evening door letter river city table light "
+    "walked looked turned waited said thought knew felt opened closed"
+).split()
+
+
+def synthetic_corpus(paragraphs, seed=0):
+    """
+    Build a reproducible document of the given number of paragraphs
+
+    Parameters:
+    -----------
+    paragraphs : int
+        Number of paragraphs, each of 3 to 7 sentences of 6 to 20 words
+    seed : int
+        Seed of the random generator; the same seed gives the same text
+
+    Returns:
+    --------
+    str
+        The paragraphs separated by blank lines
+    """
+    with open(EMOTION_LEXICON_PATH, encoding="utf-8") as f:
+        emotion_words = sorted({line.split()[0] for line in f if line.strip() and not line.startswith("#")})
+    rng = random.Random(seed)
+
+    def sentence():
+        words = [rng.choice(emotion_words) if rng.random() < 0.15 else rng.choice(FILLER_WORDS)
+                 for _ in range(rng.randint(6, 20))]
+        return " ".join(words).capitalize() + rng.choice(".!?")
+
+    return "\n\n".join(
+        " ".join(sentence() for _ in range(rng.randint(3, 7))) for _ in range(paragraphs)
+    )
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def measure(run, repeat, sentences, max_seconds=None):
+    """
+    Time a benchmark and trace its allocations
+
+    Parameters:
+    -----------
+    run : callable
+        Runs the benchmark once; called repeat times for timing and once
+        more under tracemalloc
+    repeat : int
+        Number of timed runs
+    sentences : int
+        Sentences processed per run, for the throughput
+    max_seconds : float
+        Stop timing early once the runs took this long, after at least one
+
+    Returns:
+    --------
+    dict
+        Median and best seconds, sentences per second, the peak RSS of the
+        process so far, the peak memory allocated during the traced run
+        and the number of blocks that run allocated and did not free
+    """
+    seconds = []
+    while len(seconds) < repeat and not (max_seconds and sum(seconds) >= max_seconds):
+        started = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - started)
+
+    # Tracing starts with the run, so every traced block was allocated by it
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    tracemalloc.stop()
+    alive = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    median = statistics.median(seconds)
+    return {
+        "median_seconds": median,
+        "best_seconds": min(seconds),
+        "runs": len(seconds),
+        "sentences_per_second": sentences / median if median else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_alloc_bytes": peak,
+        "blocks_alive_after": alive
+    }
+
+
+def benchmarks(analyzer, text):
+    """Return the benchmarks of one document as (name, run) pairs."""
+    preprocessed = analyzer.preprocess_text(text)
+    plan = analyzer.plan_document(text)
+    analysis = analyzer.analyze_document(text)
+    sentences = analysis.sentences
+
+    def cold(function, *args):
+        # Every run scores from an empty cache, as a new document would
+        def run():
+            analyzer.score_cache.clear()
+            return function(*args)
+        return run
+
+    def chart(build):
+        def run():
+            figure = build(analysis)
+            analyzer.render_chart_png(figure)
+        return run
+
+    return [
+        ("preprocess_text", lambda: analyzer.preprocess_text(text)),
+        ("analyze_sentence_level", cold(
+            analyzer.analyze_sentence_level, preprocessed["sentences"], None, preprocessed["sentence_offsets"]
+        )),
+        ("analyze_paragraph_level", cold(analyzer.analyze_paragraph_level, plan["paragraphs"])),
+        ("analyze_document", cold(analyzer.analyze_document, text)),
+        ("detect_emotional_shifts", lambda: analyzer._detect_emotional_shifts(sentences.emotions, sentences.dominant)),
+        ("emotional_arc_chart", chart(analyzer.visualize_emotional_arc)),
+        ("emotion_radar_chart", chart(analyzer.create_emotion_radar_chart)),
+        ("improved_sentence_fallback", lambda: [
+            generate_improved_sentence_fallback(sentence, "joy") for sentence in preprocessed["sentences"]
+        ])
+    ]
+
+
+def run_suite(sizes, repeat, max_seconds=None, only=None):
+    """Run every benchmark on every corpus size and return the results."""
+    models.warm_up(background=False)
+    analyzer = EmotionalToneAnalyzer()
+
+    results = []
+    for paragraphs in sizes:
+        text = synthetic_corpus(paragraphs)
+        sentence_count = len(analyzer.segment_sentences(text))
+        for name, run in benchmarks(analyzer, text):
+            if only and name not in only:
+                continue
+            result = {"benchmark": name, "paragraphs": paragraphs, "sentences": sentence_count}
+            result.update(measure(run, repeat, sentence_count, max_seconds))
+            results.append(result)
+            print(f"{name:<28}{paragraphs:>7}{sentence_count:>8}{result['median_seconds'] * 1000:>12.2f}"
+                  f"{result['sentences_per_second']:>14.0f}{result['peak_rss_mb']:>10.1f}"
+                  f"{result['peak_alloc_bytes'] / 2 ** 20:>11.2f}{result['blocks_alive_after']:>10}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline run
+
+    Parameters:
+    -----------
+    results : list
+        The results of this run
+    baseline : list
+        The results of an earlier run, loaded from its JSON output
+    tolerance : float
+        Slowdown of the median time, as a fraction, above which a
+        benchmark counts as a regression
+
+    Returns:
+    --------
+    list
+        The (benchmark, paragraphs) pairs that regressed
+    """
+    previous = {(result["benchmark"], result["paragraphs"]): result for result in baseline}
+    regressions = []
+    print(f"\n{'benchmark':<28}{'paras':>7}{'before ms':>12}{'after ms':>12}{'change':>9}")
+    for result in results:
+        key = (result["benchmark"], result["paragraphs"])
+        if key not in previous:
+            continue
+        before = previous[key]["median_seconds"]
+        after = result["median_seconds"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key[0]:<28}{key[1]:>7}{before * 1000:>12.2f}{after * 1000:>12.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis and suggestion hot paths")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                        help="corpus sizes in paragraphs")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--max-seconds", type=float, default=10,
+                        help="stop repeating a benchmark once its runs took this long")
+    parser.add_argument("--only", nargs="+", help="benchmarks to run, all by default")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON output of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown counted as a regression when comparing, as a fraction")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<28}{'paras':>7}{'sents':>8}{'median ms':>12}{'sentences/s':>14}"
+          f"{'RSS MB':>10}{'alloc MB':>11}{'alive':>10}")
+    results = run_suite(sorted(args.sizes), args.repeat, args.max_seconds, args.only)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "inference_backend": INFERENCE_BACKEND,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
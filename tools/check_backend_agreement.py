@@ -0,0 +1,102 @@
+"""
+Label agreement check for the inference backends.
+Scores the sentences of a sample corpus with the eager FP32 reference
+and with each other backend, and reports how often the top label
+agrees, the largest score difference and the throughput of each.
+
+Usage:
+    python tools/check_backend_agreement.py corpus.txt --backends torchscript quantized onnx
+
+--sentiment-model and --emotion-model check other models, e.g. local
+fine-tuned copies, instead of the configured ones.
+
+Exits with status 1 if any backend agrees with the reference on fewer
+than --min-agreement of the sentences.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import SENTIMENT_MODEL_NAME, EMOTION_MODEL_NAME, INFERENCE_BATCH_SIZE
+from inference_backends import INFERENCE_BACKENDS, load_pipeline
+from sentiment_analysis import EmotionalToneAnalyzer
+
+# Pipeline task of each classifier
+CLASSIFIER_TASKS = {
+    "sentiment": "sentiment-analysis",
+    "emotion": "text-classification"
+}
+
+
+def load_sentences(path, limit):
+    """Split a corpus file into at most limit sentences."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    offsets = EmotionalToneAnalyzer().segment_sentences(text)
+    return [text[start:end] for start, end in offsets][:limit]
+
+
+def score(pipe, sentences):
+    """Score sentences, returning their label scores and the texts per second."""
+    started = time.perf_counter()
+    results = pipe(sentences, batch_size=INFERENCE_BATCH_SIZE, truncation=True)
+    elapsed = time.perf_counter() - started
+    scores = [{item["label"]: item["score"] for item in result} for result in results]
+    return scores, len(sentences) / elapsed
+
+
+def compare(reference, candidate):
+    """Return the top-label agreement rate and the largest score difference."""
+    agreements = 0
+    max_difference = 0.0
+    for expected, actual in zip(reference, candidate):
+        agreements += max(expected, key=expected.get) == max(actual, key=actual.get)
+        max_difference = max(max_difference, *(abs(expected[label] - actual[label]) for label in expected))
+    return agreements / len(reference), max_difference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check label agreement of the inference backends")
+    parser.add_argument("corpus", help="text file with sample prose")
+    parser.add_argument("--backends", nargs="+", default=["torchscript", "quantized", "onnx"],
+                        choices=[backend for backend in INFERENCE_BACKENDS if backend != "pytorch"])
+    parser.add_argument("--limit", type=int, default=1000, help="maximum number of sentences")
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--sentiment-model", default=SENTIMENT_MODEL_NAME, help="name or path of the sentiment model")
+    parser.add_argument("--emotion-model", default=EMOTION_MODEL_NAME, help="name or path of the emotion model")
+    args = parser.parse_args()
+    models = {"sentiment": args.sentiment_model, "emotion": args.emotion_model}
+
+    sentences = load_sentences(args.corpus, args.limit)
+    print(f"Scoring {len(sentences)} sentences")
+
+    passed = True
+    for name, task in CLASSIFIER_TASKS.items():
+        model_name = models[name]
+        reference, reference_rate = score(load_pipeline(task, model_name, "pytorch"), sentences)
+        print(f"\n{name} ({model_name})")
+        print(f"{'backend':<14}{'agreement':>10}{'max diff':>10}{'texts/s':>10}{'speedup':>9}")
+        print(f"{'pytorch':<14}{1.0:>10.3f}{0.0:>10.4f}{reference_rate:>10.1f}{1.0:>8.2f}x")
+
+        for backend in args.backends:
+            try:
+                pipe = load_pipeline(task, model_name, backend)
+            except Exception as e:
+                print(f"{backend:<14}failed to load: {e}")
+                passed = False
+                continue
+
+            scores, rate = score(pipe, sentences)
+            agreement, max_difference = compare(reference, scores)
+            print(f"{backend:<14}{agreement:>10.3f}{max_difference:>10.4f}{rate:>10.1f}"
+                  f"{rate / reference_rate:>8.2f}x")
+            passed = passed and agreement >= args.min_agreement
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Threshold sweep for the lexicon-first emotion cascade.
+Scores the sentences of a sample corpus with the emotion lexicon and the
+emotion model, and reports for each confidence threshold how many
+sentences would be escalated to the model and how often the cascade's
+dominant emotion agrees with the model-only path.
+
+Usage:
+    python tools/evaluate_cascade.py corpus.txt --thresholds 0.1 0.2 0.3 0.5
+
+Set EMOTION_LEXICON_PATH to evaluate another lexicon file.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import (
+    EMOTION_MODEL_NAME,
+    EMOTION_CATEGORIES,
+    EMOTION_LEXICON_PATH,
+    INFERENCE_BACKEND,
+    INFERENCE_BATCH_SIZE,
+    LEXICON_CONFIDENCE_THRESHOLD,
+    LEXICON_NEUTRAL_PRIOR
+)
+from emotion_lexicon import load_lexicon
+from inference_backends import load_pipeline
+from sentiment_analysis import EmotionalToneAnalyzer
+
+
+def load_sentences(path, limit):
+    """Split a corpus file into at most limit sentences."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    offsets = EmotionalToneAnalyzer().segment_sentences(text)
+    return [text[start:end] for start, end in offsets][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the confidence threshold of the emotion cascade")
+    parser.add_argument("corpus", help="text file with sample prose")
+    parser.add_argument("--thresholds", nargs="+", type=float,
+                        default=[0.1, 0.2, LEXICON_CONFIDENCE_THRESHOLD, 0.4, 0.5, 0.7])
+    parser.add_argument("--limit", type=int, default=2000, help="most sentences to score")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.corpus, args.limit)
+    lexicon = load_lexicon(EMOTION_LEXICON_PATH, EMOTION_CATEGORIES, LEXICON_NEUTRAL_PRIOR)
+    print(f"{len(sentences)} sentences, {len(lexicon)} lexicon words")
+
+    started = time.perf_counter()
+    lexicon_results, confidences = lexicon.classify(sentences)
+    lexicon_seconds = time.perf_counter() - started
+
+    pipe = load_pipeline("text-classification", EMOTION_MODEL_NAME, INFERENCE_BACKEND)
+    started = time.perf_counter()
+    model_results = pipe(sentences, batch_size=INFERENCE_BATCH_SIZE, truncation=True)
+    model_seconds = time.perf_counter() - started
+
+    lexicon_labels = np.array([result["dominant_emotion"] for result in lexicon_results])
+    model_labels = np.array([max(result, key=lambda item: item["score"])["label"] for result in model_results])
+    agrees = lexicon_labels == model_labels
+
+    print(f"lexicon: {len(sentences) / lexicon_seconds:.0f} sentences/s, "
+          f"model: {len(sentences) / model_seconds:.0f} sentences/s")
+    print(f"{'threshold':>10}{'escalated':>12}{'agreement':>12}{'lexicon-only agreement':>25}{'est. speedup':>15}")
+    for threshold in sorted(args.thresholds):
+        escalated = confidences < threshold
+        # Escalated sentences take the model's label, so they always agree
+        agreement = (escalated | agrees).mean()
+        kept = ~escalated
+        kept_agreement = f"{agrees[kept].mean():.3f}" if kept.any() else "-"
+        seconds = lexicon_seconds + model_seconds * escalated.mean()
+        print(f"{threshold:>10.2f}{escalated.mean():>12.3f}{agreement:>12.3f}{kept_agreement:>25}"
+              f"{model_seconds / seconds:>14.1f}x")
+
+
+if __name__ == "__main__":
+    main()
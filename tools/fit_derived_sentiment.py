@@ -0,0 +1,120 @@
+"""
+Accuracy comparison and calibration of the derived sentiment mode.
+Scores a labeled sample with the emotion and sentiment models, fits the
+logistic mapping from emotion scores to sentiment on part of it, and
+reports the accuracy of the sentiment model, of the configured mapping
+and of the refit mapping on the rest.
+
+Usage:
+    python tools/fit_derived_sentiment.py labeled.csv --test-fraction 0.3
+
+The CSV needs a "text" column and a "label" column holding "positive"
+or "negative" (or 1 and 0).
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from config import (
+    SENTIMENT_MODEL_NAME,
+    EMOTION_MODEL_NAME,
+    EMOTION_CATEGORIES,
+    INFERENCE_BACKEND,
+    INFERENCE_BATCH_SIZE,
+    DERIVED_SENTIMENT_WEIGHTS,
+    DERIVED_SENTIMENT_BIAS
+)
+from inference_backends import load_pipeline
+
+
+def load_sample(path):
+    """Read the texts and 0/1 sentiment labels of a labeled CSV file."""
+    texts, labels = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.append(row["text"])
+            labels.append(1 if row["label"].strip().lower() in ("positive", "pos", "1") else 0)
+    return texts, np.array(labels)
+
+
+def score(task, model_name, texts):
+    """Return a texts x labels matrix of scores and the label names."""
+    pipe = load_pipeline(task, model_name, INFERENCE_BACKEND)
+    results = pipe(texts, batch_size=INFERENCE_BATCH_SIZE, truncation=True)
+    labels = sorted(item["label"] for item in results[0])
+    matrix = np.array([[{item["label"]: item["score"] for item in result}[label] for label in labels]
+                       for result in results])
+    return matrix, labels
+
+
+def fit_logistic(features, labels, l2=0.01, steps=2000, learning_rate=0.5):
+    """Fit a logistic regression with gradient descent, returning (weights, bias)."""
+    weights = np.zeros(features.shape[1])
+    bias = 0.0
+    for _ in range(steps):
+        predictions = 1 / (1 + np.exp(-(features @ weights + bias)))
+        error = predictions - labels
+        weights -= learning_rate * (features.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * error.mean()
+    return weights, bias
+
+
+def derived_predictions(features, weights, bias):
+    """Predict positive (1) or negative (0) from emotion scores."""
+    return (features @ weights + bias > 0).astype(int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and refit the derived sentiment mapping")
+    parser.add_argument("path", help="CSV file with text and label columns")
+    parser.add_argument("--test-fraction", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts, labels = load_sample(args.path)
+    emotion_scores, emotions = score("text-classification", EMOTION_MODEL_NAME, texts)
+    sentiment_scores, sentiments = score("sentiment-analysis", SENTIMENT_MODEL_NAME, texts)
+    model_predictions = (sentiment_scores[:, sentiments.index("POSITIVE")] > 0.5).astype(int)
+
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    split = int(len(texts) * (1 - args.test_fraction))
+    train, test = order[:split], order[split:]
+
+    configured = np.array([DERIVED_SENTIMENT_WEIGHTS.get(emotion, 0) for emotion in emotions])
+    fitted, fitted_bias = fit_logistic(emotion_scores[train], labels[train])
+
+    results = {
+        "sentiment model": model_predictions[test],
+        "derived (configured)": derived_predictions(emotion_scores[test], configured, DERIVED_SENTIMENT_BIAS),
+        "derived (refit)": derived_predictions(emotion_scores[test], fitted, fitted_bias)
+    }
+
+    print(f"{len(train)} training and {len(test)} test texts")
+    print(f"{'':<22}{'accuracy':>10}{'agrees with model':>20}")
+    for name, predictions in results.items():
+        accuracy = (predictions == labels[test]).mean()
+        agreement = (predictions == model_predictions[test]).mean()
+        print(f"{name:<22}{accuracy:>10.3f}{agreement:>20.3f}")
+
+    refit = results["derived (refit)"]
+    print("\nRefit mapping for config.py:")
+    print(f"# Fit with: python tools/fit_derived_sentiment.py {' '.join(sys.argv[1:])}")
+    print(f"# on {len(train)} texts of {os.path.basename(args.path)}; on the {len(test)} held-out texts it agrees")
+    print(f"# with the sentiment model on {(refit == model_predictions[test]).mean():.1%} and has an accuracy"
+          f" of {(refit == labels[test]).mean():.1%}")
+    print("DERIVED_SENTIMENT_WEIGHTS = {")
+    # Print the emotions in the order used by config.py
+    ordered = sorted(emotions, key=lambda emotion: EMOTION_CATEGORIES.index(emotion)
+                     if emotion in EMOTION_CATEGORIES else len(EMOTION_CATEGORIES))
+    print(",\n".join(f'    "{emotion}": {fitted[emotions.index(emotion)]:.2f}' for emotion in ordered))
+    print("}")
+    print(f"DERIVED_SENTIMENT_BIAS = {fitted_bias:.2f}")
+
+
+if __name__ == "__main__":
+    main()
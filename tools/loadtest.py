@@ -0,0 +1,272 @@
+"""
+HTTP load test of the /analyze and /suggestions endpoints.
+Replays a mixed workload of short, medium and novel-length texts, each
+tagged with a target emotion, against a running app at increasing
+concurrency levels. Reports requests per second and p50/p95/p99 latency
+per level and endpoint, and flags the level where the app saturates.
+
+Usage:
+    python tools/openai_stub.py --latency 0.5 --jitter 0.2 --error-rate 0.02
+    OPENAI_API_KEY=stub OPENAI_API_BASE=http://127.0.0.1:8001/v1 INFERENCE_BACKEND=stub \\
+        gunicorn -c gunicorn.conf.py wsgi:app
+    python tools/loadtest.py http://127.0.0.1:8000 --concurrency 1 2 4 8 16 --duration 30
+
+Run the app with the stub inference backend to test the serving path
+alone, or with the real models to measure a deploy candidate.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+EMOTIONS = ("joy", "sadness", "anger", "fear", "surprise", "disgust")
+
+# Paragraphs per text of each size
+TEXT_SIZES = {"short": 1, "medium": 8, "novel": 400}
+
+WORDS = (
+    "the a and but of in on at to from with she he they it was were had "
+    "house road window morning evening door letter river city table light "
+    "walked looked turned waited said thought knew felt opened closed "
+    "happy glad laughed smiled sad wept lonely grief angry rage furious "
+    "afraid terror trembled dread sudden astonished gasped disgust rotten vile"
+).split()
+
+
+def make_text(paragraphs, rng):
+    """Build a text of the given number of paragraphs of 3 to 7 sentences."""
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "."
+
+    return "\n\n".join(" ".join(sentence() for _ in range(rng.randint(3, 7))) for _ in range(paragraphs))
+
+
+def parse_weights(pairs, names):
+    """Parse name=weight pairs into a dict, e.g. ["short=6", "novel=1"]."""
+    weights = {}
+    for pair in pairs:
+        name, _, weight = pair.partition("=")
+        if name not in names:
+            raise SystemExit(f"Unknown name {name!r}, expected one of {', '.join(names)}")
+        weights[name] = float(weight)
+    return weights
+
+
+def build_workload(count, size_weights, endpoint_weights, seed=0, bypass_cache=True):
+    """
+    Build a reproducible list of requests
+
+    Parameters:
+    -----------
+    count : int
+        Number of requests; the load test cycles through them
+    size_weights : dict
+        Relative frequency of each text size in TEXT_SIZES
+    endpoint_weights : dict
+        Relative frequency of "analyze" and "suggestions" requests
+    seed : int
+        Seed of the random generator
+    bypass_cache : bool
+        Whether suggestion requests skip the rewrite cache, so every
+        rewrite reaches the completion API
+
+    Returns:
+    --------
+    list
+        (endpoint, size, JSON body) tuples
+    """
+    rng = random.Random(seed)
+    texts = {size: [make_text(TEXT_SIZES[size], rng) for _ in range(4)] for size in size_weights}
+    sizes, endpoints = list(size_weights), list(endpoint_weights)
+
+    workload = []
+    for _ in range(count):
+        size = rng.choices(sizes, [size_weights[name] for name in sizes])[0]
+        endpoint = rng.choices(endpoints, [endpoint_weights[name] for name in endpoints])[0]
+        body = {"text": rng.choice(texts[size]), "target_emotion": rng.choice(EMOTIONS)}
+        if endpoint == "suggestions":
+            body["bypass_cache"] = bypass_cache
+        workload.append((endpoint, size, json.dumps(body).encode("utf-8")))
+    return workload
+
+
+def send(base_url, endpoint, body, timeout):
+    """Post one request and return its status, 0 on connection errors."""
+    request = urllib.request.Request(
+        f"{base_url}/{endpoint}", data=body, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def run_level(base_url, workload, concurrency, duration, timeout):
+    """
+    Keep concurrency requests in flight for duration seconds
+
+    Returns:
+    --------
+    list
+        (endpoint, size, status, seconds) of every request that finished
+        within the duration
+    """
+    results = []
+    lock = threading.Lock()
+    next_index = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                endpoint, size, body = workload[next_index[0] % len(workload)]
+                next_index[0] += 1
+            started = time.perf_counter()
+            status = send(base_url, endpoint, body, timeout)
+            finished = time.perf_counter()
+            if finished <= deadline:
+                with lock:
+                    results.append((endpoint, size, status, finished - started))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + timeout)
+    return results
+
+
+def summarize(results, duration):
+    """Return the request count, error rate, requests per second and latency percentiles of some results."""
+    if not results:
+        return {"requests": 0, "errors": 0, "error_rate": 0.0, "rps": 0.0, "p50": None, "p95": None, "p99": None}
+
+    seconds = np.array([result[3] for result in results])
+    errors = sum(1 for result in results if result[2] != 200)
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99]).tolist()
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results),
+        "rps": (len(results) - errors) / duration,
+        "p50": p50,
+        "p95": p95,
+        "p99": p99
+    }
+
+
+def find_saturation(levels, min_gain, max_error_rate):
+    """
+    Return the first concurrency level at which the app is saturated
+
+    A level is saturated when its successful requests per second grew by
+    less than min_gain over the previous level while latency grew, or
+    when more than max_error_rate of its requests failed. Returns None if
+    no level is saturated.
+    """
+    for previous, level in zip([None] + levels[:-1], levels):
+        overall = level["overall"]
+        if overall["error_rate"] > max_error_rate:
+            return level["concurrency"], f"{overall['error_rate']:.1%} of requests failed"
+        if previous is None or not previous["overall"]["rps"] or overall["p50"] is None:
+            continue
+        gain = overall["rps"] / previous["overall"]["rps"] - 1
+        if gain < min_gain and overall["p50"] > previous["overall"]["p50"]:
+            return level["concurrency"], (
+                f"throughput grew {gain:+.0%} over concurrency {previous['concurrency']} "
+                f"while p50 latency rose {overall['p50'] / previous['overall']['p50']:.1f}x"
+            )
+    return None
+
+
+def print_level(level):
+    rows = [("overall", level["overall"])] + sorted(level["endpoints"].items()) + sorted(level["sizes"].items())
+    for name, stats in rows:
+        if not stats["requests"]:
+            continue
+        print(f"{level['concurrency']:>11}  {name:<12}{stats['requests']:>9}{stats['error_rate']:>8.1%}"
+              f"{stats['rps']:>8.2f}{stats['p50'] * 1000:>10.0f}{stats['p95'] * 1000:>10.0f}"
+              f"{stats['p99'] * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /analyze and /suggestions")
+    parser.add_argument("base_url", help="URL of the running app, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16],
+                        help="concurrency levels to run, in order")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--sizes", nargs="+", default=["short=6", "medium=3", "novel=1"],
+                        help="relative frequency of each text size")
+    parser.add_argument("--endpoints", nargs="+", default=["analyze=3", "suggestions=1"],
+                        help="relative frequency of each endpoint")
+    parser.add_argument("--use-rewrite-cache", action="store_true",
+                        help="let suggestions use cached rewrites instead of calling the completion API")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a request is abandoned")
+    parser.add_argument("--min-gain", type=float, default=0.1,
+                        help="throughput gain below which a level counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="error rate above which a level counts as saturated")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the workload")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    workload = build_workload(
+        1000, parse_weights(args.sizes, TEXT_SIZES), parse_weights(args.endpoints, ("analyze", "suggestions")),
+        args.seed, not args.use_rewrite_cache
+    )
+
+    # One request of each kind first, so model loading is not measured
+    for endpoint in ("analyze", "suggestions"):
+        if send(base_url, endpoint, workload[0][2], args.timeout) == 0:
+            sys.exit(f"Could not reach {base_url}")
+
+    print(f"{'concurrency':>11}  {'':<12}{'requests':>9}{'errors':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}")
+    levels = []
+    for concurrency in args.concurrency:
+        results = run_level(base_url, workload, concurrency, args.duration, args.timeout)
+        level = {
+            "concurrency": concurrency,
+            "overall": summarize(results, args.duration),
+            "endpoints": {
+                endpoint: summarize([result for result in results if result[0] == endpoint], args.duration)
+                for endpoint in ("analyze", "suggestions")
+            },
+            "sizes": {
+                size: summarize([result for result in results if result[1] == size], args.duration)
+                for size in TEXT_SIZES
+            }
+        }
+        levels.append(level)
+        print_level(level)
+
+    saturation = find_saturation(levels, args.min_gain, args.max_error_rate)
+    if saturation:
+        print(f"\nSaturated at concurrency {saturation[0]}: {saturation[1]}")
+    else:
+        print("\nNo saturation up to concurrency", args.concurrency[-1])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "base_url": base_url,
+                "duration": args.duration,
+                "levels": levels,
+                "saturation": {"concurrency": saturation[0], "reason": saturation[1]} if saturation else None
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
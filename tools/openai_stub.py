@@ -0,0 +1,115 @@
+"""
+Local stand-in for the OpenAI completion API.
+Answers /v1/completions requests with a canned rewrite of the original
+sentence after a configurable delay, so the suggestion generator can be
+exercised offline. The delay can vary randomly, and a share of requests
+can fail, to exercise the timeout and fallback paths under load.
+
+Usage:
+    python tools/openai_stub.py --port 8001 --latency 0.5 --jitter 0.2 --error-rate 0.05
+
+Then start the app with:
+    OPENAI_API_KEY=stub OPENAI_API_BASE=http://127.0.0.1:8001/v1 python app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_completion(prompt, model):
+    """Build a completion response that rewrites the sentence in the prompt."""
+    sentence = re.search(r'Original sentence: "(.*)"', prompt, re.DOTALL)
+    emotion = re.search(r'better express (\w+)', prompt)
+    text = sentence.group(1) if sentence else prompt.strip()
+    if emotion:
+        text = f"{text.rstrip('.')}, full of {emotion.group(1)}."
+
+    return {
+        "id": f"cmpl-stub-{time.time_ns()}",
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"text": f' "{text}"', "index": 0, "logprobs": None, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """Request handler serving the stubbed completion endpoint."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    error_status = 500
+    random = random.Random()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/completions"):
+            self._send(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        request = json.loads(body or b"{}")
+        time.sleep(max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0))
+        if self.random.random() < self.error_rate:
+            self._send(self.error_status, {"error": {"message": "Stubbed failure", "type": "server_error"}})
+            return
+        self._send(200, make_completion(request.get("prompt", ""), request.get("model", "stub")))
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host, port, latency, jitter=0.0, error_rate=0.0, error_status=500, seed=None,
+                handler_class=CompletionHandler):
+    """Create a stub server; port 0 picks a free port."""
+    handler = type("StubHandler", (handler_class,), {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "random": random.Random(seed)
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host, port, latency, jitter=0.0, error_rate=0.0, error_status=500, seed=None):
+    """Run the stub server until interrupted."""
+    server = make_server(host, port, latency, jitter, error_rate, error_status, seed)
+    print(f"OpenAI stub listening on http://{host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI completion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to wait before answering each request")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="the wait varies uniformly by up to this many seconds either way")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=500,
+                        help="HTTP status of the failed requests, e.g. 429 or 500")
+    parser.add_argument("--seed", type=int, help="seed of the jitter and errors, for repeatable runs")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency, args.jitter, args.error_rate, args.error_status, args.seed)